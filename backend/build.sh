@@ -9,5 +9,5 @@ pip install -r requirements.txt
 # Collect static files
 python manage.py collectstatic --no-input
 
-# Run migrations
-python manage.py migrate
+# Run migrations (--fake-initial: chat/notifications tables predate their migrations)
+python manage.py migrate --fake-initial
@@ -5,7 +5,7 @@ from .models import Category
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     """Admin configuration for Category model"""
-    list_display = ['name', 'slug', 'created_at']
+    list_display = ['name', 'slug', 'listing_lifetime_days', 'created_at']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created_at']
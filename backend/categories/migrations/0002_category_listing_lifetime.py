@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='listing_lifetime_days',
+            field=models.PositiveIntegerField(blank=True, help_text='Days a listing stays live before it expires; blank uses LISTING_LIFETIME_DAYS', null=True),
+        ),
+    ]
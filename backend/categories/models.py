@@ -11,6 +11,11 @@ class Category(models.Model):
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True, null=True)
     icon = models.CharField(max_length=50, blank=True, null=True, help_text="Icon class name for frontend")
+    listing_lifetime_days = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Days a listing stays live before it expires; blank uses LISTING_LIFETIME_DAYS"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
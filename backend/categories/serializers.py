@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from .models import Category
+from olx_backend.fieldsets import SparseFieldsMixin
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for Category model.
     Includes listing count for each category.
@@ -13,6 +14,7 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name', 'slug', 'description', 'icon', 'listing_count', 'created_at']
         read_only_fields = ['id', 'slug', 'created_at']
+        sparse_sources = {'listing_count': []}
     
     def get_listing_count(self, obj):
         """Return count of active (non-sold) listings in this category"""
@@ -0,0 +1,81 @@
+"""
+Projection (see olx_backend.projections) for the conversation list.
+Mirrors ConversationSerializer key for key, with the per-row message
+lookups of the serializer replaced by one annotation and one batch query.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from listings.projections import ListingListProjection
+from olx_backend.projections import Projection
+from users.serializers import UserSerializer
+from .models import Message
+from .serializers import ConversationSerializer
+
+
+class ConversationProjection(Projection):
+    serializer_class = ConversationSerializer
+    nested_projections = {'listing': ListingListProjection}
+    method_columns = {
+        'last_message': ['last_message_id'],
+        'unread_count': ['unread_message_count'],
+        'other_user': ['buyer', 'seller'],
+    }
+    
+    def compile_method_field(self, name):
+        if name == 'other_user':
+            # Either participant may be the other user; project both
+            self.participants = {}
+            for role in ('buyer', 'seller'):
+                participant = Projection(UserSerializer(), prefix=f'{self.prefix}{role}__')
+                self.columns |= participant.columns
+                self.participants[role] = participant
+        return super().compile_method_field(name)
+    
+    def annotate(self, queryset, context):
+        last_message = Message.objects.filter(
+            conversation=OuterRef('pk')
+        ).order_by('-created_at', '-id').values('id')[:1]
+        queryset = queryset.annotate(last_message_id=Subquery(last_message))
+        
+        request = context.get('request')
+        if request is not None and request.user.is_authenticated:
+            unread = Message.objects.filter(
+                conversation=OuterRef('pk'),
+                is_read=False
+            ).exclude(
+                sender=request.user
+            ).order_by().values('conversation').annotate(count=Count('id')).values('count')
+            queryset = queryset.annotate(
+                unread_message_count=Coalesce(Subquery(unread, output_field=IntegerField()), 0)
+            )
+        else:
+            queryset = queryset.annotate(unread_message_count=Value(0))
+        return queryset
+    
+    def prepare(self, rows, context):
+        ids = [row[self.prefix + 'last_message_id'] for row in rows]
+        messages = Message.objects.filter(
+            id__in=[message_id for message_id in ids if message_id is not None]
+        ).values('id', 'content', 'sender_id', 'created_at', 'is_read')
+        context['last_messages'] = {message['id']: message for message in messages}
+    
+    def project_last_message(self, row, context):
+        message = context['last_messages'].get(self.get(row, 'last_message_id'))
+        if message is None:
+            return None
+        return {
+            'content': message['content'],
+            'sender_id': message['sender_id'],
+            'created_at': message['created_at'],
+            'is_read': message['is_read'],
+        }
+    
+    def project_unread_count(self, row, context):
+        return self.get(row, 'unread_message_count')
+    
+    def project_other_user(self, row, context):
+        request = context.get('request')
+        if not request or not request.user.is_authenticated:
+            return None
+        role = 'seller' if self.get(row, 'buyer') == request.user.pk else 'buyer'
+        return self.participants[role].build(row, context)
@@ -2,6 +2,7 @@ from rest_framework import serializers
 from .models import Conversation, Message
 from users.serializers import UserSerializer
 from listings.serializers import ListingListSerializer
+from olx_backend.fieldsets import SparseFieldsMixin
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -82,7 +83,7 @@ class MessageSerializer(serializers.ModelSerializer):
         return data
 
 
-class ConversationSerializer(serializers.ModelSerializer):
+class ConversationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for Conversation model"""
     listing = ListingListSerializer(read_only=True)
     buyer = UserSerializer(read_only=True)
@@ -98,6 +99,11 @@ class ConversationSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'last_message', 'unread_count'
         ]
         read_only_fields = ['id', 'buyer', 'seller', 'created_at', 'updated_at']
+        sparse_sources = {
+            'last_message': ['messages'],
+            'unread_count': [],
+            'other_user': ['buyer', 'seller'],
+        }
     
     def get_last_message(self, obj):
         """Get the most recent message"""
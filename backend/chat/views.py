@@ -10,11 +10,14 @@ from .serializers import (
     ConversationCreateSerializer,
     MessageSerializer
 )
+from .projections import ConversationProjection
 from .throttles import ChatMessageThrottle, ChatCreateThrottle, BurstThrottle
 from listings.models import Listing
+from olx_backend.fieldsets import SparseQuerysetMixin
+from olx_backend.projections import ProjectionListMixin
 
 
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(SparseQuerysetMixin, ProjectionListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing conversations.
     
@@ -23,6 +26,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
     create: Start a new conversation
     """
     serializer_class = ConversationSerializer
+    projection_class = ConversationProjection
     permission_classes = [permissions.IsAuthenticated]
     throttle_classes = [BurstThrottle]  # Apply burst throttle to all actions
     
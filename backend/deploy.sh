@@ -11,7 +11,7 @@ echo "=========================================="
 # Step 1: Run migrations
 echo ""
 echo "📦 Applying database migrations..."
-python manage.py migrate --noinput
+python manage.py migrate --noinput --fake-initial
 
 # Step 2: Verify migrations
 echo ""
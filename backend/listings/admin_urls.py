@@ -5,7 +5,8 @@ from .admin_views import (
     AdminUserViewSet,
     AdminReportViewSet,
     AdminStatsViewSet,
-    AdminActionViewSet
+    AdminActionViewSet,
+    AdminExportView
 )
 
 router = DefaultRouter()
@@ -16,5 +17,6 @@ router.register(r'stats', AdminStatsViewSet, basename='admin-stats')
 router.register(r'audit-log', AdminActionViewSet, basename='admin-audit')
 
 urlpatterns = [
+    path('export/<str:dataset>/', AdminExportView.as_view(), name='admin-export'),
     path('', include(router.urls)),
 ]
@@ -1,11 +1,18 @@
+from datetime import datetime, time
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from django.db.models import Count, Q
 from .models import Listing, ListingReport, AdminAction
 from .admin_serializers import ListingReportSerializer, ListingReportDetailSerializer, AdminActionSerializer
 from .admin_permissions import IsAdminUser
+from . import duplicates, exports
+from olx_backend.pagination import KeysetPagination
 from listings.serializers import ListingSerializer
 from users.models import User
 from users.serializers import UserSerializer
@@ -63,6 +70,50 @@ class AdminListingViewSet(viewsets.ModelViewSet):
         
         return Response({'status': 'listing activated'})
     
+    @action(detail=True, methods=['get'])
+    def duplicates(self, request, pk=None):
+        """
+        Listings with near-identical photos (perceptual hash within ?distance=,
+        default duplicates.MAX_DISTANCE), closest first
+        """
+        listing = self.get_object()
+        try:
+            max_distance = int(request.query_params.get('distance', duplicates.MAX_DISTANCE))
+        except ValueError:
+            max_distance = -1
+        if not 0 <= max_distance <= duplicates.MAX_SEARCH_DISTANCE:
+            return Response(
+                {'error': f'distance must be between 0 and {duplicates.MAX_SEARCH_DISTANCE}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        found = duplicates.duplicate_listings(listing, max_distance)
+        others = Listing.objects.filter(pk__in=found).select_related('user').only(
+            'id', 'title', 'is_active', 'is_sold', 'created_at', 'user__username'
+        )
+        results = [
+            {
+                'id': other.id,
+                'title': other.title,
+                'user': other.user.username,
+                'is_active': other.is_active,
+                'is_sold': other.is_sold,
+                'created_at': other.created_at,
+                'distance': found[other.id][0][2],
+                'matches': [
+                    {'image': image_id, 'duplicate_image': duplicate_id, 'distance': gap}
+                    for image_id, duplicate_id, gap in found[other.id]
+                ],
+            }
+            for other in others
+        ]
+        results.sort(key=lambda result: (result['distance'], result['id']))
+        return Response({
+            'listing': listing.id,
+            'unhashed_images': listing.images.filter(dhash__isnull=True).count(),
+            'duplicates': results,
+        })
+    
     def destroy(self, request, *args, **kwargs):
         """Hard delete a listing"""
         listing = self.get_object()
@@ -211,4 +262,55 @@ class AdminActionViewSet(viewsets.ReadOnlyModelViewSet):
     """
     permission_classes = [IsAdminUser]
     serializer_class = AdminActionSerializer
+    pagination_class = KeysetPagination
     queryset = AdminAction.objects.select_related('admin', 'target_user', 'target_listing')
+
+
+def parse_export_bound(value):
+    """ISO date or datetime from the query string; naive values are in the server timezone"""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        return timezone.make_aware(datetime.combine(day, time.min))
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class AdminExportView(APIView):
+    """
+    Streaming export of a whole table as NDJSON (default) or CSV.
+    GET /api/admin/export/<listings|reports|audit-log>/?format=csv&since=&until=
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [exports.NDJSONExportRenderer, exports.CSVExportRenderer]
+    
+    def get(self, request, dataset):
+        if dataset not in exports.DATASETS:
+            return Response(
+                {'error': f"Unknown export. Choose one of: {', '.join(exports.DATASETS)}"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        bounds = {}
+        for name in ('since', 'until'):
+            value = request.query_params.get(name)
+            if value:
+                try:
+                    bounds[name] = parse_export_bound(value)
+                except ValueError:
+                    return Response(
+                        {'error': f'{name} must be an ISO date or datetime'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        
+        renderer = request.accepted_renderer
+        chunks = exports.stream_export(dataset, renderer.format, **bounds)
+        if isinstance(request._request, ASGIRequest):
+            chunks = exports.iterate_async(chunks)
+        response = StreamingHttpResponse(chunks, content_type=f'{renderer.media_type}; charset=utf-8')
+        filename = f"{dataset}-{timezone.now():%Y%m%d-%H%M%S}.{renderer.format}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
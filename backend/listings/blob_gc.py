@@ -0,0 +1,273 @@
+"""
+Garbage collection of stored image files.
+
+Deleting a ListingImage row (delete_image, listing deletion cascades,
+admin deletes) leaves its file and renditions in media storage, and an
+upload intent that is never finalized leaves whatever was uploaded for
+it. Their names are filed as OrphanedBlob tombstones instead, by
+post_delete signals in the deleting transaction (a rolled-back delete
+leaves none). sweep() deletes upload intents that expired unfinished,
+which files theirs.
+
+sweep() deletes the files behind due tombstones, BATCH_SIZE at a time:
+
+- a batch is claimed in one short transaction (SELECT ... FOR UPDATE
+  SKIP LOCKED) and leased by pushing next_attempt_at LEASE ahead, so
+  concurrent sweepers never take the same names and a crashed one's
+  batch comes back later;
+- names in use again (an image, one of its renditions, or a pending
+  upload) are dropped without touching storage;
+- the batch's files are deleted concurrently on at most WORKERS threads;
+- a failed delete is retried with exponential backoff from RETRY_DELAY,
+  up to MAX_ATTEMPTS; tombstones that reach it stay for inspection.
+
+Deleting rows also queues a sweep in the background; a periodic run of
+the sweep_image_blobs command catches up on the rest. reconcile() diffs
+storage against the database for files orphaned before tombstones
+existed or by crashes: files under ROOT that nothing refers to are
+tombstoned, due only after GRACE so in-flight uploads can settle.
+"""
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from olx_backend import background
+
+ROOT = 'listings'
+
+BATCH_SIZE = 200
+WORKERS = getattr(settings, 'BLOB_GC_WORKERS', 4)
+
+LEASE = timedelta(minutes=10)
+RETRY_DELAY = timedelta(minutes=5)
+MAX_ATTEMPTS = 8
+
+# Age before a file found by reconcile() or left by an unfinished upload is deleted.
+# Signed Cloudinary uploads stay valid for an hour after they are issued.
+GRACE = timedelta(hours=1)
+
+# Names looked up per query
+LOOKUP_BATCH_SIZE = 500
+
+# rendition_name() output: <original root>.<size>.<format extension>
+RENDITION_RE = re.compile(r'^(?P<root>.+)\.(?:thumb|medium)\.(?:webp|jpg)$')
+ORIGINAL_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif', 'webp', 'JPG', 'JPEG', 'PNG', 'GIF', 'WEBP')
+
+_sweeping = threading.Lock()
+
+
+def get_storage():
+    from .models import ListingImage
+
+    return ListingImage._meta.get_field('image').storage
+
+
+def image_names(name, renditions):
+    """Stored files of one ListingImage: the original and its renditions"""
+    names = [name] if name else []
+    names.extend(
+        rendition['name'] for rendition in (renditions or {}).values()
+        if isinstance(rendition, dict) and rendition.get('name')
+    )
+    return names
+
+
+def tombstone(names, due=None):
+    """File names for deletion; names already filed keep their tombstone"""
+    from .models import OrphanedBlob
+
+    due = due or timezone.now()
+    OrphanedBlob.objects.bulk_create(
+        [OrphanedBlob(name=name, next_attempt_at=due) for name in dict.fromkeys(names) if name],
+        ignore_conflicts=True
+    )
+
+
+def in_use(names):
+    """The subset of `names` an image, a rendition or a pending upload still refers to"""
+    from .models import ListingImage, UploadIntent
+
+    names = list(names)
+    used = set()
+    for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+        batch = names[start:start + LOOKUP_BATCH_SIZE]
+        # A rendition is in use when its original is; originals are looked up by every name they could have
+        lookups = set(batch)
+        for name in batch:
+            match = RENDITION_RE.match(name)
+            if match:
+                root = match.group('root')
+                lookups.add(root)
+                lookups.update(f'{root}.{extension}' for extension in ORIGINAL_EXTENSIONS)
+        for image, renditions in ListingImage.objects.filter(image__in=lookups).values_list('image', 'renditions'):
+            used.update(image_names(image, renditions))
+        used.update(UploadIntent.objects.filter(
+            name__in=batch, completed_at__isnull=True
+        ).values_list('name', flat=True))
+    return used.intersection(names)
+
+
+def claim(now, batch_size=BATCH_SIZE):
+    """Lease up to `batch_size` due tombstones; returns their (id, name, attempts)"""
+    from .models import OrphanedBlob
+
+    with transaction.atomic():
+        rows = list(
+            OrphanedBlob.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now, attempts__lt=MAX_ATTEMPTS)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', 'name', 'attempts')[:batch_size]
+        )
+        if rows:
+            OrphanedBlob.objects.filter(pk__in=[row[0] for row in rows]).update(next_attempt_at=now + LEASE)
+    return rows
+
+
+def _delete(storage, name):
+    try:
+        storage.delete(name)  # Deleting a missing file is not an error
+    except Exception as exc:
+        return f'{type(exc).__name__}: {exc}'[:500]
+    return None
+
+
+def sweep_batch(rows, executor, storage=None, now=None):
+    """Delete the files of claimed tombstones; returns (deleted, skipped, failed)"""
+    from .models import OrphanedBlob
+
+    storage = storage or get_storage()
+    now = now or timezone.now()
+    used = in_use(name for _, name, _ in rows)
+    pending = [row for row in rows if row[1] not in used]
+    errors = executor.map(lambda row: _delete(storage, row[1]), pending)
+
+    done = [row[0] for row in rows if row[1] in used]
+    failed = []
+    for (tombstone_id, name, attempts), error in zip(pending, errors):
+        if error is None:
+            done.append(tombstone_id)
+        else:
+            attempts += 1
+            failed.append(OrphanedBlob(
+                id=tombstone_id,
+                attempts=attempts,
+                next_attempt_at=now + RETRY_DELAY * 2 ** (attempts - 1),
+                last_error=error
+            ))
+    OrphanedBlob.objects.filter(pk__in=done).delete()
+    if failed:
+        OrphanedBlob.objects.bulk_update(failed, ['attempts', 'next_attempt_at', 'last_error'])
+    return len(pending) - len(failed), len(rows) - len(pending), len(failed)
+
+
+def expire_intents(now=None):
+    """
+    Drop upload intents that expired unfinished more than GRACE ago (their
+    delete signal files what was uploaded) and long-finished ones; returns
+    the number of unfinished intents dropped
+    """
+    from .models import UploadIntent
+
+    now = now or timezone.now()
+    counts = []
+    for queryset in (
+        UploadIntent.objects.filter(completed_at__isnull=True, expires_at__lt=now - GRACE),
+        UploadIntent.objects.filter(completed_at__lt=now - GRACE),
+    ):
+        count = 0
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:LOOKUP_BATCH_SIZE])
+            if not ids:
+                break
+            UploadIntent.objects.filter(pk__in=ids).delete()
+            count += len(ids)
+        counts.append(count)
+    return counts[0]
+
+
+def sweep(batch_size=BATCH_SIZE, workers=WORKERS, limit=None, pause=0, now=None):
+    """
+    Delete the files of every due tombstone, batch by batch, sleeping
+    `pause` seconds between batches. Returns counts of deleted, skipped
+    (in use again) and failed names, and of expired upload intents.
+    """
+    now = now or timezone.now()
+    storage = get_storage()
+    totals = {'deleted': 0, 'skipped': 0, 'failed': 0, 'expired_uploads': expire_intents(now)}
+    processed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='blob-gc') as executor:
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            rows = claim(now, size)
+            if not rows:
+                break
+            deleted, skipped, failed = sweep_batch(rows, executor, storage, now)
+            totals['deleted'] += deleted
+            totals['skipped'] += skipped
+            totals['failed'] += failed
+            processed += len(rows)
+            if pause:
+                time.sleep(pause)
+    return totals
+
+
+def _sweep_if_idle():
+    if not _sweeping.acquire(blocking=False):
+        return  # The running sweep or the next scheduled run picks the new tombstones up
+    try:
+        sweep()
+    finally:
+        _sweeping.release()
+
+
+def schedule():
+    """Sweep in the background once the current transaction commits"""
+    background.submit(_sweep_if_idle)
+
+
+def due_count(now=None):
+    from .models import OrphanedBlob
+
+    return OrphanedBlob.objects.filter(
+        next_attempt_at__lte=now or timezone.now(), attempts__lt=MAX_ATTEMPTS
+    ).count()
+
+
+def walk(storage, path):
+    """Lists of stored file names under `path`, one per directory"""
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    yield [f'{path}/{name}' for name in files]
+    for directory in sorted(directories):
+        yield from walk(storage, f'{path}/{directory}')
+
+
+def reconcile(root=ROOT, dry_run=False, now=None):
+    """
+    Tombstone stored files under `root` that nothing refers to, due after
+    GRACE; returns (files checked, orphans found)
+    """
+    from .models import OrphanedBlob
+
+    storage = get_storage()
+    # Cloudinary names carry the storage's folder prefix
+    root = getattr(storage, '_prepend_prefix', lambda name: name)(root).rstrip('/')
+    due = (now or timezone.now()) + GRACE
+    checked = found = 0
+    for names in walk(storage, root):
+        for start in range(0, len(names), LOOKUP_BATCH_SIZE):
+            batch = names[start:start + LOOKUP_BATCH_SIZE]
+            known = in_use(batch)
+            known.update(OrphanedBlob.objects.filter(name__in=batch).values_list('name', flat=True))
+            orphans = [name for name in batch if name not in known]
+            if orphans and not dry_run:
+                tombstone(orphans, due)
+            checked += len(batch)
+            found += len(orphans)
+    return checked, found
@@ -0,0 +1,342 @@
+"""
+Bulk listing import from CSV or NDJSON.
+
+Rows are read from a stream and handled CHUNK_SIZE at a time: each row is
+validated by one reused ListingImportSerializer (the same rules as
+ListingSerializer, with categories resolved from memory), and the valid
+rows of a chunk are written with one bulk INSERT for listings and one for
+their images. Bulk inserts skip model signals, so the derived data the
+signals maintain (feed cards, search documents, typeahead weights, cache
+stamps, saved-search alerts, image renditions) is refreshed here once per
+chunk.
+
+Rows may only name images the importing user owns: images of their own
+listings, which are reused as they are, or files staged in media storage
+under imports/<user id>/, which are validated, stripped of metadata
+(listings.image_validation) and copied under listings/ like an upload.
+
+Invalid rows are skipped and reported by line number; they never stop the
+rest of the import.
+"""
+import codecs
+import csv
+import json
+import re
+from django.db import transaction
+from rest_framework import serializers
+from categories.models import Category
+from olx_backend import background
+from .models import Listing, ListingImage
+from .serializers import ListingSerializer
+from .geo import geocode
+from .search import get_search_backend
+from . import cards
+from . import cache as feed_cache
+from . import suggest
+from . import saved_searches
+from . import renditions
+from . import blob_gc
+from . import image_validation
+from .uploads import store_files
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+CONTENT_TYPES = {
+    'text/csv': CSV,
+    'application/x-ndjson': NDJSON,
+    'application/ndjson': NDJSON,
+    'application/jsonl': NDJSON,
+}
+
+CHUNK_SIZE = 500
+
+# Rows accepted by one API request; larger files go through the import_listings command
+MAX_REQUEST_ROWS = 10000
+
+# Errors listed in a report; the failed count still covers every row
+MAX_REPORTED_ERRORS = 1000
+
+# CSV cells holding several image names separate them with this
+IMAGE_SEPARATOR = '|'
+
+# Image names are paths inside the media storage, e.g. imports/12/abc.jpg
+_IMAGE_NAME_RE = re.compile(r'^(?!/)(?!.*\.\.)[\w\-./]+\.(jpe?g|png|gif|webp)$', re.IGNORECASE)
+
+# Where a user stages files for an import, and where their sanitized copies are stored
+STAGING_PREFIX = 'imports/{user_id}/'
+IMPORTED_PREFIX = 'listings/imports/{user_id}/'
+
+# ListingImage fields copied when a row reuses one of the user's images
+REUSED_FIELDS = ('image', 'renditions', 'dhash', 'dhash_0', 'dhash_1', 'dhash_2', 'dhash_3')
+
+
+def format_for_content_type(content_type):
+    """Import format for a request Content-Type, or None"""
+    return CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+
+
+def read_csv(stream):
+    """Yield (line number, row dict, error) from a text stream with a header row"""
+    reader = csv.DictReader(stream)
+    try:
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, 'Row has more cells than the header'
+                continue
+            row = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+            images = row.get('images', '')
+            row['images'] = [name.strip() for name in images.split(IMAGE_SEPARATOR) if name.strip()]
+            yield reader.line_num, row, None
+    except csv.Error as exc:
+        yield reader.line_num, None, f'Malformed CSV: {exc}'
+
+
+def read_ndjson(stream):
+    """Yield (line number, row dict, error) from a text stream of JSON objects"""
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f'Invalid JSON: {exc}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Expected a JSON object'
+            continue
+        yield number, row, None
+
+
+READERS = {CSV: read_csv, NDJSON: read_ndjson}
+
+
+def text_lines(stream):
+    """Decode an iterable of byte lines as UTF-8 (a leading BOM, as Excel writes, is dropped)"""
+    return codecs.iterdecode(stream, 'utf-8-sig')
+
+
+class CategoryLookupField(serializers.Field):
+    """Category by id, slug or name, resolved from context['categories'] without queries"""
+    default_error_messages = {
+        'does_not_exist': 'Unknown category "{value}".',
+    }
+
+    def to_internal_value(self, data):
+        category = self.context['categories'].get(str(data).strip().lower())
+        if category is None:
+            self.fail('does_not_exist', value=data)
+        return category
+
+    def to_representation(self, value):
+        return value.pk
+
+
+class ListingImportSerializer(ListingSerializer):
+    """
+    One import row: the listing's own fields plus up to 5 names of images
+    owned by context['user']. Validated images are ListingImage field
+    values; staged files are copied when the whole row is valid.
+    """
+    user = None
+    category_detail = None
+    uploaded_images = None
+    view_count = None
+    impression_count = None
+    category = CategoryLookupField()
+    images = serializers.ListField(
+        child=serializers.CharField(max_length=100),
+        required=False,
+        max_length=5
+    )
+
+    class Meta:
+        model = Listing
+        fields = ['category', 'title', 'description', 'price', 'location', 'is_sold', 'images']
+
+    def validate_images(self, value):
+        for name in value:
+            if not _IMAGE_NAME_RE.match(name):
+                raise serializers.ValidationError(f'Invalid image name "{name}".')
+        user = self.context['user']
+        staging = STAGING_PREFIX.format(user_id=user.pk)
+        owned = {
+            image['image']: image
+            for image in ListingImage.objects.filter(
+                listing__user=user, image__in=value
+            ).values(*REUSED_FIELDS)
+        }
+        storage = blob_gc.get_storage()
+        images = []
+        for name in value:
+            if name in owned:
+                images.append(owned[name])
+            elif name.startswith(staging) and storage.exists(name):
+                images.append({'image': name, 'staged': True})
+            else:
+                raise serializers.ValidationError(
+                    f'Image "{name}" is neither on one of your listings nor staged under {staging}.'
+                )
+        return images
+
+    def validate(self, data):
+        data = super().validate(data)
+        if any(image.get('staged') for image in data.get('images', [])):
+            data['images'] = self.copy_staged(data['images'])
+        return data
+
+    def copy_staged(self, images):
+        """Sanitize the row's staged files and store the copies; raises ValidationError"""
+        storage = blob_gc.get_storage()
+        field = ListingImage._meta.get_field('image')
+        prefix = IMPORTED_PREFIX.format(user_id=self.context['user'].pk)
+        cleaned = []
+        try:
+            for image in images:
+                if image.get('staged'):
+                    with storage.open(image['image'], 'rb') as source:
+                        upload = image_validation.sanitize(source)
+                    cleaned.append((prefix + upload.name, upload))
+            stored = iter(store_files(storage, cleaned, max_length=field.max_length))
+        except image_validation.InvalidImage as exc:
+            raise serializers.ValidationError({'images': [str(exc)]})
+        finally:
+            for _, upload in cleaned:
+                upload.close()
+        return [
+            {'image': next(stored), 'staged': True} if image.get('staged') else image
+            for image in images
+        ]
+
+
+def category_lookup():
+    """{id, slug and lowercased name: Category} for every category"""
+    lookup = {}
+    for category in Category.objects.all():
+        lookup[str(category.pk)] = category
+        lookup[category.slug.lower()] = category
+        lookup[category.name.lower()] = category
+    return lookup
+
+
+class ImportReport:
+    """Outcome of an import: created ids and per-row errors"""
+
+    def __init__(self):
+        self.created_ids = []
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': len(self.created_ids),
+            'failed': self.failed,
+            'ids': self.created_ids,
+            'errors': self.errors,
+        }
+
+
+def import_listings(stream, import_format, user, chunk_size=CHUNK_SIZE, max_rows=None):
+    """
+    Import listings owned by `user` from a binary stream (any iterable of
+    byte lines: an open file or the request). The row after `max_rows` is
+    reported as an error and nothing further is read.
+    """
+    serializer = ListingImportSerializer(context={'categories': category_lookup(), 'user': user})
+    report = ImportReport()
+    chunk = []
+    count = 0
+    rows = READERS[import_format](text_lines(stream))
+    while True:
+        try:
+            line, row, error = next(rows)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            report.add_error(count + 1, {'non_field_errors': ['File is not valid UTF-8.']})
+            break
+        count += 1
+        if max_rows is not None and count > max_rows:
+            report.add_error(line, {'non_field_errors': [f'Imports are limited to {max_rows} rows.']})
+            break
+        if error:
+            report.add_error(line, {'non_field_errors': [error]})
+            continue
+        try:
+            chunk.append(serializer.run_validation(row))
+        except serializers.ValidationError as exc:
+            report.add_error(line, exc.detail)
+            continue
+        if len(chunk) >= chunk_size:
+            report.created_ids.extend(create_listings(chunk, user))
+            chunk = []
+    if chunk:
+        report.created_ids.extend(create_listings(chunk, user))
+    return report
+
+
+def create_listings(rows, user):
+    """
+    Insert validated rows with their images; returns the new listing ids.
+    If the insert fails, the copies of staged files are tombstoned.
+    """
+    listings = []
+    listing_images = []
+    for data in rows:
+        images = data.pop('images', [])
+        listing = Listing(user=user, **data)
+        listing.latitude, listing.longitude, listing.geohash = geocode(listing.location)
+        if images:
+            listing.cover_image = images[0]['image']
+            listing.cover_thumbnail = renditions.thumbnail_name(images[0].get('renditions'))
+        listings.append(listing)
+        listing_images.append(images)
+
+    try:
+        listing_ids = _insert(listings, listing_images)
+    except Exception:
+        blob_gc.tombstone(
+            image['image'] for images in listing_images for image in images if image.get('staged')
+        )
+        raise
+
+    category_ids = {listing.category_id for listing in listings}
+    feed_cache.bump(feed_cache.FEED, *(feed_cache.category_stamp(category_id) for category_id in category_ids))
+    return listing_ids
+
+
+def _insert(listings, listing_images):
+    with transaction.atomic():
+        Listing.objects.bulk_create(listings)
+        images = ListingImage.objects.bulk_create([
+            ListingImage(
+                listing_id=listing.pk,
+                **{key: value for key, value in image.items() if key != 'staged'}
+            )
+            for listing, images in zip(listings, listing_images)
+            for image in images
+        ])
+        # Reused images keep their renditions and hash
+        renditions.schedule(image.pk for image in images if not image.renditions)
+        listing_ids = [listing.pk for listing in listings]
+        cards.sync_cards(listing_ids)
+        backend = get_search_backend()
+        if backend:
+            backend.index(listing_ids)
+
+        terms = []
+        for listing in listings:
+            terms.extend(suggest.listing_terms(
+                listing.title, listing.location, listing.category_id, listing.category.name,
+                listing.is_active, listing.is_sold
+            ))
+        ops = suggest.listing_ops([], terms)
+        transaction.on_commit(lambda: suggest.publish(ops))
+        background.submit(saved_searches.notify_matches, listing_ids)
+    return listing_ids
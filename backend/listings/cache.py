@@ -0,0 +1,52 @@
+"""
+Version stamps for cached listing reads.
+
+A stamp is the time of the last change to one partition of the listing
+data: the whole feed, one category, or one listing. Cached entries embed
+the stamps they depend on in their key, so bumping a stamp invalidates
+exactly the entries that could have changed and nothing else.
+"""
+import time
+from django.core.cache import cache
+
+STAMP_PREFIX = 'listings:stamp:'
+
+FEED = 'feed'
+
+
+def category_stamp(category_id):
+    return f'category:{category_id}'
+
+
+def listing_stamp(listing_id):
+    return f'listing:{listing_id}'
+
+
+def feed_partition(query_params):
+    """Narrowest stamp covering a feed query: its category if filtered by one"""
+    category = query_params.get('category', '').strip()
+    return category_stamp(category) if category else FEED
+
+
+def get_stamps(*names):
+    """Return {name: stamp}; unknown stamps start now so nothing stale is served"""
+    keys = {STAMP_PREFIX + name: name for name in names}
+    found = cache.get_many(keys.keys())
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {name: found[key] for key, name in keys.items()}
+
+
+def bump(*names):
+    """Mark partitions as changed now"""
+    now = time.time()
+    cache.set_many({STAMP_PREFIX + name: now for name in names}, timeout=None)
+
+
+def bump_listing(listing_id, category_ids):
+    """A listing changed: its own stamp, its categories and the global feed move"""
+    names = [FEED, listing_stamp(listing_id)]
+    names.extend(category_stamp(category_id) for category_id in category_ids if category_id)
+    bump(*names)
@@ -0,0 +1,92 @@
+"""
+Maintenance of the ListingCard read model.
+
+Cards are rebuilt from the source tables with one SELECT and one upsert
+per batch, so the same code serves single saves and bulk jobs.
+"""
+from .models import Listing, ListingCard
+from .trending import base_score
+
+# Listing fields copied onto the card; saves touching none of them skip the sync
+CARD_SOURCE_FIELDS = (
+    'user', 'category', 'title', 'price', 'location',
+    'is_sold', 'is_active', 'cover_image', 'cover_thumbnail', 'created_at',
+    'latitude', 'longitude', 'geohash',
+)
+
+CARD_UPDATE_FIELDS = [
+    'seller_id', 'seller_username', 'category_id', 'category_name', 'title',
+    'price', 'location', 'is_sold', 'is_active', 'cover_image', 'cover_thumbnail',
+    'created_at', 'latitude', 'longitude', 'geohash', 'trending',
+]
+
+BATCH_SIZE = 500
+
+
+def sync_cards(listing_ids):
+    """Create or refresh the cards of the given listings"""
+    listing_ids = list(listing_ids)
+    for start in range(0, len(listing_ids), BATCH_SIZE):
+        batch = listing_ids[start:start + BATCH_SIZE]
+        rows = Listing.objects.filter(pk__in=batch).values(
+            'id', 'user_id', 'user__username', 'category_id', 'category__name',
+            'title', 'price', 'location', 'is_sold', 'is_active',
+            'cover_image', 'cover_thumbnail', 'created_at', 'latitude', 'longitude', 'geohash',
+            'stats__trending'
+        )
+        cards = [
+            ListingCard(
+                listing_id=row['id'],
+                seller_id=row['user_id'],
+                seller_username=row['user__username'],
+                category_id=row['category_id'],
+                category_name=row['category__name'],
+                title=row['title'],
+                price=row['price'],
+                location=row['location'],
+                is_sold=row['is_sold'],
+                is_active=row['is_active'],
+                cover_image=row['cover_image'],
+                cover_thumbnail=row['cover_thumbnail'],
+                created_at=row['created_at'],
+                latitude=row['latitude'],
+                longitude=row['longitude'],
+                geohash=row['geohash'],
+                trending=(
+                    row['stats__trending'] if row['stats__trending'] is not None
+                    else base_score(row['created_at'])
+                ),
+            )
+            for row in rows
+        ]
+        ListingCard.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=['listing'],
+            update_fields=CARD_UPDATE_FIELDS
+        )
+
+
+def rebuild_cards():
+    """Rebuild every card from scratch"""
+    ListingCard.objects.all().delete()
+    sync_cards(Listing.objects.order_by('pk').values_list('pk', flat=True).iterator())
+
+
+def rename_seller(user):
+    """Propagate a username change to the seller's cards"""
+    ListingCard.objects.filter(seller_id=user.pk).exclude(
+        seller_username=user.username
+    ).update(seller_username=user.username)
+
+
+def rename_category(category):
+    """Propagate a category rename to its cards"""
+    ListingCard.objects.filter(category_id=category.pk).exclude(
+        category_name=category.name
+    ).update(category_name=category.name)
+
+
+def set_cover_image(listing_id, name, thumbnail=''):
+    """Mirror a cover image change (already applied to Listing) onto the card"""
+    ListingCard.objects.filter(listing_id=listing_id).update(cover_image=name, cover_thumbnail=thumbnail)
@@ -0,0 +1,306 @@
+"""
+Buffered view and impression counters for listings.
+
+Hits are counted in a buffer, never in the listing row: in process memory,
+or in Redis hashes when LISTING_COUNTERS_URL is set (so every worker
+shares one buffer). Buffered deltas are written to ListingStats at most
+once per FLUSH_INTERVAL with one batched upsert that adds to the stored
+totals, so a popular listing costs one row update per flush instead of
+one per hit, and never touches listings_listing.
+
+Flushes run in the background (olx_backend.background), started by the
+first hit after the interval is up, so a read never waits for one. Counting
+is best effort: if the buffer or the database is unavailable the error is
+logged and the hit dropped; the request that counted it still succeeds.
+
+Live counts are the stored totals plus whatever is still buffered
+(in-process buffers only see their own process), so they lag the truth by
+at most one flush interval. Counts are approximate by design: a process
+that exits loses the hits it buffered since its last flush.
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from olx_backend import background
+from . import trending
+
+logger = logging.getLogger(__name__)
+
+VIEW = 'view'
+IMPRESSION = 'impression'
+KINDS = (VIEW, IMPRESSION)
+
+# ListingStats column for each counter
+COLUMNS = {VIEW: 'view_count', IMPRESSION: 'impression_count'}
+
+FLUSH_INTERVAL = getattr(settings, 'LISTING_COUNTERS_FLUSH_INTERVAL', 30)
+
+# Upsert rows per statement
+FLUSH_BATCH_SIZE = 500
+
+
+class LocalCounterBuffer:
+    """Per-process buffer: {kind: {listing_id: delta}}"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deltas = {kind: defaultdict(int) for kind in KINDS}
+
+    def incr(self, kind, listing_ids):
+        with self.lock:
+            counts = self.deltas[kind]
+            for listing_id in listing_ids:
+                counts[listing_id] += 1
+
+    def pending(self, listing_ids):
+        with self.lock:
+            return {
+                kind: {listing_id: self.deltas[kind].get(listing_id, 0) for listing_id in listing_ids}
+                for kind in KINDS
+            }
+
+    def drain(self):
+        """Take every buffered delta; returns (deltas, token for ack())"""
+        with self.lock:
+            deltas = self.deltas
+            self.deltas = {kind: defaultdict(int) for kind in KINDS}
+        return deltas, None
+
+    def ack(self, token):
+        pass
+
+    def restore(self, deltas):
+        """Put back deltas whose flush failed"""
+        with self.lock:
+            for kind, counts in deltas.items():
+                for listing_id, delta in counts.items():
+                    self.deltas[kind][listing_id] += delta
+
+    def claim_interval(self, interval):
+        # Each process flushes its own buffer; maybe_flush() already keeps time
+        return True
+
+    @contextmanager
+    def flush_lock(self):
+        # drain() swaps the buffer atomically; concurrent flushes take disjoint deltas
+        yield True
+
+
+class RedisCounterBuffer:
+    """
+    Shared buffer in Redis hashes (listing id -> delta), one per counter.
+    A flush renames the live hashes away atomically, so hits arriving
+    mid-flush land in fresh hashes, and deletes the renamed copies only
+    after the database write; copies left by a failed flush are picked up
+    by the next one.
+    """
+    KEY = 'listings:counters:{}'
+    FLUSHING_KEY = 'listings:counters:flushing:{}:{}'
+    FLUSH_LOCK_KEY = 'listings:counters:flush-lock'
+    FLUSHED_AT_KEY = 'listings:counters:flushed-at'
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def incr(self, kind, listing_ids):
+        pipeline = self.client.pipeline(transaction=False)
+        for listing_id in listing_ids:
+            pipeline.hincrby(self.KEY.format(kind), listing_id, 1)
+        pipeline.execute()
+
+    def pending(self, listing_ids):
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return {kind: {} for kind in KINDS}
+        pipeline = self.client.pipeline(transaction=False)
+        for kind in KINDS:
+            pipeline.hmget(self.KEY.format(kind), listing_ids)
+        results = pipeline.execute()
+        return {
+            kind: {listing_id: int(value or 0) for listing_id, value in zip(listing_ids, values)}
+            for kind, values in zip(KINDS, results)
+        }
+
+    def drain(self):
+        import redis
+        token = uuid.uuid4().hex
+        for kind in KINDS:
+            try:
+                self.client.rename(self.KEY.format(kind), self.FLUSHING_KEY.format(kind, token))
+            except redis.ResponseError:
+                pass  # Nothing buffered for this counter
+        deltas = {kind: defaultdict(int) for kind in KINDS}
+        keys = []
+        for kind in KINDS:
+            for key in self.client.scan_iter(match=self.FLUSHING_KEY.format(kind, '*')):
+                keys.append(key)
+                for listing_id, value in self.client.hgetall(key).items():
+                    deltas[kind][int(listing_id)] += int(value)
+        return deltas, keys
+
+    def ack(self, keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def restore(self, deltas):
+        # The renamed hashes are only deleted on ack(); the next flush retries them
+        pass
+
+    def claim_interval(self, interval):
+        """True for the first process asking in each interval"""
+        return bool(self.client.set(self.FLUSHED_AT_KEY, 1, nx=True, ex=max(1, int(interval))))
+
+    @contextmanager
+    def flush_lock(self):
+        """Yields False if another process is flushing (it would count the same copies)"""
+        acquired = bool(self.client.set(self.FLUSH_LOCK_KEY, 1, nx=True, ex=60))
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.client.delete(self.FLUSH_LOCK_KEY)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def get_buffer():
+    """The configured buffer (Redis if LISTING_COUNTERS_URL is set)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                url = getattr(settings, 'LISTING_COUNTERS_URL', '')
+                _buffer = RedisCounterBuffer(url) if url else LocalCounterBuffer()
+    return _buffer
+
+
+def record(kind, listing_ids):
+    """Count one hit of `kind` for each listing; starts a flush when the interval is up"""
+    listing_ids = [int(listing_id) for listing_id in listing_ids]
+    if not listing_ids:
+        return
+    try:
+        get_buffer().incr(kind, listing_ids)
+    except Exception:
+        logger.exception('Could not count %s hits', kind)
+        return
+    maybe_flush()
+
+
+def record_view(listing_id):
+    record(VIEW, [listing_id])
+
+
+def record_impressions(listing_ids):
+    record(IMPRESSION, listing_ids)
+
+
+def maybe_flush():
+    """Flush in the background if this process hasn't for FLUSH_INTERVAL"""
+    global _last_flush
+    now = time.monotonic()
+    if now - _last_flush < FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    background.submit(_flush_if_claimed)
+
+
+def _flush_if_claimed():
+    if get_buffer().claim_interval(FLUSH_INTERVAL):
+        flush()
+
+
+def flush():
+    """Write buffered deltas to ListingStats; returns the number of listings updated"""
+    buffer = get_buffer()
+    with buffer.flush_lock() as acquired:
+        if not acquired:
+            return 0
+        return _flush(buffer)
+
+
+def _flush(buffer):
+    deltas, token = buffer.drain()
+    rows = defaultdict(lambda: [0, 0])
+    for index, kind in enumerate(KINDS):
+        for listing_id, delta in deltas[kind].items():
+            if delta:
+                rows[listing_id][index] += delta
+    if not rows:
+        buffer.ack(token)
+        return 0
+    try:
+        written = write_deltas(rows)
+    except Exception:
+        buffer.restore(deltas)
+        raise
+    buffer.ack(token)
+    return written
+
+
+def write_deltas(rows):
+    """Add {listing_id: [views, impressions]} to the stored totals in batched upserts"""
+    from .models import Listing, ListingStats
+
+    # Hits on listings deleted since would violate the foreign key
+    existing = set()
+    listing_ids = sorted(rows)
+    for start in range(0, len(listing_ids), FLUSH_BATCH_SIZE):
+        existing.update(Listing.objects.filter(
+            pk__in=listing_ids[start:start + FLUSH_BATCH_SIZE]
+        ).values_list('pk', flat=True))
+
+    table = connection.ops.quote_name(ListingStats._meta.db_table)
+    columns = [COLUMNS[kind] for kind in KINDS]
+    sql = (
+        f"INSERT INTO {table} (listing_id, {', '.join(columns)}, updated_at) "
+        f"VALUES (%s, {', '.join(['%s'] * len(columns))}, %s) "
+        f"ON CONFLICT (listing_id) DO UPDATE SET "
+        + ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in columns)
+        + ', updated_at = excluded.updated_at'
+    )
+    now = timezone.now()
+    # Sorted ids keep concurrent flushers from deadlocking on each other's rows
+    params = [(listing_id, *rows[listing_id], now) for listing_id in listing_ids if listing_id in existing]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(params), FLUSH_BATCH_SIZE):
+            cursor.executemany(sql, params[start:start + FLUSH_BATCH_SIZE])
+    trending.record({
+        listing_id: views * trending.VIEW_WEIGHT
+        for listing_id, (views, _) in rows.items() if listing_id in existing
+    })
+    return len(params)
+
+
+def get_counts(listing_ids):
+    """{listing_id: {'view_count': n, 'impression_count': n}} with buffered hits included"""
+    from .models import ListingStats
+
+    listing_ids = [int(listing_id) for listing_id in listing_ids]
+    counts = {listing_id: {column: 0 for column in COLUMNS.values()} for listing_id in listing_ids}
+    for row in ListingStats.objects.filter(listing_id__in=listing_ids).values('listing_id', *COLUMNS.values()):
+        counts[row.pop('listing_id')].update(row)
+    try:
+        pending = get_buffer().pending(listing_ids)
+    except Exception:
+        logger.exception('Could not read buffered counts')
+        return counts
+    for kind, column in COLUMNS.items():
+        for listing_id, delta in pending[kind].items():
+            counts[listing_id][column] += delta
+    return counts
+
+
+def staleness_window():
+    """Changes every FLUSH_INTERVAL; versions cached reads that embed live counts"""
+    return int(time.time() // FLUSH_INTERVAL)
@@ -0,0 +1,283 @@
+"""
+Direct-to-storage uploads of listing images.
+
+Uploads never pass through the app servers:
+
+1. POST /api/listings/{id}/upload-intents/ reserves a storage name for one
+   image (an UploadIntent) and returns a signed upload target for it.
+2. The client sends the file straight to that target.
+3. POST /api/listings/{id}/images/ finalizes the intent: the stored object
+   is read back once and sanitized like a form upload (validated and
+   stripped of metadata by listings.image_validation), and the cleaned
+   copy becomes a ListingImage, which triggers the usual cover, rendition
+   and cache updates. The raw upload is tombstoned (listings.blob_gc), so
+   nothing published carries the client's EXIF or GPS data.
+
+The intent is marked as finalizing (finalizing_at) before the stored
+object is read, outside any lock, so no upload can replace the object
+while it is read; a failed finalize releases it.
+
+The target comes from the upload backend (DIRECT_UPLOAD_BACKEND):
+CloudinaryUploadBackend signs a Cloudinary upload for the reserved public
+id, refusing to overwrite an existing object; LocalUploadBackend, the
+stand-in for tests and offline runs, signs a URL on this app that accepts
+a PUT of the file into STORAGES['default'].
+"""
+import tempfile
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import blob_gc
+from . import image_validation
+from .uploads import delete_files
+
+INTENT_TTL = timedelta(minutes=15)
+
+MAX_IMAGES = 5
+MAX_SIZE = image_validation.MAX_SIZE
+
+CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+# Bytes downloaded at a time when an upload is read back
+CHUNK_SIZE = image_validation.CHUNK_SIZE
+
+
+class UploadError(Exception):
+    """An intent that can't be created or finalized; the message is shown to the client"""
+
+
+class LocalUploadBackend:
+    """Signed PUT to this app (DirectUploadView), stored in STORAGES['default']"""
+    salt = 'listings.direct_uploads'
+
+    def storage_name(self, listing_id, intent_id, extension):
+        return f'listings/{listing_id}/uploads/{intent_id.hex}.{extension}'
+
+    def target(self, intent, request):
+        token = signing.dumps(str(intent.pk), salt=self.salt)
+        return {
+            'method': 'PUT',
+            'url': request.build_absolute_uri(reverse('listings:direct-upload', args=[token])),
+            'headers': {'Content-Type': intent.content_type},
+            'fields': {},
+        }
+
+    def intent_for_token(self, token):
+        """UploadIntent open for uploads that a signed token grants, or None"""
+        try:
+            intent_id = signing.loads(token, salt=self.salt, max_age=INTENT_TTL)
+        except signing.BadSignature:
+            return None
+        return open_intents().filter(pk=intent_id).first()
+
+    def receive(self, intent, stream):
+        """
+        Store an uploaded body under the intent's reserved name while holding
+        the intent's row lock; returns False once finalizing has begun. A body
+        over the limit (OverflowError from the stream) is not kept.
+        """
+        with transaction.atomic():
+            if open_intents().select_for_update().filter(pk=intent.pk).first() is None:
+                return False
+            default_storage.delete(intent.name)  # A repeated PUT replaces the earlier upload
+            try:
+                default_storage.save(intent.name, File(stream))
+            except OverflowError:
+                default_storage.delete(intent.name)
+                raise
+        return True
+
+    def fetch(self, name):
+        """Open a stored object for reading, or None if missing"""
+        if not default_storage.exists(name):
+            return None
+        return default_storage.open(name, 'rb')
+
+    def delete(self, name):
+        default_storage.delete(name)
+
+
+class CloudinaryUploadBackend(LocalUploadBackend):
+    """Signed upload straight to Cloudinary under the reserved public id"""
+
+    def storage_name(self, listing_id, intent_id, extension):
+        # Stored names of MediaCloudinaryStorage are public ids with its folder prefix
+        return default_storage._prepend_prefix(f'listings/{listing_id}/uploads/{intent_id.hex}')
+
+    def target(self, intent, request):
+        import cloudinary
+        import cloudinary.utils
+
+        params = {
+            'public_id': intent.name,
+            'timestamp': int(time.time()),
+            'tags': default_storage.TAG,
+            'allowed_formats': ','.join(sorted(CONTENT_TYPES.values())),
+            # Signed uploads overwrite by default: once stored, the object can't be replaced
+            'overwrite': 'false',
+        }
+        config = cloudinary.config()
+        return {
+            'method': 'POST',
+            'url': cloudinary.utils.cloudinary_api_url('upload', resource_type='image'),
+            'headers': {},
+            'fields': {
+                **params,
+                'api_key': config.api_key,
+                'signature': cloudinary.utils.api_sign_request(params, config.api_secret),
+            },
+        }
+
+    def intent_for_token(self, token):
+        return None  # Uploads go to Cloudinary, never to this app
+
+    def fetch(self, name):
+        """Download a stored object to a spooled file, reading at most one byte over MAX_SIZE"""
+        import requests
+
+        with requests.get(default_storage.url(name), stream=True, timeout=10) as response:
+            if response.status_code == 404:
+                return None
+            response.raise_for_status()
+            file = tempfile.SpooledTemporaryFile(max_size=image_validation.SPOOL_SIZE)
+            size = 0
+            for chunk in response.iter_content(CHUNK_SIZE):
+                file.write(chunk)
+                size += len(chunk)
+                if size > MAX_SIZE:
+                    break  # sanitize() rejects it as too large
+        file.seek(0)
+        return File(file, name)
+
+
+def open_intents():
+    """UploadIntents that still accept an upload: unexpired, neither finalizing nor finalized"""
+    from .models import UploadIntent
+
+    return UploadIntent.objects.filter(
+        completed_at__isnull=True, finalizing_at__isnull=True, expires_at__gt=timezone.now()
+    )
+
+
+_backend = None
+
+
+def get_backend():
+    """The configured backend; by default Cloudinary when media is stored there"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'DIRECT_UPLOAD_BACKEND', '')
+        if not path:
+            storage = settings.STORAGES['default']['BACKEND']
+            path = (
+                'listings.direct_uploads.CloudinaryUploadBackend' if storage.startswith('cloudinary_storage.')
+                else 'listings.direct_uploads.LocalUploadBackend'
+            )
+        _backend = import_string(path)()
+    return _backend
+
+
+def create_intent(listing, user, content_type):
+    """Reserve a storage name for one more image of `listing`"""
+    from .models import UploadIntent
+
+    extension = CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+    if extension is None:
+        raise UploadError(f"Unsupported content type. Allowed: {', '.join(CONTENT_TYPES)}")
+    now = timezone.now()
+    reserved = listing.images.count() + UploadIntent.objects.filter(
+        listing=listing, completed_at__isnull=True, expires_at__gt=now
+    ).count()
+    if reserved >= MAX_IMAGES:
+        raise UploadError(f'Maximum {MAX_IMAGES} images allowed per listing')
+    intent = UploadIntent(
+        user=user,
+        listing=listing,
+        content_type=content_type.split(';')[0].strip().lower(),
+        expires_at=now + INTENT_TTL
+    )
+    intent.name = get_backend().storage_name(listing.pk, intent.pk, extension)
+    intent.save()
+    return intent
+
+
+def claim(listing, intent_id):
+    """
+    Mark an intent of `listing` as finalizing, so uploads to it stop;
+    returns the intent. Raises UploadError.
+    """
+    from .models import UploadIntent
+
+    with transaction.atomic():
+        intent = UploadIntent.objects.select_for_update().filter(
+            pk=intent_id, listing=listing, completed_at__isnull=True
+        ).first()
+        if intent is None:
+            raise UploadError('Unknown or already finalized upload')
+        if intent.finalizing_at is not None:
+            raise UploadError('This upload is already being finalized')
+        if intent.expires_at <= timezone.now():
+            raise UploadError('Upload expired; request a new upload target')
+        if listing.images.count() >= MAX_IMAGES:
+            raise UploadError(f'Maximum {MAX_IMAGES} images allowed per listing')
+        intent.finalizing_at = timezone.now()
+        intent.save(update_fields=['finalizing_at'])
+    return intent
+
+
+def finalize(listing, intent_id):
+    """
+    Attach a sanitized copy of the object uploaded for an intent to
+    `listing`; returns the ListingImage. The stored object is read with no
+    lock held.
+    """
+    from .models import ListingImage, UploadIntent
+
+    backend = get_backend()
+    field = ListingImage._meta.get_field('image')
+    intent = claim(listing, intent_id)
+    name = None
+    try:
+        source = backend.fetch(intent.name)
+        if source is None:
+            raise UploadError('Nothing has been uploaded for this upload yet')
+        try:
+            cleaned = image_validation.sanitize(source)
+        except image_validation.InvalidImage as exc:
+            backend.delete(intent.name)
+            raise UploadError(str(exc))
+        finally:
+            source.close()
+        try:
+            name = field.storage.save(
+                field.generate_filename(ListingImage(listing=listing), cleaned.name),
+                cleaned,
+                max_length=field.max_length
+            )
+        finally:
+            cleaned.close()
+
+        with transaction.atomic():
+            image = ListingImage.objects.create(listing=listing, image=name)
+            UploadIntent.objects.filter(pk=intent.pk).update(completed_at=timezone.now())
+            blob_gc.tombstone([intent.name])
+            blob_gc.schedule()
+    except Exception:
+        if name:
+            delete_files(field.storage, [name])
+        # Let the client upload again and retry
+        UploadIntent.objects.filter(pk=intent.pk, completed_at__isnull=True).update(finalizing_at=None)
+        raise
+    return image
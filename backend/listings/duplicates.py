@@ -0,0 +1,175 @@
+"""
+Near-duplicate listing photos.
+
+Every ListingImage gets a 64-bit difference hash (dHash): the picture
+is shrunk to 9x8 greyscale and each bit records whether a pixel is
+brighter than its right-hand neighbour. Re-encoded, resized or lightly
+edited copies of a photo land within a few bits of each other, so
+"near-identical" means a small Hamming distance.
+
+Hashes are stored on the image (dhash) together with its four 16-bit
+bands (dhash_0..dhash_3), each with its own index: a multi-index hash
+table. Two hashes within distance d differ by at most d // 4 bits in at
+least one band (pigeonhole), so a lookup asks each band index for the
+band values within that radius (1 value for d < 4, 17 for d < 8) and
+checks the exact distance of the few candidates found. That stays an
+index lookup however many images are stored.
+
+Hashes are computed with the renditions (listings.renditions), from the
+decoded upright image; hash_images() fills in images that have none.
+"""
+import logging
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Hamming distance (out of 64) still treated as the same photo
+MAX_DISTANCE = 6
+
+# Largest distance a lookup may ask for: band radius 1
+MAX_SEARCH_DISTANCE = 2 * BANDS - 1
+
+HASH_SIZE = 8
+
+UNSIGNED = 1 << 64
+
+
+def dhash(image):
+    """64-bit difference hash of a PIL image, as an unsigned int"""
+    pixels = list(
+        image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR).getdata()
+    )
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for column in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+def hash_file(file):
+    """dHash of an image file as it is displayed (EXIF orientation applied)"""
+    file.seek(0)
+    with Image.open(file) as image:
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))  # JPEG: decode at a reduced scale
+        value = dhash(ImageOps.exif_transpose(image))
+    file.seek(0)
+    return value
+
+
+def to_signed(value):
+    """Unsigned 64-bit hash as stored in a BigIntegerField"""
+    return value - UNSIGNED if value >= UNSIGNED >> 1 else value
+
+
+def to_unsigned(value):
+    return value % UNSIGNED
+
+
+def bands(value):
+    """The 16-bit bands of an unsigned hash, most significant first"""
+    return [(value >> (BAND_BITS * (BANDS - 1 - band))) & BAND_MASK for band in range(BANDS)]
+
+
+def hash_fields(value):
+    """ListingImage field values for an unsigned hash"""
+    fields = {'dhash': to_signed(value)}
+    for band, band_value in enumerate(bands(value)):
+        # Bands are stored signed so they fit a SmallIntegerField
+        fields[f'dhash_{band}'] = band_value - (1 << (BAND_BITS - 1))
+    return fields
+
+
+def distance(first, second):
+    return (to_unsigned(first) ^ to_unsigned(second)).bit_count()
+
+
+def _band_values(band_value, radius):
+    values = [band_value]
+    if radius:
+        values.extend(band_value ^ (1 << bit) for bit in range(BAND_BITS))
+    return [value - (1 << (BAND_BITS - 1)) for value in values]
+
+
+def lookup_q(value, max_distance=MAX_DISTANCE):
+    """Condition matching every image that could be within `max_distance` of an unsigned hash"""
+    radius = min(max_distance, MAX_SEARCH_DISTANCE) // BANDS
+    condition = Q()
+    for band, band_value in enumerate(bands(value)):
+        condition |= Q(**{f'dhash_{band}__in': _band_values(band_value, radius)})
+    return condition
+
+
+def near_images(hashes, max_distance=MAX_DISTANCE, queryset=None):
+    """
+    Stored images within `max_distance` of any of `hashes` (unsigned);
+    returns [(index into hashes, image id, listing id, distance)], closest first
+    """
+    from .models import ListingImage
+
+    hashes = list(hashes)
+    if not hashes:
+        return []
+    queryset = ListingImage.objects.all() if queryset is None else queryset
+    condition = Q()
+    for value in hashes:
+        condition |= lookup_q(value, max_distance)
+    matches = []
+    for image_id, listing_id, stored in queryset.filter(condition).values_list('id', 'listing_id', 'dhash'):
+        for index, value in enumerate(hashes):
+            gap = distance(value, stored)
+            if gap <= max_distance:
+                matches.append((index, image_id, listing_id, gap))
+    matches.sort(key=lambda match: (match[3], match[1]))
+    return matches
+
+
+def duplicate_listings(listing, max_distance=MAX_DISTANCE):
+    """
+    Other listings with photos near-identical to `listing`'s; returns
+    {listing id: [(image id, matching image id, distance), ...]}, closest first
+    """
+    from .models import ListingImage
+
+    images = list(
+        ListingImage.objects.filter(listing=listing, dhash__isnull=False).values_list('id', 'dhash')
+    )
+    found = {}
+    for index, image_id, listing_id, gap in near_images(
+        [to_unsigned(value) for _, value in images],
+        max_distance,
+        ListingImage.objects.exclude(listing=listing)
+    ):
+        found.setdefault(listing_id, []).append((images[index][0], image_id, gap))
+    return found
+
+
+def hash_images(image_ids):
+    """Compute missing hashes of stored images; returns the number hashed"""
+    from .models import ListingImage
+
+    storage = ListingImage._meta.get_field('image').storage
+    done = 0
+    for image_id, name in ListingImage.objects.filter(
+        pk__in=list(image_ids), dhash__isnull=True
+    ).values_list('id', 'image'):
+        try:
+            with storage.open(name, 'rb') as source:
+                value = hash_file(source)
+        except Exception:
+            logger.exception('Could not hash image %s (%s)', image_id, name)
+            continue
+        ListingImage.objects.filter(pk=image_id).update(**hash_fields(value))
+        done += 1
+    return done
+
+
+def unhashed_image_ids():
+    from .models import ListingImage
+
+    return ListingImage.objects.filter(dhash__isnull=True).order_by('pk').values_list('pk', flat=True)
@@ -0,0 +1,149 @@
+"""
+Automatic listing expiry.
+
+Live listings older than their lifetime (the category's
+listing_lifetime_days, else LISTING_LIFETIME_DAYS) are deactivated the way
+moderators do it: is_active off, deactivated_at and deactivation_reason set.
+
+expire() walks the live-listing index on created_at oldest first,
+CHUNK_SIZE rows at a time. Each chunk is claimed and updated in one short
+transaction (SELECT ... FOR UPDATE SKIP LOCKED, then one bulk UPDATE), so
+rows are locked only for the duration of one chunk and rows a seller is
+editing are left for the next run. Bulk updates skip model signals, so
+each chunk refreshes feed cards, typeahead weights and cache stamps
+itself, then notifies the sellers with one batched insert.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import cards
+from . import cache as feed_cache
+from . import suggest
+
+CHUNK_SIZE = 500
+
+EXPIRY_REASON = 'Expired'
+
+
+def lifetime_groups():
+    """[(lifetime in days, category filter), ...] covering every category"""
+    from categories.models import Category
+
+    overrides = {}
+    for category_id, days in Category.objects.filter(
+        listing_lifetime_days__isnull=False
+    ).values_list('id', 'listing_lifetime_days'):
+        overrides.setdefault(days, []).append(category_id)
+    overridden = [category_id for ids in overrides.values() for category_id in ids]
+    groups = [(settings.LISTING_LIFETIME_DAYS, {'exclude': overridden})]
+    groups.extend((days, {'include': ids}) for days, ids in sorted(overrides.items()))
+    return groups
+
+
+def expired_queryset(cutoff, categories):
+    from .models import Listing
+
+    queryset = Listing.objects.filter(is_active=True, is_sold=False, created_at__lt=cutoff)
+    if categories.get('include') is not None:
+        queryset = queryset.filter(category_id__in=categories['include'])
+    elif categories.get('exclude'):
+        queryset = queryset.exclude(category_id__in=categories['exclude'])
+    return queryset
+
+
+def expire_chunk(queryset, now, chunk_size=CHUNK_SIZE):
+    """Deactivate up to `chunk_size` of the oldest listings in `queryset`; returns their rows"""
+    from .models import Listing
+
+    with transaction.atomic():
+        rows = list(
+            queryset.select_for_update(skip_locked=True, of=('self',))
+            .order_by('created_at', 'id')
+            .values_list('id', 'user_id', 'category_id', 'title', 'location')[:chunk_size]
+        )
+        if rows:
+            Listing.objects.filter(pk__in=[row[0] for row in rows]).update(
+                is_active=False,
+                deactivated_at=now,
+                deactivation_reason=EXPIRY_REASON,
+                updated_at=now
+            )
+    return rows
+
+
+def after_expiry(rows):
+    """Refresh what the listing signals would have for a chunk of expired listings"""
+    listing_ids = [row[0] for row in rows]
+    cards.sync_cards(listing_ids)
+
+    ops = suggest.listing_ops(
+        [
+            term for _, _, category_id, title, location in rows
+            for term in suggest.listing_terms(title, location, category_id, None)
+        ],
+        []
+    )
+    suggest.publish(ops)
+
+    feed_cache.bump(
+        feed_cache.FEED,
+        *{feed_cache.category_stamp(row[2]) for row in rows},
+        *(feed_cache.listing_stamp(listing_id) for listing_id in listing_ids)
+    )
+    notify_sellers(rows)
+
+
+def notify_sellers(rows):
+    """One 'listing_expired' notification per listing, inserted together"""
+    from notifications.models import Notification, NotificationPreference
+    from notifications.services import NotificationService
+
+    muted = set(NotificationPreference.objects.filter(
+        user_id__in={row[1] for row in rows}, enable_in_app=False
+    ).values_list('user_id', flat=True))
+    notifications = [
+        Notification(
+            recipient_id=user_id,
+            notification_type='listing_expired',
+            title='Listing expired',
+            message=f'Your listing "{title}" has expired and is no longer shown to buyers.',
+            link_url=f'/listings/{listing_id}',
+            metadata={'listing_id': listing_id}
+        )
+        for listing_id, user_id, _, title, _ in rows
+        if user_id not in muted
+    ]
+    if notifications:
+        NotificationService.create_notifications(notifications)
+
+
+def expire(now=None, chunk_size=CHUNK_SIZE, pause=0, limit=None):
+    """
+    Expire every listing past its lifetime, chunk by chunk, sleeping `pause`
+    seconds between chunks. Returns the number of listings expired.
+    """
+    now = now or timezone.now()
+    expired = 0
+    for days, categories in lifetime_groups():
+        queryset = expired_queryset(now - timedelta(days=days), categories)
+        while limit is None or expired < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - expired)
+            rows = expire_chunk(queryset, now, size)
+            if not rows:
+                break
+            after_expiry(rows)
+            expired += len(rows)
+            if pause:
+                time.sleep(pause)
+    return expired
+
+
+def pending_count(now=None):
+    """Live listings past their lifetime"""
+    now = now or timezone.now()
+    return sum(
+        expired_queryset(now - timedelta(days=days), categories).count()
+        for days, categories in lifetime_groups()
+    )
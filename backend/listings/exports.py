@@ -0,0 +1,168 @@
+"""
+Streaming exports of whole tables for the admin API.
+
+Rows are read with .values_list().iterator(chunk_size=...) (a server-side
+cursor on PostgreSQL), encoded as CSV or NDJSON and written out in
+buffered pieces, so memory stays flat however large the table is. Only
+plain columns are exported (ids, and names through to-one joins); no
+model instances or serializers are involved.
+"""
+import csv
+import json
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+from .models import Listing, ListingReport, AdminAction
+
+CHUNK_SIZE = 2000
+
+# Encoded rows are joined into pieces of about this size before being written
+BUFFER_SIZE = 64 * 1024
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# name -> (model, [(column header, values lookup), ...])
+DATASETS = {
+    'listings': (Listing, [
+        ('id', 'id'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('category_id', 'category_id'),
+        ('category', 'category__name'),
+        ('title', 'title'),
+        ('description', 'description'),
+        ('price', 'price'),
+        ('location', 'location'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+        ('is_sold', 'is_sold'),
+        ('is_active', 'is_active'),
+        ('deactivated_at', 'deactivated_at'),
+        ('deactivation_reason', 'deactivation_reason'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'reports': (ListingReport, [
+        ('id', 'id'),
+        ('listing_id', 'listing_id'),
+        ('listing_title', 'listing__title'),
+        ('reported_by_id', 'reported_by_id'),
+        ('reported_by', 'reported_by__username'),
+        ('reason', 'reason'),
+        ('description', 'description'),
+        ('status', 'status'),
+        ('reviewed_by_id', 'reviewed_by_id'),
+        ('reviewed_by', 'reviewed_by__username'),
+        ('reviewed_at', 'reviewed_at'),
+        ('admin_notes', 'admin_notes'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'audit-log': (AdminAction, [
+        ('id', 'id'),
+        ('admin_id', 'admin_id'),
+        ('admin', 'admin__username'),
+        ('action', 'action'),
+        ('target_user_id', 'target_user_id'),
+        ('target_user', 'target_user__username'),
+        ('target_listing_id', 'target_listing_id'),
+        ('target_report_id', 'target_report_id'),
+        ('notes', 'notes'),
+        ('created_at', 'created_at'),
+    ]),
+}
+
+
+class CSVExportRenderer(BaseRenderer):
+    """
+    Selects CSV for ?format=csv / Accept: text/csv. Exports stream their
+    own body; this only renders errors (as JSON).
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class NDJSONExportRenderer(CSVExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+def export_rows(queryset, lookups, since=None, until=None):
+    """Row tuples in primary key order, fetched CHUNK_SIZE at a time"""
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    return queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back what was written"""
+
+    def write(self, value):
+        return value
+
+
+def escape_formula(value):
+    """Quote user text a spreadsheet would run as a formula (CSV injection)"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def encode_csv(headers, rows):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([escape_formula(value) for value in row])
+
+
+def encode_ndjson(headers, rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for row in rows:
+        yield encoder.encode(dict(zip(headers, row))) + '\n'
+
+
+ENCODERS = {'csv': encode_csv, 'ndjson': encode_ndjson}
+
+
+def buffered(pieces, size=BUFFER_SIZE):
+    """Join small strings into UTF-8 chunks of about `size` bytes"""
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(buffer).encode()
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def stream_export(dataset, export_format, since=None, until=None):
+    """Encoded chunks of a whole dataset"""
+    model, columns = DATASETS[dataset]
+    headers = [header for header, _ in columns]
+    rows = export_rows(model.objects.all(), [lookup for _, lookup in columns], since, until)
+    return buffered(ENCODERS[export_format](headers, rows))
+
+
+async def iterate_async(chunks):
+    """
+    Serve a sync chunk iterator to an ASGI server one chunk at a time
+    (Django would otherwise read a sync iterator to the end before sending).
+    """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    iterator = iter(chunks)
+    while True:
+        chunk = await next_chunk(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
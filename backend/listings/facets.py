@@ -0,0 +1,107 @@
+"""
+Facet counts for the listing browser.
+
+All facets come from one grouped query over the filtered feed, grouped by
+(category, location, price bucket); the per-facet totals are rolled up in
+Python. Results are cached per normalized filter set and keyed on the
+cache stamps of the data they cover.
+"""
+import hashlib
+from collections import Counter
+from urllib.parse import urlencode
+from django.core.cache import cache
+from django.db.models import Case, Count, IntegerField, Value, When
+from . import cache as feed_cache
+
+# (min, max) in listing currency; max=None is open-ended
+PRICE_BUCKETS = [
+    (0, 1000),
+    (1000, 5000),
+    (5000, 20000),
+    (20000, 100000),
+    (100000, None),
+]
+
+# Query parameters that change the facet result; everything else is ignored
+FACET_FILTER_PARAMS = (
+    'category', 'is_sold', 'location', 'min_price', 'max_price', 'search',
+    'lat', 'lng', 'radius_km',
+)
+
+FACET_CACHE_TIMEOUT = 60 * 10
+
+
+def price_bucket_expression():
+    whens = []
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        condition = {'price__gte': low}
+        if high is not None:
+            condition['price__lt'] = high
+        whens.append(When(then=Value(index), **condition))
+    return Case(*whens, default=Value(0), output_field=IntegerField())
+
+
+def compute_facets(queryset):
+    """Count listings per category, location and price bucket in one pass"""
+    rows = queryset.order_by().annotate(
+        price_bucket=price_bucket_expression()
+    ).values(
+        'category_id', 'category_name', 'location', 'price_bucket'
+    ).annotate(count=Count('pk'))
+    
+    categories = Counter()
+    category_names = {}
+    locations = Counter()
+    buckets = Counter()
+    total = 0
+    for row in rows:
+        count = row['count']
+        total += count
+        categories[row['category_id']] += count
+        category_names[row['category_id']] = row['category_name']
+        locations[row['location']] += count
+        buckets[row['price_bucket']] += count
+    
+    return {
+        'total': total,
+        'categories': [
+            {'id': category_id, 'name': category_names[category_id], 'count': count}
+            for category_id, count in categories.most_common()
+        ],
+        'locations': [
+            {'location': location, 'count': count}
+            for location, count in locations.most_common()
+        ],
+        'price_ranges': [
+            {'min': low, 'max': high, 'count': buckets.get(index, 0)}
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+    }
+
+
+def normalize_filters(query_params):
+    """Stable representation of the facet-relevant filters"""
+    items = []
+    for name in FACET_FILTER_PARAMS:
+        value = query_params.get(name, '').strip()
+        if value:
+            items.append((name, value.lower() if name == 'search' else value))
+    return items
+
+
+def facet_cache_key(filters):
+    """Key on the filter set and the stamp of the partition it reads"""
+    partition = feed_cache.feed_partition(dict(filters))
+    stamp = feed_cache.get_stamps(partition)[partition]
+    digest = hashlib.md5(urlencode(filters).encode()).hexdigest()
+    return f'listings:facets:{digest}:{stamp}'
+
+
+def get_facets(queryset, query_params):
+    """Cached facet counts for an already filtered queryset"""
+    key = facet_cache_key(normalize_filters(query_params))
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,93 @@
+import django_filters
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from .geo import MAX_RADIUS_KM, within_radius
+from .search import get_search_backend, tokenize
+
+
+class ListingOrderingFilter(filters.OrderingFilter):
+    """
+    OrderingFilter that skips terms the queryset can't sort by: trending only
+    exists on feed cards, so ?ordering=-trending on a Listing queryset
+    (my-listings) falls back to the default ordering.
+    """
+    
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        fields = super().remove_invalid_fields(queryset, fields, view, request)
+        names = {field.name for field in queryset.model._meta.get_fields()} | set(queryset.query.annotations)
+        return [term for term in fields if term.lstrip('-') in names]
+
+
+class ListingSearchFilter(filters.SearchFilter):
+    """
+    Ranked full-text search over the listing search document.
+    Falls back to DRF's icontains search on unsupported databases.
+    Results are ordered by relevance unless ?ordering= is given explicitly.
+    """
+    
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        
+        backend = get_search_backend()
+        if backend is None:
+            return super().filter_queryset(request, queryset, view)
+        
+        tokens = tokenize(terms)
+        if not tokens:
+            return queryset.none()
+        
+        queryset = backend.search(queryset, tokens)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+        return queryset
+
+
+class GeoRadiusFilter(filters.BaseFilterBackend):
+    """
+    ?lat=&lng=&radius_km= keeps listings within radius_km of the point and
+    annotates distance_km. Results are nearest first unless ?ordering= is
+    given explicitly.
+    """
+    default_radius_km = 10
+    
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if 'lat' not in params and 'lng' not in params:
+            return queryset
+        
+        latitude = self.parse(params, 'lat', -90, 90)
+        longitude = self.parse(params, 'lng', -180, 180)
+        radius_km = self.parse(params, 'radius_km', 0, MAX_RADIUS_KM, self.default_radius_km)
+        
+        queryset = within_radius(queryset, latitude, longitude, radius_km)
+        if not params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by('distance_km', *queryset.query.order_by)
+        return queryset
+    
+    @staticmethod
+    def parse(params, name, low, high, default=None):
+        raw = params.get(name)
+        if raw in (None, '') and default is not None:
+            return default
+        try:
+            value = float(raw)
+        except (TypeError, ValueError):
+            raise ValidationError({name: ['A number is required.']})
+        if not low <= value <= high or (name == 'radius_km' and value == 0):
+            raise ValidationError({name: [f'Must be between {low} and {high}.']})
+        return value
+
+
+class ListingFilter(django_filters.FilterSet):
+    """
+    Feed filters. Declared against column names shared by Listing and
+    ListingCard so the same filter set serves both querysets.
+    """
+    category = django_filters.NumberFilter(field_name='category_id')
+    is_sold = django_filters.BooleanFilter()
+    location = django_filters.CharFilter()
+    min_price = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    max_price = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
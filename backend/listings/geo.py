@@ -0,0 +1,218 @@
+"""
+Geocoding and radius search for listings.
+
+Listing.location stays free text; on save it is resolved through a
+gazetteer (GAZETTEER_CLASS, a local CSV by default) to coordinates and a
+geohash. Radius queries first narrow the feed to the geohash cells around
+the centre with index range scans, then compute exact haversine
+distances for the few rows left.
+"""
+import csv
+import math
+import os
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+from django.utils.module_loading import import_string
+
+EARTH_RADIUS_KM = 6371.0088
+
+KM_PER_DEGREE = 111.32
+
+GEOHASH_PRECISION = 9
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Largest radius accepted by the API; beyond this a "near me" query is a full scan
+MAX_RADIUS_KM = 500
+
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.csv')
+
+
+def normalize_place(text):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+class CSVGazetteer:
+    """
+    Offline place-name lookup backed by a CSV of name,latitude,longitude.
+    "Koregaon Park, Pune" resolves to the first comma-separated part that
+    is known, most specific first.
+    """
+    
+    def __init__(self, path=None):
+        self.path = path or getattr(settings, 'GAZETTEER_PATH', DEFAULT_GAZETTEER_PATH)
+        self.places = {}
+        with open(self.path, newline='', encoding='utf-8') as handle:
+            for row in csv.DictReader(handle):
+                self.places[normalize_place(row['name'])] = (
+                    float(row['latitude']), float(row['longitude'])
+                )
+    
+    def lookup(self, location):
+        """Return (latitude, longitude) or None"""
+        candidates = [location] + location.split(',')
+        for candidate in candidates:
+            point = self.places.get(normalize_place(candidate))
+            if point:
+                return point
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_gazetteer():
+    """Return the configured gazetteer (loaded once per process)"""
+    path = getattr(settings, 'GAZETTEER_CLASS', 'listings.geo.CSVGazetteer')
+    return import_string(path)()
+
+
+def geocode(location):
+    """Resolve free-text location to (latitude, longitude, geohash); Nones if unknown"""
+    point = get_gazetteer().lookup(location or '')
+    if point is None:
+        return None, None, ''
+    latitude, longitude = point
+    return latitude, longitude, encode_geohash(latitude, longitude)
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lng_range[0] = mid
+            else:
+                value <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_range[0] = mid
+            else:
+                value <<= 1
+                lat_range[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size_degrees(precision):
+    """(latitude, longitude) span of a geohash cell at the given precision"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells together contain the whole circle: the
+    centre cell and its eight neighbours at the finest precision whose
+    cells are still at least radius_km across. Empty if no precision is
+    coarse enough (the caller then relies on the bounding box alone).
+    """
+    # Longitude degrees shrink towards the poles; size cells for the worst row
+    worst_lat = min(90.0, abs(latitude) + radius_km / KM_PER_DEGREE)
+    lng_km_per_degree = KM_PER_DEGREE * max(math.cos(math.radians(worst_lat)), 1e-6)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lat_span, lng_span = cell_size_degrees(precision)
+        if lat_span * KM_PER_DEGREE >= radius_km and lng_span * lng_km_per_degree >= radius_km:
+            break
+    else:
+        return []
+    
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        cell_lat = latitude + lat_step * lat_span
+        if not -90.0 <= cell_lat <= 90.0:
+            continue
+        for lng_step in (-1, 0, 1):
+            cell_lng = (longitude + lng_step * lng_span + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(cell_lat, cell_lng, precision))
+    return sorted(cells)
+
+
+def _prefix_upper_bound(prefix):
+    """Smallest geohash greater than every geohash starting with prefix, or None"""
+    chars = list(prefix)
+    while chars:
+        index = GEOHASH_ALPHABET.index(chars[-1])
+        if index + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[index + 1]
+            return ''.join(chars)
+        chars.pop()
+    return None
+
+
+def cell_filter(cells, field='geohash'):
+    """
+    Q matching rows inside any of the cells, as plain range comparisons so
+    a regular b-tree index serves it (LIKE 'x%' can't use one on SQLite).
+    """
+    # Neighbouring cells are often adjacent in geohash order; merge them into one range
+    ranges = []
+    for cell in sorted(cells):
+        upper = _prefix_upper_bound(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1][1] = upper
+        else:
+            ranges.append([cell, upper])
+    
+    condition = Q()
+    for lower, upper in ranges:
+        cell_range = Q(**{f'{field}__gte': lower})
+        if upper:
+            cell_range &= Q(**{f'{field}__lt': upper})
+        condition |= cell_range
+    return condition
+
+
+def bounding_box_filter(latitude, longitude, radius_km):
+    """Q restricting latitude (and longitude, away from the antimeridian) to the circle's box"""
+    lat_delta = radius_km / KM_PER_DEGREE
+    condition = Q(latitude__gte=latitude - lat_delta, latitude__lte=latitude + lat_delta)
+    cos_lat = math.cos(math.radians(min(89.9, abs(latitude) + lat_delta)))
+    lng_delta = radius_km / (KM_PER_DEGREE * cos_lat)
+    if -180.0 <= longitude - lng_delta and longitude + lng_delta <= 180.0:
+        condition &= Q(longitude__gte=longitude - lng_delta, longitude__lte=longitude + lng_delta)
+    return condition
+
+
+def distance_expression(latitude, longitude):
+    """Haversine great-circle distance in km from the point to each row"""
+    lat1 = math.radians(latitude)
+    lng1 = math.radians(longitude)
+    lat2 = Radians(F('latitude'))
+    lng2 = Radians(F('longitude'))
+    a = (
+        Power(Sin((lat2 - lat1) / 2), 2)
+        + math.cos(lat1) * Cos(lat2) * Power(Sin((lng2 - lng1) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(a), output_field=FloatField())
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """Restrict to rows within radius_km and annotate distance_km"""
+    cells = covering_cells(latitude, longitude, radius_km)
+    if cells:
+        queryset = queryset.filter(cell_filter(cells))
+    return queryset.filter(
+        bounding_box_filter(latitude, longitude, radius_km)
+    ).annotate(
+        distance_km=distance_expression(latitude, longitude)
+    ).filter(distance_km__lte=radius_km)
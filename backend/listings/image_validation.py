@@ -0,0 +1,447 @@
+"""
+Single-pass validation and sanitization of uploaded listing images.
+
+sanitize() reads an upload once, front to back, in CHUNK_SIZE pieces and
+writes the cleaned image as it goes:
+
+- the format is sniffed from the leading bytes (JPEG, PNG, GIF, WebP),
+  never taken from the file name or the client's content type;
+- the dimensions are read from the header (JPEG SOF, PNG IHDR, GIF
+  logical screen, WebP VP8/VP8L/VP8X) and checked against MAX_DIMENSION
+  and MAX_PIXELS before anything is decoded, so decompression bombs are
+  rejected from a few bytes;
+- the container is walked segment by segment (JPEG markers, PNG chunks
+  with their CRCs, GIF blocks, RIFF chunks), which rejects truncated and
+  malformed files, and metadata is dropped on the way: EXIF, XMP, IPTC,
+  comments, text chunks and anything appended after a JPEG's end of
+  image (such as a motion photo's video). Pixel data is copied untouched, so nothing is
+  re-encoded. An EXIF orientation is kept as a minimal EXIF block holding
+  only that tag, so photos still display upright.
+
+The output is spooled in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE (where
+Django itself starts writing uploads to disk) and to a temporary file
+beyond, so memory stays bounded whatever the upload's size. The result is a File
+that storage can save directly.
+"""
+import os
+import struct
+import tempfile
+import zlib
+from django.conf import settings
+from django.core.files.base import File
+
+MAX_SIZE = 5 * 1024 * 1024
+
+# Longest side and total pixels of an accepted image (~50 MP phone photos fit)
+MAX_DIMENSION = 12000
+MAX_PIXELS = 50_000_000
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_SIZE = settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+
+JPEG, PNG, GIF, WEBP = 'JPEG', 'PNG', 'GIF', 'WEBP'
+CONTENT_TYPES = {JPEG: 'image/jpeg', PNG: 'image/png', GIF: 'image/gif', WEBP: 'image/webp'}
+EXTENSIONS = {JPEG: 'jpg', PNG: 'png', GIF: 'gif', WEBP: 'webp'}
+
+CORRUPT = 'Invalid or corrupted image file'
+TOO_LARGE = 'Image file size cannot exceed 5MB'
+UNSUPPORTED = 'Invalid image format. Allowed formats: jpeg, png, gif, webp'
+
+# JPEG segments kept: APP0 (JFIF), APP2 (ICC profile), APP14 (Adobe colour transform)
+# and every non-APPn marker; other APPn (EXIF, XMP, IPTC, ...) and COM are dropped
+JPEG_KEPT_APP = {0xE0, 0xE2, 0xEE}
+JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# PNG ancillary chunks that affect rendering; critical chunks are always kept
+PNG_KEPT = {b'tRNS', b'gAMA', b'cHRM', b'sRGB', b'iCCP', b'sBIT', b'bKGD', b'pHYs', b'acTL', b'fcTL', b'fdAT'}
+
+WEBP_KEPT = {b'VP8 ', b'VP8L', b'VP8X', b'ALPH', b'ANIM', b'ANMF', b'ICCP'}
+WEBP_EXIF_FLAG = 0x08
+WEBP_XMP_FLAG = 0x04
+
+# Application extensions that only control GIF animation looping
+GIF_KEPT_APPS = {b'NETSCAPE2.0', b'ANIMEXTS1.0'}
+
+ORIENTATION_TAG = 0x0112
+
+
+class InvalidImage(Exception):
+    """An upload sanitize() rejects; the message is shown to the client"""
+
+
+class SanitizedImage(File):
+    """Cleaned image bytes with the format and dimensions found while reading them"""
+
+    def __init__(self, file, name, image_format, width, height):
+        super().__init__(file, name)
+        self.image_format = image_format
+        self.width = width
+        self.height = height
+
+    @property
+    def content_type(self):
+        return CONTENT_TYPES[self.image_format]
+
+
+class _Reader:
+    """Reads an upload in order, failing once more than `limit` bytes have been read"""
+
+    def __init__(self, file, limit):
+        self.file = file
+        self.limit = limit
+        self.position = 0
+        self.size = None  # (width, height) once the header has given them
+        self.pending = b''
+
+    def read(self, size):
+        data, self.pending = self.pending[:size], self.pending[size:]
+        while len(data) < size:
+            more = self.file.read(size - len(data))
+            if not more:
+                break
+            data += more
+        self.position += len(data)
+        if self.position > self.limit:
+            raise InvalidImage(TOO_LARGE)
+        return data
+
+    def exact(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise InvalidImage(CORRUPT)
+        return data
+
+    def found(self, width, height):
+        """Record the image's dimensions once known, rejecting oversized ones"""
+        check_dimensions(width, height)
+        self.size = (width, height)
+        return self.size
+
+    def copy(self, size, out, crc=None):
+        """Copy exactly `size` bytes to `out` (None discards them); returns their running CRC-32"""
+        while size:
+            data = self.exact(min(size, CHUNK_SIZE))
+            if out is not None:
+                out.write(data)
+            if crc is not None:
+                crc = zlib.crc32(data, crc)
+            size -= len(data)
+        return crc
+
+    def unread(self, data):
+        """Put bytes read too far back in front of the rest"""
+        self.pending = data + self.pending
+        self.position -= len(data)
+
+
+def sniff(header):
+    """Format of an image from its first 12 bytes, or None"""
+    if header.startswith(b'\xff\xd8\xff'):
+        return JPEG
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return PNG
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return GIF
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return WEBP
+    return None
+
+
+def check_dimensions(width, height):
+    if width < 1 or height < 1:
+        raise InvalidImage(CORRUPT)
+    if max(width, height) > MAX_DIMENSION or width * height > MAX_PIXELS:
+        raise InvalidImage(
+            f'Image dimensions cannot exceed {MAX_DIMENSION}px per side or {MAX_PIXELS // 1_000_000} megapixels'
+        )
+
+
+def exif_orientation(tiff):
+    """Orientation tag (1-8) of a TIFF/EXIF block, 1 when absent or unreadable"""
+    if tiff.startswith(b'Exif\x00\x00'):
+        tiff = tiff[6:]
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None or len(tiff) < 8:
+        return 1
+    offset = struct.unpack(order + 'I', tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return 1
+    count = struct.unpack(order + 'H', tiff[offset:offset + 2])[0]
+    for entry in range(offset + 2, min(offset + 2 + count * 12, len(tiff) - 11), 12):
+        tag, field_type = struct.unpack(order + 'HH', tiff[entry:entry + 4])
+        if tag == ORIENTATION_TAG and field_type == 3:
+            value = struct.unpack(order + 'H', tiff[entry + 8:entry + 10])[0]
+            return value if 1 <= value <= 8 else 1
+    return 1
+
+
+def orientation_tiff(orientation):
+    """A TIFF block holding nothing but an orientation tag"""
+    return (
+        b'MM\x00\x2a' + struct.pack('>I', 8)
+        + struct.pack('>H', 1) + struct.pack('>HHIHH', ORIENTATION_TAG, 3, 1, orientation, 0)
+        + struct.pack('>I', 0)
+    )
+
+
+def _jpeg_scan(reader, out):
+    """
+    Copy entropy-coded scan data up to the next marker; returns that
+    marker's code. Stuffed 0xFF00 bytes and restart markers are data.
+    """
+    carry = b''
+    while True:
+        data = reader.read(CHUNK_SIZE)
+        if not data:
+            raise InvalidImage(CORRUPT)  # No end of image
+        data = carry + data
+        carry = b''
+        start = 0
+        while True:
+            index = data.find(b'\xff', start)
+            if index == -1:
+                out.write(data)
+                break
+            if index + 1 == len(data):
+                out.write(data[:index])
+                carry = b'\xff'
+                break
+            code = data[index + 1]
+            if code == 0x00 or 0xD0 <= code <= 0xD7:
+                start = index + 2
+            elif code == 0xFF:  # Fill byte before a marker
+                start = index + 1
+            else:
+                out.write(data[:index])
+                reader.unread(data[index + 2:])
+                return code
+
+
+def _jpeg(reader, out):
+    out.write(reader.exact(2))  # SOI
+    size = None
+    scanned = False
+    following = None  # Marker found at the end of a scan
+    while True:
+        if following is None:
+            if reader.exact(1) != b'\xff':
+                raise InvalidImage(CORRUPT)
+            marker = reader.exact(1)[0]
+            while marker == 0xFF:  # Fill bytes
+                marker = reader.exact(1)[0]
+        else:
+            marker, following = following, None
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            out.write(bytes((0xFF, marker)))
+            continue
+        if marker == 0xD9:
+            if not scanned:
+                raise InvalidImage(CORRUPT)  # End of image before any scan
+            # Anything after the end of the image (padding, appended video) is dropped
+            out.write(b'\xff\xd9')
+            return size
+        length = struct.unpack('>H', reader.exact(2))[0]
+        if length < 2:
+            raise InvalidImage(CORRUPT)
+        payload = reader.exact(length - 2)
+
+        if marker in JPEG_SOF:
+            if len(payload) < 5:
+                raise InvalidImage(CORRUPT)
+            height, width = struct.unpack('>HH', payload[1:5])
+            size = reader.found(width, height)
+        if marker == 0xE1 and payload.startswith(b'Exif\x00\x00'):
+            orientation = exif_orientation(payload)
+            if orientation != 1:
+                exif = b'Exif\x00\x00' + orientation_tiff(orientation)
+                out.write(b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif)
+            continue
+        if (0xE0 <= marker <= 0xEF and marker not in JPEG_KEPT_APP) or marker == 0xFE:
+            continue
+        out.write(bytes((0xFF, marker)) + struct.pack('>H', length) + payload)
+
+        if marker == 0xDA:  # Start of scan: entropy-coded data up to the next marker
+            if size is None:
+                raise InvalidImage(CORRUPT)
+            following = _jpeg_scan(reader, out)
+            scanned = True
+
+
+def _png(reader, out):
+    out.write(reader.exact(8))
+    size = None
+    has_data = False
+    while True:
+        length, chunk_type = struct.unpack('>I4s', reader.exact(8))
+        if length > 0x7FFFFFFF or (size is None and chunk_type != b'IHDR'):
+            raise InvalidImage(CORRUPT)
+        critical = chunk_type[0] & 0x20 == 0
+        target = out if critical or chunk_type in PNG_KEPT else None
+        if target is not None:
+            target.write(struct.pack('>I4s', length, chunk_type))
+
+        if chunk_type == b'IHDR':
+            payload = reader.exact(length)
+            if length != 13:
+                raise InvalidImage(CORRUPT)
+            size = reader.found(*struct.unpack('>II', payload[:8]))
+            out.write(payload)
+            crc = zlib.crc32(payload, zlib.crc32(chunk_type))
+        else:
+            crc = reader.copy(length, target, zlib.crc32(chunk_type))
+        stored_crc = reader.exact(4)
+        if struct.unpack('>I', stored_crc)[0] != crc:
+            raise InvalidImage(CORRUPT)
+        if target is not None:
+            target.write(stored_crc)
+
+        has_data = has_data or chunk_type == b'IDAT'
+        if chunk_type == b'IEND':
+            if not has_data:
+                raise InvalidImage(CORRUPT)
+            return size
+
+
+def _gif_sub_blocks(reader, out):
+    while True:
+        length = reader.exact(1)
+        if out is not None:
+            out.write(length)
+        if length == b'\x00':
+            return
+        reader.copy(length[0], out)
+
+
+def _gif(reader, out):
+    header = reader.exact(13)
+    out.write(header)
+    size = reader.found(*struct.unpack('<HH', header[6:10]))
+    if header[10] & 0x80:
+        reader.copy(3 << ((header[10] & 0x07) + 1), out)
+    has_frame = False
+    while True:
+        block = reader.exact(1)
+        if block == b'\x3b':  # Trailer
+            if not has_frame:
+                raise InvalidImage(CORRUPT)
+            out.write(block)
+            return size
+        if block == b'\x2c':  # Image descriptor
+            descriptor = reader.exact(9)
+            out.write(block + descriptor)
+            if descriptor[8] & 0x80:
+                reader.copy(3 << ((descriptor[8] & 0x07) + 1), out)
+            out.write(reader.exact(1))  # LZW minimum code size
+            _gif_sub_blocks(reader, out)
+            has_frame = True
+        elif block == b'\x21':  # Extension
+            label = reader.exact(1)
+            if label in (b'\xf9', b'\x01'):  # Graphic control, plain text
+                out.write(block + label)
+                _gif_sub_blocks(reader, out)
+            elif label == b'\xff':
+                identifier_length = reader.exact(1)
+                identifier = reader.exact(identifier_length[0])
+                if identifier in GIF_KEPT_APPS:
+                    out.write(block + label + identifier_length + identifier)
+                    _gif_sub_blocks(reader, out)
+                else:
+                    _gif_sub_blocks(reader, None)
+            else:  # Comments and unknown extensions
+                _gif_sub_blocks(reader, None)
+        else:
+            raise InvalidImage(CORRUPT)
+
+
+def _webp(reader, out):
+    riff, riff_size, webp = struct.unpack('<4sI4s', reader.exact(12))
+    end = riff_size + 8
+    if end > reader.limit:
+        raise InvalidImage(TOO_LARGE)
+    out.write(riff + b'\x00\x00\x00\x00' + webp)  # Size patched below
+    size = None
+    extended_at = None
+    orientation = 1
+    while reader.position < end:
+        chunk_type, length = struct.unpack('<4sI', reader.exact(8))
+        padded = length + (length & 1)
+        if reader.position + padded > end:
+            raise InvalidImage(CORRUPT)
+        if chunk_type not in WEBP_KEPT:
+            if chunk_type == b'EXIF':
+                head = reader.exact(min(padded, CHUNK_SIZE))
+                orientation = exif_orientation(head)
+                padded -= len(head)
+            reader.copy(padded, None)
+            continue
+        out.write(struct.pack('<4sI', chunk_type, length))
+        if chunk_type in (b'VP8X', b'VP8 ', b'VP8L') and size is None:
+            head = reader.exact(min(padded, 10))
+            if chunk_type == b'VP8X':
+                if length < 10:
+                    raise InvalidImage(CORRUPT)
+                extended_at = out.tell()
+                head = bytes((head[0] & ~(WEBP_EXIF_FLAG | WEBP_XMP_FLAG),)) + head[1:]
+                width = int.from_bytes(head[4:7], 'little') + 1
+                height = int.from_bytes(head[7:10], 'little') + 1
+            elif chunk_type == b'VP8 ':
+                if length < 10 or head[3:6] != b'\x9d\x01\x2a':
+                    raise InvalidImage(CORRUPT)
+                width, height = (value & 0x3FFF for value in struct.unpack('<HH', head[6:10]))
+            else:
+                if length < 5 or head[0] != 0x2F:
+                    raise InvalidImage(CORRUPT)
+                bits = int.from_bytes(head[1:5], 'little')
+                width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            size = reader.found(width, height)
+            out.write(head)
+            padded -= len(head)
+        reader.copy(padded, out)
+    if size is None:
+        raise InvalidImage(CORRUPT)
+
+    if orientation != 1 and extended_at is not None:
+        tiff = orientation_tiff(orientation)
+        out.write(struct.pack('<4sI', b'EXIF', len(tiff)) + tiff)
+        out.seek(extended_at)
+        flags = out.read(1)[0]
+        out.seek(extended_at)
+        out.write(bytes((flags | WEBP_EXIF_FLAG,)))
+        out.seek(0, os.SEEK_END)
+    total = out.tell()
+    out.seek(4)
+    out.write(struct.pack('<I', total - 8))
+    out.seek(0, os.SEEK_END)
+    return size
+
+
+_SANITIZERS = {JPEG: _jpeg, PNG: _png, GIF: _gif, WEBP: _webp}
+
+
+def sanitize(upload, max_size=MAX_SIZE):
+    """
+    Validate `upload` and strip its metadata in one read; returns a
+    SanitizedImage named after the upload with the sniffed format's
+    extension. Raises InvalidImage.
+    """
+    if getattr(upload, 'size', None) is not None and upload.size > max_size:
+        raise InvalidImage(TOO_LARGE)
+    upload.seek(0)
+    header = upload.read(12)
+    image_format = sniff(header)
+    if image_format is None:
+        raise InvalidImage(UNSUPPORTED)
+    upload.seek(0)
+
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    try:
+        width, height = _SANITIZERS[image_format](_Reader(upload, max_size), out)
+    except (struct.error, IndexError):
+        out.close()
+        raise InvalidImage(CORRUPT)
+    except InvalidImage:
+        out.close()
+        raise
+    out.seek(0)
+    root = os.path.splitext(os.path.basename(getattr(upload, 'name', '') or ''))[0] or 'image'
+    return SanitizedImage(out, f'{root}.{EXTENSIONS[image_format]}', image_format, width, height)
@@ -0,0 +1,57 @@
+import tempfile
+import time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+from listings.uploads import store_files
+from olx_backend.storage import SlowFileSystemStorage
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares sequential and concurrent image uploads offline: files go to a temporary "
+        "SlowFileSystemStorage that adds a fixed latency per save, like a remote media store."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=5, help='Images per listing')
+        parser.add_argument('--latency', type=float, default=0.25, help='Seconds per upload')
+        parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per setting; the best is reported')
+
+    def handle(self, *args, **options):
+        payload = self.sample_jpeg()
+        count = options['images']
+        with tempfile.TemporaryDirectory() as location:
+            storage = SlowFileSystemStorage(location=location, latency=options['latency'])
+
+            def upload(executor):
+                files = [(f'listings/bench/{i}.jpg', ContentFile(payload)) for i in range(count)]
+                store_files(storage, files, executor=executor, concurrent=executor is not None)
+
+            baseline = self.best_of(lambda: upload(None), options['repeat'])
+            self.stdout.write(
+                f'{count} images, {options["latency"] * 1000:.0f} ms per upload, {len(payload) // 1024} KB each'
+            )
+            self.stdout.write(f'  sequential        {baseline:8.1f} ms')
+            for workers in options['workers']:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    elapsed = self.best_of(lambda: upload(executor), options['repeat'])
+                self.stdout.write(f'  {workers:>2} workers        {elapsed:8.1f} ms  x{baseline / elapsed:.1f}')
+
+    @staticmethod
+    def sample_jpeg():
+        buffer = BytesIO()
+        Image.effect_noise((1600, 1200), 64).convert('RGB').save(buffer, 'JPEG', quality=90)
+        return buffer.getvalue()
+
+    @staticmethod
+    def best_of(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
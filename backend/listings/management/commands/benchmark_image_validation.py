@@ -0,0 +1,111 @@
+import os
+import time
+import tracemalloc
+from io import BytesIO
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from rest_framework import serializers
+from listings.image_validation import InvalidImage, sanitize
+
+FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.webp': 'WEBP'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the old image upload checks (DRF ImageField verify, size check, then a "
+        "full read for storage) with the single-pass sanitizer on a corpus of JPEG/PNG/WebP "
+        "files: time per image and peak Python memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corpus', help='Directory of images (default: a generated corpus)')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per file; the best is reported')
+
+    def handle(self, *args, **options):
+        corpus = self.load(options['corpus']) if options['corpus'] else self.generate()
+        if not corpus:
+            raise CommandError('No .jpg/.png/.webp files found')
+
+        self.stdout.write(f'{"file":<28}{"KB":>7}{"old ms":>10}{"new ms":>10}{"old peak KB":>13}{"new peak KB":>13}')
+        totals = [0.0, 0.0]
+        for name, data in corpus:
+            old_ms, old_peak = self.measure(self.old_checks, name, data, options['repeat'])
+            try:
+                new_ms, new_peak = self.measure(self.single_pass, name, data, options['repeat'])
+            except InvalidImage as exc:
+                self.stdout.write(self.style.WARNING(f'{name:<28}rejected: {exc}'))
+                continue
+            totals[0] += old_ms
+            totals[1] += new_ms
+            self.stdout.write(
+                f'{name:<28}{len(data) // 1024:>7}{old_ms:>10.2f}{new_ms:>10.2f}'
+                f'{old_peak // 1024:>13}{new_peak // 1024:>13}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Total: old {totals[0]:.1f} ms, single pass {totals[1]:.1f} ms'
+        ))
+
+    @staticmethod
+    def old_checks(name, data):
+        """What an upload went through before: DRF ImageField, the size check, then storage reading it"""
+        upload = serializers.ImageField().to_internal_value(SimpleUploadedFile(name, data))
+        if upload.size > 5 * 1024 * 1024:
+            raise InvalidImage('too large')
+        upload.seek(0)
+        for _ in upload.chunks():
+            pass
+
+    @staticmethod
+    def single_pass(name, data):
+        cleaned = sanitize(SimpleUploadedFile(name, data))
+        for _ in cleaned.chunks():
+            pass
+        cleaned.close()
+
+    @staticmethod
+    def measure(func, name, data, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(name, data)
+            timings.append((time.perf_counter() - start) * 1000)
+        tracemalloc.start()
+        try:
+            func(name, data)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return min(timings), peak
+
+    @staticmethod
+    def load(directory):
+        corpus = []
+        for entry in sorted(os.listdir(directory)):
+            if os.path.splitext(entry)[1].lower() in FORMATS:
+                with open(os.path.join(directory, entry), 'rb') as file:
+                    corpus.append((entry, file.read()))
+        return corpus
+
+    @staticmethod
+    def generate():
+        """Noisy photos of a few sizes in each format, with EXIF and text metadata"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        exif[0x0112] = 6
+        corpus = []
+        for width, height in ((640, 480), (1600, 1200), (3000, 2000)):
+            image = Image.effect_noise((width, height), 48).convert('RGB')
+            for extension, image_format, options in (
+                ('jpg', 'JPEG', {'quality': 85, 'exif': exif.tobytes()}),
+                ('png', 'PNG', {'exif': exif.tobytes()}),
+                ('webp', 'WEBP', {'quality': 80, 'exif': exif.tobytes()}),
+            ):
+                if image_format == 'PNG':
+                    source = image.resize((width // 2, height // 2))  # Noise barely compresses; keep under 5MB
+                else:
+                    source = image
+                buffer = BytesIO()
+                source.save(buffer, image_format, **options)
+                corpus.append((f'{source.width}x{source.height}.{extension}', buffer.getvalue()))
+        return corpus
@@ -0,0 +1,92 @@
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from categories.models import Category
+from listings.models import Listing
+from listings.projections import ListingListProjection
+from listings.serializers import ListingListSerializer
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark rows"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares ListingListSerializer with ListingListProjection on list pages "
+        "of 20, 100 and 1000 rows. Rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[20, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per size; the best is reported')
+
+    def handle(self, *args, **options):
+        sizes = sorted(options['sizes'])
+        try:
+            with transaction.atomic():
+                self.seed(max(sizes))
+                for size in sizes:
+                    self.run(size, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        User = get_user_model()
+        users = User.objects.bulk_create([
+            User(username=f'bench-seller-{i}', email=f'bench-seller-{i}@example.com')
+            for i in range(20)
+        ])
+        category = Category.objects.create(name='Benchmark', slug='benchmark-projections')
+        Listing.objects.bulk_create([
+            Listing(
+                user=users[i % len(users)],
+                category=category,
+                title=f'Benchmark listing {i}',
+                description='Benchmark listing description',
+                price=Decimal('1000.00') + i,
+                location='Pune',
+                cover_image=f'listings/{i}/cover.jpg' if i % 2 else '',
+            )
+            for i in range(count)
+        ])
+
+    def run(self, size, repeat):
+        request = Request(APIRequestFactory().get('/api/listings/'))
+        queryset = Listing.objects.select_related('user', 'category').filter(
+            category__slug='benchmark-projections'
+        ).order_by('-created_at', '-id')
+
+        def serialize():
+            context = {'request': request}
+            return ListingListSerializer(list(queryset[:size]), many=True, context=context).data
+
+        def project():
+            context = {'request': request}
+            projection = ListingListProjection.compile(context)
+            rows = projection.project(queryset, context)[:size]
+            return projection.render(rows, context)
+
+        if [dict(row) for row in serialize()] != project():
+            raise CommandError(f'Projection output differs from the serializer at {size} rows')
+
+        serializer_ms = self.best_of(serialize, repeat)
+        projection_ms = self.best_of(project, repeat)
+        self.stdout.write(
+            f'{size:>5} rows  serializer {serializer_ms:8.2f} ms  '
+            f'projection {projection_ms:8.2f} ms  x{serializer_ms / projection_ms:.1f}'
+        )
+
+    @staticmethod
+    def best_of(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
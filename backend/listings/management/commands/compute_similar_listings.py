@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from listings import similar
+
+
+class Command(BaseCommand):
+    help = "Precomputes TF-IDF similar listings per category"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only compute listings without stored neighbours (new or edited) and merge them in'
+        )
+        parser.add_argument(
+            '--category',
+            type=int,
+            action='append',
+            dest='categories',
+            help='Rebuild only this category id (repeatable; ignored with --incremental)'
+        )
+        parser.add_argument('--top', type=int, default=similar.TOP_N, help='Neighbours kept per listing')
+
+    def handle(self, *args, **options):
+        top_n = max(1, min(options['top'], similar.TOP_N))
+        started = time.perf_counter()
+        if options['incremental']:
+            count = similar.refresh(top_n=top_n)
+            message = f'Refreshed similar listings for {count} listings'
+        else:
+            count = similar.rebuild(options['categories'], top_n=top_n)
+            message = f'Rebuilt similar listings for {count} listings'
+        self.stdout.write(self.style.SUCCESS(f'{message} in {time.perf_counter() - started:.2f}s.'))
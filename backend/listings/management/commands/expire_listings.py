@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from listings import expiry
+
+
+class Command(BaseCommand):
+    help = "Deactivates live listings older than their category's lifetime (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=expiry.CHUNK_SIZE, help='Listings updated per transaction')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between chunks')
+        parser.add_argument('--limit', type=int, help='Stop after expiring this many listings')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the listings that would expire')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = expiry.pending_count()
+            self.stdout.write(self.style.WARNING(f'{count} listings are past their lifetime.'))
+            return
+        started = time.perf_counter()
+        count = expiry.expire(
+            chunk_size=max(1, options['chunk_size']),
+            pause=max(0, options['pause']),
+            limit=options['limit']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} listings in {time.perf_counter() - started:.2f}s.'))
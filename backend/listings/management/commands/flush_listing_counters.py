@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from listings import counters
+
+
+class Command(BaseCommand):
+    help = "Writes buffered listing view/impression counts to the database"
+
+    def handle(self, *args, **options):
+        if isinstance(counters.get_buffer(), counters.LocalCounterBuffer):
+            self.stdout.write(self.style.WARNING(
+                'Counters are buffered per process (LISTING_COUNTERS_URL is not set); '
+                'each web process flushes its own buffer.'
+            ))
+            return
+        written = counters.flush()
+        self.stdout.write(self.style.SUCCESS(f'Flushed counters for {written} listings.'))
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from listings import duplicates
+
+
+class Command(BaseCommand):
+    help = "Computes perceptual hashes for listing images that have none (for duplicate detection)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Images loaded per query')
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        image_ids = list(duplicates.unhashed_image_ids())
+        started = time.perf_counter()
+        done = 0
+        for start in range(0, len(image_ids), batch_size):
+            done += duplicates.hash_images(image_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Hashed {done} of {len(image_ids)} images in {time.perf_counter() - started:.2f}s.'
+        ))
+        if done < len(image_ids):
+            self.stdout.write(self.style.WARNING('Some images could not be read; see the log.'))
@@ -0,0 +1,48 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from listings import bulk_import
+
+
+class Command(BaseCommand):
+    help = "Bulk imports listings for one seller from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file')
+        parser.add_argument('--user', required=True, help='Username or email of the seller')
+        parser.add_argument(
+            '--format',
+            choices=bulk_import.FORMATS,
+            help='Defaults to the file extension (.csv, otherwise NDJSON)'
+        )
+        parser.add_argument('--chunk-size', type=int, default=bulk_import.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(Q(username=options['user']) | Q(email=options['user']))
+        except (User.DoesNotExist, User.MultipleObjectsReturned):
+            raise CommandError(f"No single user matches {options['user']}")
+
+        path = options['path']
+        import_format = options['format'] or (
+            bulk_import.CSV if path.lower().endswith('.csv') else bulk_import.NDJSON
+        )
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as stream:
+                report = bulk_import.import_listings(
+                    stream, import_format, user, chunk_size=max(1, options['chunk_size'])
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['errors']}"))
+        created = len(report.created_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {created} listings ({report.failed} failed) in {elapsed:.2f}s '
+            f'({created / elapsed if elapsed else 0:.0f} listings/s).'
+        ))
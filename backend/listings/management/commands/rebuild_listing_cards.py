@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from listings.cards import rebuild_cards
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the denormalized feed cards for all listings"
+
+    def handle(self, *args, **options):
+        rebuild_cards()
+        self.stdout.write(self.style.SUCCESS('Listing cards rebuilt successfully.'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from listings.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search documents for all listings"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING(
+                'Skipping: full-text search is not supported on this database.'
+            ))
+            return
+
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt successfully.'))
@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand
+from listings import blob_gc
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes stored image files whose rows are gone (OrphanedBlob tombstones) in batches; "
+        "--reconcile first tombstones files under listings/ that nothing refers to (run from cron)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=blob_gc.BATCH_SIZE, help='Tombstones claimed per batch')
+        parser.add_argument('--workers', type=int, default=blob_gc.WORKERS, help='Concurrent storage deletes')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--limit', type=int, help='Stop after this many tombstones')
+        parser.add_argument('--reconcile', action='store_true', help='Diff storage against the database first')
+        parser.add_argument('--dry-run', action='store_true', help='Only report; delete and tombstone nothing')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['reconcile']:
+            checked, found = blob_gc.reconcile(dry_run=options['dry_run'])
+            verb = 'would be tombstoned' if options['dry_run'] else f'tombstoned, due in {blob_gc.GRACE}'
+            self.stdout.write(f'Checked {checked} stored files: {found} orphans {verb}.')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{blob_gc.due_count()} tombstoned files are due for deletion.'))
+            return
+
+        totals = blob_gc.sweep(
+            batch_size=max(1, options['batch_size']),
+            workers=max(1, options['workers']),
+            limit=options['limit'],
+            pause=max(0, options['pause'])
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {totals['deleted']} files, skipped {totals['skipped']} in use again, "
+            f"dropped {totals['expired_uploads']} expired uploads in {time.perf_counter() - started:.2f}s."
+        ))
+        if totals['failed']:
+            self.stdout.write(self.style.WARNING(f"{totals['failed']} deletes failed and will be retried."))
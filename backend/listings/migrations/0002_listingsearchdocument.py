@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:20
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    """Create the vendor-specific full-text index and backfill it"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX listings_search_vector_gin "
+            "ON listings_listingsearchdocument USING gin (search_vector)"
+        )
+        schema_editor.execute(
+            "INSERT INTO listings_listingsearchdocument (listing_id, search_vector, updated_at) "
+            "SELECT id, "
+            "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('simple', coalesce(location, '')), 'B') || "
+            "setweight(to_tsvector('simple', coalesce(description, '')), 'C'), "
+            "now() FROM listings_listing"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE listings_listing_fts "
+            "USING fts5(title, location, description, tokenize='unicode61')"
+        )
+        schema_editor.execute(
+            "INSERT INTO listings_listing_fts (rowid, title, location, description) "
+            "SELECT id, title, location, description FROM listings_listing"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS listings_search_vector_gin")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS listings_listing_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingSearchDocument',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='listings.listing')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:22
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_cover_images(apps, schema_editor):
+    """Copy each listing's first image into cover_image"""
+    Listing = apps.get_model('listings', 'Listing')
+    ListingImage = apps.get_model('listings', 'ListingImage')
+    first_image = ListingImage.objects.filter(
+        listing_id=OuterRef('pk')
+    ).order_by('uploaded_at', 'id').values('image')[:1]
+    Listing.objects.filter(pk__in=ListingImage.objects.values('listing_id')).update(
+        cover_image=Subquery(first_image)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0002_listingsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='cover_image',
+            field=models.ImageField(blank=True, editable=False, upload_to=''),
+        ),
+        migrations.RunPython(backfill_cover_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_listing_cards(apps, schema_editor):
+    """Build a card for every existing listing in one INSERT ... SELECT"""
+    schema_editor.execute(
+        "INSERT INTO listings_listingcard "
+        "(listing_id, seller_id, seller_username, category_id, category_name, title, "
+        "price, location, is_sold, is_active, cover_image, created_at) "
+        "SELECT l.id, l.user_id, u.username, l.category_id, c.name, l.title, "
+        "l.price, l.location, l.is_sold, l.is_active, l.cover_image, l.created_at "
+        "FROM listings_listing l "
+        "JOIN users_user u ON u.id = l.user_id "
+        "JOIN categories_category c ON c.id = l.category_id"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0003_listing_cover_image'),
+        ('users', '0003_add_online_status'),
+        ('categories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingCard',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='listings.listing')),
+                ('seller_id', models.BigIntegerField()),
+                ('seller_username', models.CharField(max_length=150)),
+                ('category_id', models.BigIntegerField()),
+                ('category_name', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=200)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('location', models.CharField(max_length=100)),
+                ('is_sold', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('cover_image', models.ImageField(blank=True, upload_to='')),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['is_active', '-created_at'], name='listings_li_is_acti_fb7286_idx'), models.Index(fields=['category_id', 'is_active', '-created_at'], name='listings_li_categor_fb1355_idx'), models.Index(fields=['seller_id'], name='listings_li_seller__681f48_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_listing_cards, migrations.RunPython.noop),
+    ]
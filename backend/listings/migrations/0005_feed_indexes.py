@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categories', '0001_initial'),
+        ('listings', '0004_listingcard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listing',
+            name='listings_li_is_sold_33197f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='listingcard',
+            name='listings_li_is_acti_fb7286_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='listingcard',
+            name='listings_li_categor_fb1355_idx',
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='listing_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['-created_at', '-id'], name='listing_live_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-listing'], name='card_active_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['-created_at', '-listing'], name='card_live_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['price', 'listing'], name='card_live_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category_id', '-created_at', '-listing'], name='card_category_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category_id', 'price', 'listing'], name='card_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['location', '-created_at', '-listing'], name='card_location_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingimage',
+            index=models.Index(fields=['listing', 'uploaded_at'], name='listingimage_listing_order_idx'),
+        ),
+    ]
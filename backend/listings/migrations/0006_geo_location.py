@@ -0,0 +1,122 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:41
+
+import csv
+import os
+import re
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copy of the default CSV gazetteer lookup and geohash encoding of
+# listings.geo as of this migration, so later changes there can't alter it
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'gazetteer.csv')
+
+
+def normalize_place(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def load_places():
+    places = {}
+    path = getattr(settings, 'GAZETTEER_PATH', DEFAULT_GAZETTEER_PATH)
+    with open(path, newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            places[normalize_place(row['name'])] = (float(row['latitude']), float(row['longitude']))
+    return places
+
+
+def lookup(places, location):
+    for candidate in [location] + location.split(','):
+        point = places.get(normalize_place(candidate))
+        if point:
+            return point
+    return None
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    ranges = {True: [-180.0, 180.0], False: [-90.0, 90.0]}  # Longitude bits come first
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        span = ranges[even]
+        coordinate = longitude if even else latitude
+        mid = (span[0] + span[1]) / 2
+        if coordinate >= mid:
+            value = (value << 1) | 1
+            span[0] = mid
+        else:
+            value <<= 1
+            span[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geocode_listings(apps, schema_editor):
+    """Resolve coordinates for existing listings and copy them onto their cards"""
+    Listing = apps.get_model('listings', 'Listing')
+    ListingCard = apps.get_model('listings', 'ListingCard')
+    
+    places = load_places()
+    resolved = {}
+    for location in Listing.objects.values_list('location', flat=True).distinct().iterator():
+        point = lookup(places, location or '')
+        if point:
+            latitude, longitude = point
+            resolved[location] = dict(
+                latitude=latitude, longitude=longitude, geohash=encode_geohash(latitude, longitude)
+            )
+    
+    for location, point in resolved.items():
+        Listing.objects.filter(location=location).update(**point)
+        ListingCard.objects.filter(location=location).update(**point)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingcard',
+            name='geohash',
+            field=models.CharField(blank=True, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='listingcard',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingcard',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['geohash'], name='card_geohash_idx'),
+        ),
+        migrations.RunPython(geocode_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-17 04:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_geo_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarListing',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='listings.listing')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='listings.listing')),
+            ],
+            options={
+                'ordering': ['listing', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('listing', 'rank'), name='similar_listing_rank_uniq')],
+            },
+        ),
+    ]
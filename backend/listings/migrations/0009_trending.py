@@ -0,0 +1,107 @@
+# Generated by Django 6.0.1 on 2026-10-17 05:05
+
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import migrations, models
+
+# Frozen copy of the listings.trending scoring as of this migration
+EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+TIME_CONSTANT = timedelta(days=2).total_seconds() / math.log(2)
+CREATED_WEIGHT = 5.0
+VIEW_WEIGHT = 1.0
+SAVE_WEIGHT = 5.0
+CONVERSATION_WEIGHT = 10.0
+
+BATCH_SIZE = 500
+
+
+def event_score(weight, at):
+    return math.log(weight) + (at - EPOCH).total_seconds() / TIME_CONSTANT
+
+
+def add_scores(a, b):
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+def backfill_trending(apps, schema_editor):
+    """
+    Score existing saves and conversations once; views count from their
+    last flush. Listings are scored BATCH_SIZE at a time, each batch
+    folding in only its own events, so memory stays bounded.
+    """
+    Listing = apps.get_model('listings', 'Listing')
+    ListingCard = apps.get_model('listings', 'ListingCard')
+    ListingStats = apps.get_model('listings', 'ListingStats')
+    SavedListing = apps.get_model('listings', 'SavedListing')
+    Conversation = apps.get_model('chat', 'Conversation')
+    
+    last_id = 0
+    while True:
+        batch = list(
+            Listing.objects.filter(pk__gt=last_id).order_by('pk').values_list('id', 'created_at')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        in_batch = {'listing__gte': batch[0][0], 'listing__lte': last_id}
+        
+        scores = {listing_id: event_score(CREATED_WEIGHT, created_at) for listing_id, created_at in batch}
+        engaged = set()
+        for weight, events in (
+            (SAVE_WEIGHT, SavedListing.objects.filter(**in_batch).values_list(
+                'listing_id', 'saved_at'
+            )),
+            (CONVERSATION_WEIGHT, Conversation.objects.filter(**in_batch).values_list(
+                'listing_id', 'created_at'
+            )),
+        ):
+            for listing_id, at in events.iterator(chunk_size=BATCH_SIZE):
+                scores[listing_id] = add_scores(scores[listing_id], event_score(weight, at))
+                engaged.add(listing_id)
+        for listing_id, views, updated_at in ListingStats.objects.filter(
+            **in_batch, view_count__gt=0
+        ).values_list('listing_id', 'view_count', 'updated_at').iterator(chunk_size=BATCH_SIZE):
+            scores[listing_id] = add_scores(scores[listing_id], event_score(views * VIEW_WEIGHT, updated_at))
+            engaged.add(listing_id)
+        
+        ListingStats.objects.bulk_create(
+            [ListingStats(listing_id=listing_id, trending=scores[listing_id]) for listing_id in sorted(engaged)],
+            update_conflicts=True, unique_fields=['listing'], update_fields=['trending']
+        )
+        # Listings without a card match no row
+        ListingCard.objects.bulk_update(
+            [ListingCard(listing_id=listing_id, trending=score) for listing_id, score in scores.items()],
+            ['trending']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_stats'),
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingcard',
+            name='trending',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='listingstats',
+            name='trending',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sold', False)), fields=['-trending', '-listing'], name='card_live_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingcard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['category_id', '-trending', '-listing'], name='card_category_trending_idx'),
+        ),
+        migrations.RunPython(backfill_trending, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-17 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0011_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='cover_thumbnail',
+            field=models.ImageField(blank=True, editable=False, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='listingcard',
+            name='cover_thumbnail',
+            field=models.ImageField(blank=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='listingimage',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.1 on 2026-10-17 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0013_upload_intent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listingimage',
+            name='dhash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingimage',
+            name='dhash_0',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingimage',
+            name='dhash_1',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingimage',
+            name='dhash_2',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listingimage',
+            name='dhash_3',
+            field=models.SmallIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listingimage',
+            index=models.Index(fields=['dhash_0'], name='listingimage_dhash_0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingimage',
+            index=models.Index(fields=['dhash_1'], name='listingimage_dhash_1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingimage',
+            index=models.Index(fields=['dhash_2'], name='listingimage_dhash_2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listingimage',
+            index=models.Index(fields=['dhash_3'], name='listingimage_dhash_3_idx'),
+        ),
+    ]
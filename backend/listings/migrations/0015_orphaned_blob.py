@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0014_listing_image_dhash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrphanedBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='listingimage',
+            index=models.Index(fields=['image'], name='listingimage_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orphanedblob',
+            index=models.Index(fields=['next_attempt_at'], name='orphaned_blob_due_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0015_orphaned_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadintent',
+            name='finalizing_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,8 +1,13 @@
 from django.db import models
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 from categories.models import Category
+from .geo import geocode
+from .saved_searches import search_anchor
 import os
+import uuid
 
 
 def validate_image_size(image):
@@ -44,6 +49,16 @@ class Listing(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Denormalized first image, maintained by listings.signals when images change
+    cover_image = models.ImageField(blank=True, editable=False)
+    # Thumbnail rendition of cover_image once generated (see listings.renditions)
+    cover_thumbnail = models.ImageField(blank=True, editable=False)
+    
+    # Coordinates resolved from `location` through the gazetteer (see listings.geo)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, editable=False)
+    
     # Soft delete fields for admin moderation
     is_active = models.BooleanField(default=True)
     deactivated_at = models.DateTimeField(null=True, blank=True)
@@ -54,18 +69,231 @@ class Listing(models.Model):
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['category']),
-            models.Index(fields=['is_sold']),
+            # My listings, newest first (keyset on created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='listing_user_recent_idx'),
+            # Live listings only: moderation stats and recency walks skip sold/inactive rows
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='listing_live_recent_idx',
+                condition=models.Q(is_active=True, is_sold=False)
+            ),
         ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded values so signal handlers can see what a save changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'location' in update_fields:
+            if self._state.adding or getattr(self, '_loaded_values', {}).get('location') != self.location:
+                self.latitude, self.longitude, self.geohash = geocode(self.location)
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'latitude', 'longitude', 'geohash'}
+        super().save(*args, **kwargs)
+        # post_save has run against the old snapshot; later saves compare against this one
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+        }
+    
     def clean(self):
         """Validate listing data"""
         if self.price < 0:
             raise ValidationError({'price': 'Price cannot be negative'})
 
 
+class ListingCard(models.Model):
+    """
+    Denormalized read model for the public listing feed.
+    One row per listing with exactly what a feed card shows, so browsing and
+    filtering never join users, categories or images.
+    Kept in sync by listings.cards (see listings.signals).
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card'
+    )
+    # Plain ids (no foreign keys) so reads never need a join
+    seller_id = models.BigIntegerField()
+    seller_username = models.CharField(max_length=150)
+    category_id = models.BigIntegerField()
+    category_name = models.CharField(max_length=100)
+    title = models.CharField(max_length=200)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    location = models.CharField(max_length=100)
+    is_sold = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+    cover_image = models.ImageField(blank=True)
+    cover_thumbnail = models.ImageField(blank=True)
+    created_at = models.DateTimeField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True)
+    # Copy of ListingStats.trending, or the creation-only score (see listings.trending)
+    trending = models.FloatField(default=0.0)
+    
+    class Meta:
+        ordering = ['-created_at']
+        # Each index matches one feed access pattern: the equality filter first,
+        # then the keyset ordering (sort key, listing id). Inactive listings never
+        # reach the feed, so every feed index is partial on is_active; the default
+        # unsold feed gets its own partial indexes.
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-listing'],
+                name='card_active_recent_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['-created_at', '-listing'],
+                name='card_live_recent_idx',
+                condition=models.Q(is_active=True, is_sold=False)
+            ),
+            models.Index(
+                fields=['price', 'listing'],
+                name='card_live_price_idx',
+                condition=models.Q(is_active=True, is_sold=False)
+            ),
+            models.Index(
+                fields=['category_id', '-created_at', '-listing'],
+                name='card_category_recent_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['category_id', 'price', 'listing'],
+                name='card_category_price_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(
+                fields=['location', '-created_at', '-listing'],
+                name='card_location_recent_idx',
+                condition=models.Q(is_active=True)
+            ),
+            # ?ordering=-trending, unsold feed and per category
+            models.Index(
+                fields=['-trending', '-listing'],
+                name='card_live_trending_idx',
+                condition=models.Q(is_active=True, is_sold=False)
+            ),
+            models.Index(
+                fields=['category_id', '-trending', '-listing'],
+                name='card_category_trending_idx',
+                condition=models.Q(is_active=True)
+            ),
+            # Radius search: geohash cell range scans (see listings.geo)
+            models.Index(
+                fields=['geohash'],
+                name='card_geohash_idx',
+                condition=models.Q(is_active=True)
+            ),
+            models.Index(fields=['seller_id']),
+        ]
+    
+    def __str__(self):
+        return self.title
+
+
+class ListingSearchDocument(models.Model):
+    """
+    Weighted full-text search document for a listing (PostgreSQL).
+    Maintained by listings.signals; the GIN index is created in the migration.
+    On SQLite the FTS5 table listings_listing_fts plays this role instead.
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document'
+    )
+    search_vector = SearchVectorField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Search document for listing {self.listing_id}"
+
+
+class ListingStats(models.Model):
+    """
+    View and impression totals for a listing, kept out of the listing row so
+    counting never locks it. Written in batches by listings.counters.
+    """
+    listing = models.OneToOneField(
+        Listing,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    view_count = models.PositiveBigIntegerField(default=0)
+    impression_count = models.PositiveBigIntegerField(default=0)
+    # Log-space decayed engagement (see listings.trending); NULL until the first event
+    trending = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = "Listing stats"
+    
+    def __str__(self):
+        return f"Stats for listing {self.listing_id}"
+
+
+class SimilarListing(models.Model):
+    """
+    Precomputed neighbour of a listing, ranked by TF-IDF similarity.
+    Written in bulk by listings.similar; read by GET /api/listings/{id}/similar/.
+    """
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='similar_entries'
+    )
+    similar = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='similar_to'
+    )
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['listing', 'rank']
+        constraints = [
+            # Also the index behind the per-listing lookup
+            models.UniqueConstraint(fields=['listing', 'rank'], name='similar_listing_rank_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.similar_id} similar to {self.listing_id} ({self.score:.2f})"
+
+
+class ListingPriceChange(models.Model):
+    """One edit of a listing's price, newest first"""
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='price_history'
+    )
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-changed_at']
+        indexes = [
+            models.Index(fields=['listing', '-changed_at'], name='price_change_listing_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.listing_id}: {self.old_price} -> {self.new_price}"
+
+
 class ListingImage(models.Model):
     """
     Model for storing multiple images per listing.
@@ -80,10 +308,27 @@ class ListingImage(models.Model):
         upload_to=listing_image_path,
         validators=[validate_image_size]
     )
+    # Resized copies (see listings.renditions); empty until generated
+    renditions = models.JSONField(default=dict, blank=True, editable=False)
+    # Perceptual hash and its indexed 16-bit bands (see listings.duplicates); null until computed
+    dhash = models.BigIntegerField(null=True, blank=True, editable=False)
+    dhash_0 = models.SmallIntegerField(null=True, blank=True, editable=False)
+    dhash_1 = models.SmallIntegerField(null=True, blank=True, editable=False)
+    dhash_2 = models.SmallIntegerField(null=True, blank=True, editable=False)
+    dhash_3 = models.SmallIntegerField(null=True, blank=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['uploaded_at']
+        indexes = [
+            models.Index(fields=['listing', 'uploaded_at'], name='listingimage_listing_order_idx'),
+            models.Index(fields=['dhash_0'], name='listingimage_dhash_0_idx'),
+            models.Index(fields=['dhash_1'], name='listingimage_dhash_1_idx'),
+            models.Index(fields=['dhash_2'], name='listingimage_dhash_2_idx'),
+            models.Index(fields=['dhash_3'], name='listingimage_dhash_3_idx'),
+            # Stored-name lookups of blob garbage collection (listings.blob_gc)
+            models.Index(fields=['image'], name='listingimage_image_idx'),
+        ]
     
     def __str__(self):
         return f"Image for {self.listing.title}"
@@ -94,6 +339,62 @@ class ListingImage(models.Model):
             raise ValidationError('Maximum 5 images allowed per listing')
 
 
+class UploadIntent(models.Model):
+    """
+    A reserved storage name that the listing's owner may upload one image to
+    directly (see listings.direct_uploads), until expires_at. Finalizing it
+    creates the ListingImage.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='upload_intents'
+    )
+    listing = models.ForeignKey(
+        Listing,
+        on_delete=models.CASCADE,
+        related_name='upload_intents'
+    )
+    name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    # Set while finalize() checks the upload; no further uploads are accepted then
+    finalizing_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['listing', 'expires_at'], name='upload_intent_listing_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Upload {self.id} for listing {self.listing_id}"
+
+
+class OrphanedBlob(models.Model):
+    """
+    Tombstone of a stored file that no row refers to any more, waiting for
+    listings.blob_gc.sweep() to delete it from media storage.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # When the sweeper may (re)try; pushed forward while a sweeper holds it and after failures
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='orphaned_blob_due_idx'),
+        ]
+    
+    def __str__(self):
+        return self.name
+
+
 class SavedListing(models.Model):
     """
     Model for users to save/bookmark listings (wishlist functionality).
@@ -122,6 +423,56 @@ class SavedListing(models.Model):
         return f"{self.user.username} saved {self.listing.title}"
 
 
+class SavedSearch(models.Model):
+    """
+    A user's saved filter; new listings matching every predicate raise a
+    'saved_search' notification. `anchor` is the search's key in the
+    inverted index used by listings.saved_searches.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='saved_searches'
+    )
+    name = models.CharField(max_length=100, blank=True)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='saved_searches'
+    )
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    location = models.CharField(max_length=100, blank=True)
+    keywords = models.CharField(max_length=200, blank=True)
+    anchor = models.CharField(max_length=80, editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Saved searches'
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+            models.Index(
+                fields=['anchor'],
+                name='saved_search_anchor_idx',
+                condition=models.Q(is_active=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.name or self.keywords or 'saved search'}"
+    
+    def save(self, *args, **kwargs):
+        self.anchor = search_anchor(self.category_id, self.location, self.keywords)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'anchor'}
+        super().save(*args, **kwargs)
+
+
 class ListingReport(models.Model):
     """
     Model for users to report inappropriate listings.
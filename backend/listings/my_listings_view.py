@@ -2,9 +2,11 @@ from rest_framework import generics, permissions
 from rest_framework.response import Response
 from .models import Listing
 from .serializers import ListingListSerializer
+from olx_backend.fieldsets import SparseQuerysetMixin
+from olx_backend.pagination import KeysetPagination
 
 
-class MyListingsView(generics.ListAPIView):
+class MyListingsView(SparseQuerysetMixin, generics.ListAPIView):
     """
     Get current user's listings.
     Secure endpoint requiring JWT authentication.
@@ -13,9 +15,10 @@ class MyListingsView(generics.ListAPIView):
     """
     serializer_class = ListingListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """Filter listings to only show current user's listings"""
         return Listing.objects.filter(
             user=self.request.user
-        ).select_related('user', 'category').prefetch_related('images').order_by('-created_at')
+        ).select_related('user', 'category').order_by('-created_at')
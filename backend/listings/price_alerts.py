@@ -0,0 +1,60 @@
+"""
+Price history and price-drop alerts.
+
+A price edit is spotted in post_save by comparing against the price the
+instance was loaded with (Listing._loaded_values), so no extra query is
+needed, and is recorded as a ListingPriceChange. A drop on a live listing
+notifies everyone who saved it: the fan-out runs in the background after
+commit, so the seller's request never waits on it, and writes every
+notification with one bulk_create.
+"""
+from notifications.services import NotificationService
+from olx_backend import background
+
+
+def price_change(listing):
+    """(old price, new price) if this save changed the price, else None"""
+    from .models import Listing
+
+    old_price = getattr(listing, '_loaded_values', {}).get('price')
+    new_price = Listing._meta.get_field('price').to_python(listing.price)
+    if old_price is None or old_price == new_price:
+        return None
+    return old_price, new_price
+
+
+def record_price_change(listing):
+    """Store a price edit and schedule alerts if it is a drop"""
+    from .models import ListingPriceChange
+
+    change = price_change(listing)
+    if change is None:
+        return
+    old_price, new_price = change
+    ListingPriceChange.objects.create(listing=listing, old_price=old_price, new_price=new_price)
+    if new_price < old_price and listing.is_active and not listing.is_sold:
+        background.submit(notify_price_drop, listing.pk, listing.title, old_price, new_price)
+
+
+def notify_price_drop(listing_id, title, old_price, new_price):
+    """Notify every user who saved the listing; returns the notification count"""
+    from notifications.models import Notification
+    from .models import SavedListing
+
+    recipients = SavedListing.objects.filter(listing_id=listing_id).exclude(
+        user__notification_preferences__enable_in_app=False
+    ).values_list('user_id', flat=True)
+    notifications = [
+        Notification(
+            recipient_id=user_id,
+            notification_type='price_drop',
+            title='Price drop on a saved listing',
+            message=f'{title} is now {new_price} (was {old_price})',
+            link_url=f'/listings/{listing_id}',
+            metadata={'listing_id': listing_id, 'old_price': str(old_price), 'new_price': str(new_price)}
+        )
+        for user_id in recipients.iterator(chunk_size=2000)
+    ]
+    if not notifications:
+        return 0
+    return len(NotificationService.create_notifications(notifications))
@@ -0,0 +1,45 @@
+"""
+Projections (see olx_backend.projections) for the listing list endpoints.
+Each mirrors a serializer in listings.serializers key for key.
+"""
+from olx_backend.projections import Projection, absolute_url
+from .models import Listing, ListingCard
+from .serializers import ListingCardSerializer, ListingListSerializer, SavedListingSerializer
+
+
+class ListingCardProjection(Projection):
+    """Public feed cards (ListingCardSerializer)"""
+    serializer_class = ListingCardSerializer
+    method_columns = {
+        'user': ['seller_id', 'seller_username'],
+        'first_image': ['cover_image', 'cover_thumbnail'],
+    }
+    cover_storage = ListingCard._meta.get_field('cover_image').storage
+    
+    def project_user(self, row, context):
+        return {'id': self.get(row, 'seller_id'), 'username': self.get(row, 'seller_username')}
+    
+    def project_first_image(self, row, context):
+        name = self.get(row, 'cover_thumbnail') or self.get(row, 'cover_image')
+        return absolute_url(self.cover_storage.url(name), context) if name else None
+    
+    def project_distance_km(self, row, context):
+        distance = row.get(self.prefix + 'distance_km')
+        return round(distance, 2) if distance is not None else None
+
+
+class ListingListProjection(Projection):
+    """Listing summaries (ListingListSerializer)"""
+    serializer_class = ListingListSerializer
+    method_columns = {'first_image': ['cover_image', 'cover_thumbnail']}
+    cover_storage = Listing._meta.get_field('cover_image').storage
+    
+    def project_first_image(self, row, context):
+        name = self.get(row, 'cover_thumbnail') or self.get(row, 'cover_image')
+        return absolute_url(self.cover_storage.url(name), context) if name else None
+
+
+class SavedListingProjection(Projection):
+    """Wishlist entries (SavedListingSerializer)"""
+    serializer_class = SavedListingSerializer
+    nested_projections = {'listing': ListingListProjection}
@@ -0,0 +1,155 @@
+"""
+Resized renditions of listing images.
+
+Every ListingImage gets a THUMBNAIL (feed cards, wishlists) and a MEDIUM
+rendition (detail pages), generated in the background once the upload
+commits (see olx_backend.background). Renditions are stored next to the
+original through the image field's storage (STORAGES['default']):
+listings/12/photo.jpg -> listings/12/photo.thumb.webp, photo.medium.webp.
+
+ListingImage.renditions records what exists:
+
+    {'original': {'width': 3000, 'height': 2000},
+     'thumb': {'name': 'listings/12/photo.thumb.webp', 'width': 320, 'height': 213},
+     'medium': {...}}
+
+A rendition is never wider or taller than its box and never upscaled:
+an original already inside the MEDIUM box only gets a thumbnail. The
+cover's thumbnail is mirrored to Listing.cover_thumbnail and the feed card,
+which list serializers prefer over the original. The decoded image also
+gives the photo's perceptual hash (listings.duplicates).
+"""
+import logging
+import os
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import ExifTags, Image, ImageOps
+from olx_backend import background
+from . import cache as feed_cache
+from . import blob_gc, duplicates
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL = 'thumb'
+MEDIUM = 'medium'
+
+# Bounding box (longest side, px) of each rendition, smallest first
+SIZES = {THUMBNAIL: 320, MEDIUM: 960}
+
+# 'WEBP' or 'JPEG'
+FORMAT = getattr(settings, 'LISTING_RENDITION_FORMAT', 'WEBP').upper()
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+QUALITY = 80
+
+
+def rendition_name(name, size):
+    """Storage name of a rendition: next to the original, size and format in the suffix"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.{size}.{EXTENSIONS[FORMAT]}'
+
+
+def thumbnail_name(renditions):
+    """Stored thumbnail name from a ListingImage.renditions dict, or ''"""
+    return (renditions or {}).get(THUMBNAIL, {}).get('name', '')
+
+
+def srcset(renditions, original_url, build_url):
+    """
+    srcset value listing the renditions and the original by width, or ''
+    when the image has not been processed yet. `build_url` turns a storage
+    name into a URL.
+    """
+    renditions = renditions or {}
+    original = renditions.get('original')
+    if not original:
+        return ''
+    candidates = [
+        (build_url(renditions[size]['name']), renditions[size]['width'])
+        for size in SIZES if size in renditions
+    ]
+    candidates.append((original_url, original['width']))
+    return ', '.join(f'{url} {width}w' for url, width in candidates)
+
+
+def encode(image, size):
+    """`image` shrunk to fit a size x size box, encoded in FORMAT"""
+    copy = image.copy()
+    copy.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if FORMAT == 'JPEG' and copy.mode != 'RGB':
+        copy = copy.convert('RGB')
+    elif copy.mode not in ('RGB', 'RGBA'):
+        copy = copy.convert('RGBA' if 'transparency' in copy.info or copy.mode in ('LA', 'PA') else 'RGB')
+    buffer = BytesIO()
+    options = {'method': 4} if FORMAT == 'WEBP' else {'optimize': True, 'progressive': True}
+    copy.save(buffer, FORMAT, quality=QUALITY, **options)
+    return copy.size, buffer.getvalue()
+
+
+def render(storage, name):
+    """
+    Generate and store the renditions of one stored image; returns the
+    renditions dict and the image's perceptual hash (listings.duplicates)
+    """
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        width, height = image.size
+        if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8):
+            width, height = height, width  # Stored rotated; shown the other way round
+        original_size = (width, height)
+        image.draft('RGB', (SIZES[MEDIUM], SIZES[MEDIUM]))  # JPEG: decode at a reduced scale
+        image = ImageOps.exif_transpose(image)
+    image_hash = duplicates.dhash(image)
+    renditions = {'original': {'width': original_size[0], 'height': original_size[1]}}
+    for size, box in SIZES.items():
+        if size != THUMBNAIL and max(original_size) <= box:
+            continue
+        (width, height), data = encode(image, box)
+        stored = storage.save(rendition_name(name, size), ContentFile(data))
+        renditions[size] = {'name': stored, 'width': width, 'height': height}
+    return renditions, image_hash
+
+
+def generate(image_ids):
+    """Render the given ListingImages and publish their covers' thumbnails; returns the count"""
+    from .models import Listing, ListingCard, ListingImage
+
+    storage = ListingImage._meta.get_field('image').storage
+    done = 0
+    for image_id, listing_id, name in ListingImage.objects.filter(
+        pk__in=list(image_ids)
+    ).values_list('id', 'listing_id', 'image'):
+        try:
+            renditions, image_hash = render(storage, name)
+        except Exception:
+            logger.exception('Could not render image %s (%s)', image_id, name)
+            continue
+        if not ListingImage.objects.filter(pk=image_id, image=name).update(
+            renditions=renditions, **duplicates.hash_fields(image_hash)
+        ):
+            # Deleted while rendering: its tombstone could not name these
+            blob_gc.tombstone(blob_gc.image_names('', renditions))
+            continue
+        thumbnail = thumbnail_name(renditions)
+        if Listing.objects.filter(pk=listing_id, cover_image=name).update(cover_thumbnail=thumbnail):
+            ListingCard.objects.filter(listing_id=listing_id).update(cover_thumbnail=thumbnail)
+            category_id = Listing.objects.filter(pk=listing_id).values_list('category_id', flat=True).first()
+            feed_cache.bump_listing(listing_id, {category_id})
+        else:
+            feed_cache.bump(feed_cache.listing_stamp(listing_id))
+        done += 1
+    return done
+
+
+def schedule(image_ids):
+    """Render images in the background once the current transaction commits"""
+    image_ids = list(image_ids)
+    if image_ids:
+        background.submit(generate, image_ids)
+
+
+def pending_image_ids():
+    """Images without renditions (uploaded before renditions existed, or failed)"""
+    from .models import ListingImage
+
+    return ListingImage.objects.filter(renditions={}).order_by('pk').values_list('pk', flat=True)
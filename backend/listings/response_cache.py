@@ -0,0 +1,103 @@
+"""
+Conditional GET and a shared response cache for anonymous listing reads.
+
+Every cacheable read maps to one version stamp (listings.cache): the
+listing for a detail, the category or whole feed for a list. The stamp
+is bumped by listings.signals whenever a Listing, ListingImage, Category
+or seller changes, and is part of the ETag and of the server-side cache
+key; nothing is ever deleted, stale entries simply stop being addressed
+and expire.
+
+Stamps are times, so they also give Last-Modified: the stamp rounded up
+to the next whole second. HTTP dates have one-second resolution, so the
+header is only sent once that second is over; a later bump then always
+lands in a later second, and If-Modified-Since can't answer a stale 304
+for a write made in the same second as the cached copy.
+"""
+import hashlib
+import math
+import time
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+from . import cache as feed_cache
+
+RESPONSE_CACHE_TIMEOUT = 60 * 5
+
+
+def last_modified_for(stamp, now=None):
+    """Last-Modified (epoch seconds) for a stamp, or None while its second is still running"""
+    last_modified = math.floor(stamp) + 1
+    if (now or time.time()) < last_modified:
+        return None
+    return last_modified
+
+
+class AnonymousReadCacheMixin:
+    """
+    ViewSet mixin: anonymous list/retrieve requests get ETag and
+    Last-Modified validators (answering 304 when they match) and are served
+    from the cache until the underlying stamp moves.
+    """
+    cached_read_actions = ('list', 'retrieve')
+    response_cache_timeout = RESPONSE_CACHE_TIMEOUT
+    
+    def list(self, request, *args, **kwargs):
+        return self.cached_read(super().list, request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_read(super().retrieve, request, *args, **kwargs)
+    
+    def get_read_stamp(self):
+        """Name of the version stamp covering the current read"""
+        if self.action == 'retrieve':
+            return feed_cache.listing_stamp(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return feed_cache.feed_partition(self.request.query_params)
+    
+    def get_read_variant(self):
+        """Extra version for bodies that also change without a stamp bump (e.g. live counters)"""
+        return ''
+    
+    def get_read_key(self, request):
+        """Everything besides the stamp that changes the response body"""
+        params = sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values if value != ''
+        )
+        # Pagination links are absolute, so the host is part of the body
+        raw = repr((request.get_host(), request.path, params, self.get_read_variant()))
+        return hashlib.md5(raw.encode()).hexdigest()
+    
+    def cached_read(self, handler, request, *args, **kwargs):
+        if self.action not in self.cached_read_actions or request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        
+        name = self.get_read_stamp()
+        stamp = feed_cache.get_stamps(name)[name]
+        key = self.get_read_key(request)
+        etag = quote_etag(hashlib.md5(
+            f'{key}:{stamp}:{request.accepted_renderer.format}'.encode()
+        ).hexdigest())
+        last_modified = last_modified_for(stamp)
+        
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            cache_key = f'listings:response:{self.action}:{key}:{stamp}'
+            data = cache.get(cache_key)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cache.set(cache_key, response.data, self.response_cache_timeout)
+        
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Shared caches may store it but must revalidate; logged-in users get a different response
+        response['Cache-Control'] = 'public, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+        return response
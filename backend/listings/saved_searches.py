@@ -0,0 +1,160 @@
+"""
+Saved-search alerts.
+
+A saved search is a conjunction of predicates: category, price range,
+location words and keywords. Each search is filed in an inverted index
+under a single anchor key, "<category id or *>/<predicate>", where the
+predicate is its longest keyword ("k:<word>"), else its longest location
+word ("l:<word>"), else "*". A new listing can only match searches
+filed under one of its own keys (its category and "*", times "*" and each
+of its location and text words), so matching is an indexed lookup of
+those keys followed by checking the remaining predicates of the few
+searches found, however many searches exist.
+
+Matches become one 'saved_search' notification per user and listing,
+inserted in batches.
+"""
+from collections import defaultdict
+from django.db.models import Q
+from .search import tokenize
+
+ANY = '*'
+
+# Words longer than this are cut so keys fit SavedSearch.anchor
+MAX_WORD_LENGTH = 60
+
+# Saved searches a user may keep
+MAX_SAVED_SEARCHES = 25
+
+# Anchor keys per lookup query (below SQLite's bound-parameter limit)
+KEY_BATCH_SIZE = 500
+
+# Notifications per INSERT
+NOTIFICATION_BATCH_SIZE = 1000
+
+
+def words(text):
+    """Distinct lowercase words of a text"""
+    return {token[:MAX_WORD_LENGTH] for token in tokenize([text or ''])}
+
+
+def _key(category_id, predicate):
+    return f"{category_id or ANY}/{predicate}"
+
+
+def search_anchor(category_id, location, keywords):
+    """Index key of a saved search: its most selective predicate"""
+    for prefix, text in (('k', keywords), ('l', location)):
+        candidates = words(text)
+        if candidates:
+            # Longest word first (rarest, roughly); ties broken alphabetically to stay stable
+            word = min(candidates, key=lambda word: (-len(word), word))
+            return _key(category_id, f'{prefix}:{word}')
+    return _key(category_id, ANY)
+
+
+def listing_keys(category_id, location_words, text_words):
+    """Every anchor a search matching this listing could be filed under"""
+    predicates = {ANY}
+    predicates.update(f'l:{word}' for word in location_words)
+    predicates.update(f'k:{word}' for word in text_words)
+    return {_key(category, predicate) for category in (category_id, None) for predicate in predicates}
+
+
+class _Candidate:
+    """What matching needs to know about a new listing"""
+    __slots__ = ('id', 'user_id', 'title', 'location', 'price', 'location_words', 'text_words')
+
+    def __init__(self, listing_id, user_id, title, description, location, price):
+        self.id = listing_id
+        self.user_id = user_id
+        self.title = title
+        self.location = location
+        self.price = price
+        self.location_words = words(location)
+        self.text_words = words(title) | words(description)
+
+
+def match_listings(listing_ids):
+    """
+    Match the live listings among `listing_ids`; returns ({listing_id:
+    {user_id: [saved search ids]}}, {listing_id: listing}). A seller's own
+    searches never match their listings.
+    """
+    from .models import Listing, SavedSearch
+
+    listings = {}
+    postings = defaultdict(list)
+    for row in Listing.objects.filter(
+        pk__in=list(listing_ids), is_active=True, is_sold=False
+    ).values_list('id', 'user_id', 'category_id', 'title', 'description', 'location', 'price'):
+        listing_id, user_id, category_id, title, description, location, price = row
+        listing = _Candidate(listing_id, user_id, title, description, location, price)
+        listings[listing_id] = listing
+        for key in listing_keys(category_id, listing.location_words, listing.text_words):
+            postings[key].append(listing)
+    if not listings:
+        return {}, {}
+
+    # Searches whose price range misses every listing in the batch are skipped in SQL
+    prices = [listing.price for listing in listings.values()]
+    in_price_range = (
+        (Q(min_price__isnull=True) | Q(min_price__lte=max(prices)))
+        & (Q(max_price__isnull=True) | Q(max_price__gte=min(prices)))
+    )
+
+    matches = defaultdict(lambda: defaultdict(list))
+    keys = sorted(postings)
+    for start in range(0, len(keys), KEY_BATCH_SIZE):
+        searches = SavedSearch.objects.filter(
+            in_price_range, is_active=True, anchor__in=keys[start:start + KEY_BATCH_SIZE]
+        ).values_list('id', 'user_id', 'anchor', 'min_price', 'max_price', 'location', 'keywords')
+        for search_id, user_id, anchor, min_price, max_price, location, keywords in searches.iterator(chunk_size=2000):
+            location_words = words(location)
+            keyword_words = words(keywords)
+            for listing in postings[anchor]:
+                if (
+                    listing.user_id != user_id
+                    and (min_price is None or listing.price >= min_price)
+                    and (max_price is None or listing.price <= max_price)
+                    and location_words <= listing.location_words
+                    and keyword_words <= listing.text_words
+                ):
+                    matches[listing.id][user_id].append(search_id)
+    return {listing_id: dict(users) for listing_id, users in matches.items()}, listings
+
+
+def notify_matches(listing_ids):
+    """Notify the owners of saved searches matching new listings; returns the notification count"""
+    from notifications.models import Notification, NotificationPreference
+    from notifications.services import NotificationService
+
+    matches, listings = match_listings(listing_ids)
+    if not matches:
+        return 0
+    recipients = {user_id for users in matches.values() for user_id in users}
+    muted = set(NotificationPreference.objects.filter(
+        user_id__in=recipients, enable_in_app=False
+    ).values_list('user_id', flat=True))
+
+    created = 0
+    batch = []
+    for listing_id, users in matches.items():
+        listing = listings[listing_id]
+        for user_id, search_ids in users.items():
+            if user_id in muted:
+                continue
+            batch.append(Notification(
+                recipient_id=user_id,
+                notification_type='saved_search',
+                title='New listing matches your saved search',
+                message=f'{listing.title} - {listing.price} in {listing.location}',
+                link_url=f'/listings/{listing_id}',
+                metadata={'listing_id': listing_id, 'saved_search_ids': search_ids}
+            ))
+            if len(batch) >= NOTIFICATION_BATCH_SIZE:
+                created += len(NotificationService.create_notifications(batch))
+                batch = []
+    if batch:
+        created += len(NotificationService.create_notifications(batch))
+    return created
@@ -2,8 +2,10 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import SavedListing, Listing
-from .serializers import SavedListingSerializer
+from .models import SavedListing, SavedSearch, Listing
+from .serializers import SavedListingSerializer, SavedSearchSerializer
+from .projections import SavedListingProjection
+from olx_backend.projections import ProjectionUnsupported
 
 
 class SavedListingListView(APIView):
@@ -25,7 +27,16 @@ class SavedListingListView(APIView):
             'listing',
             'listing__user',
             'listing__category'
-        ).prefetch_related('listing__images')
+        )
+        
+        context = {'request': request}
+        try:
+            projection = SavedListingProjection.compile(context)
+        except ProjectionUnsupported:
+            projection = None
+        if projection is not None:
+            rows = projection.project(saved_listings, context)
+            return Response(projection.render(rows, context), status=status.HTTP_200_OK)
         
         serializer = SavedListingSerializer(saved_listings, many=True, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -65,3 +76,69 @@ class SavedListingDetailView(APIView):
                 {'error': 'Saved listing not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+
+
+class SavedSearchListView(APIView):
+    """
+    GET /api/listings/saved-searches/
+    - List the authenticated user's saved searches
+    
+    POST /api/listings/saved-searches/
+    - Save a search; new matching listings raise a notification
+    - Body: {"name", "category", "min_price", "max_price", "location", "keywords"}
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        """Get user's saved searches"""
+        saved_searches = SavedSearch.objects.filter(
+            user=request.user
+        ).select_related('category')
+        serializer = SavedSearchSerializer(saved_searches, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def post(self, request):
+        """Create a saved search"""
+        serializer = SavedSearchSerializer(data=request.data, context={'request': request})
+        
+        if serializer.is_valid():
+            serializer.save(user=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SavedSearchDetailView(APIView):
+    """
+    GET / PATCH / DELETE /api/listings/saved-searches/<id>/
+    - Read, edit (e.g. {"is_active": false} to pause alerts) or remove a saved search
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get_object(self, request, pk):
+        return SavedSearch.objects.filter(id=pk, user=request.user).select_related('category').first()
+    
+    def get(self, request, pk):
+        saved_search = self.get_object(request, pk)
+        if saved_search is None:
+            return Response({'error': 'Saved search not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = SavedSearchSerializer(saved_search, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+    
+    def patch(self, request, pk):
+        saved_search = self.get_object(request, pk)
+        if saved_search is None:
+            return Response({'error': 'Saved search not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = SavedSearchSerializer(
+            saved_search, data=request.data, partial=True, context={'request': request}
+        )
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    def delete(self, request, pk):
+        deleted, _ = SavedSearch.objects.filter(id=pk, user=request.user).delete()
+        if not deleted:
+            return Response({'error': 'Saved search not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,163 @@
+"""
+Full-text search backends for listings.
+
+PostgreSQL keeps a weighted tsvector per listing in ListingSearchDocument
+(GIN indexed). SQLite keeps the same document in an FTS5 virtual table
+for local runs. Both expose the same small interface so views never
+need to know which database they run against.
+"""
+import re
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+
+# Weighted fields of the search document, most relevant first
+SEARCH_FIELDS = ('title', 'location', 'description')
+
+# Text search configuration used for tsvector/tsquery on PostgreSQL
+SEARCH_CONFIG = 'simple'
+
+FTS_TABLE = 'listings_listing_fts'
+
+# Keep IN (...) lists below SQLite's bound-parameter limit
+SQLITE_CHUNK_SIZE = 500
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(terms):
+    """Split raw search terms into safe lowercase tokens"""
+    tokens = []
+    for term in terms:
+        tokens.extend(token.lower() for token in _TOKEN_RE.findall(term))
+    return tokens
+
+
+class PostgresSearchBackend:
+    """tsvector + GIN search stored in ListingSearchDocument"""
+
+    def index(self, listing_ids):
+        """(Re)build search documents for the given listings in one statement"""
+        listing_ids = list(listing_ids)
+        if not listing_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO listings_listingsearchdocument (listing_id, search_vector, updated_at)
+                SELECT id,
+                       setweight(to_tsvector(%s, coalesce(title, '')), 'A') ||
+                       setweight(to_tsvector(%s, coalesce(location, '')), 'B') ||
+                       setweight(to_tsvector(%s, coalesce(description, '')), 'C'),
+                       now()
+                FROM listings_listing
+                WHERE id = ANY(%s)
+                ON CONFLICT (listing_id) DO UPDATE
+                SET search_vector = EXCLUDED.search_vector,
+                    updated_at = EXCLUDED.updated_at
+                """,
+                [SEARCH_CONFIG, SEARCH_CONFIG, SEARCH_CONFIG, listing_ids]
+            )
+
+    def remove(self, listing_ids):
+        """Drop search documents (also removed by the FK cascade)"""
+        from .models import ListingSearchDocument
+        ListingSearchDocument.objects.filter(listing_id__in=list(listing_ids)).delete()
+
+    def rebuild(self):
+        """Rebuild every search document"""
+        from .models import Listing, ListingSearchDocument
+        ListingSearchDocument.objects.all().delete()
+        self.index(Listing.objects.values_list('id', flat=True))
+
+    def search(self, queryset, tokens):
+        """Filter by prefix match on all tokens and annotate search_rank"""
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        from .models import ListingSearchDocument
+
+        query = SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokens),
+            search_type='raw',
+            config=SEARCH_CONFIG
+        )
+        matches = ListingSearchDocument.objects.filter(search_vector=query)
+        rank = ListingSearchDocument.objects.filter(
+            listing_id=OuterRef('pk')
+        ).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).values('rank')[:1]
+        return queryset.filter(
+            pk__in=matches.values('listing_id')
+        ).annotate(search_rank=Subquery(rank))
+
+
+class SQLiteSearchBackend:
+    """FTS5 virtual table keyed by listing id (rowid)"""
+
+    def index(self, listing_ids):
+        """(Re)build FTS rows for the given listings"""
+        listing_ids = list(listing_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(listing_ids), SQLITE_CHUNK_SIZE):
+                chunk = listing_ids[start:start + SQLITE_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                    chunk
+                )
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, title, location, description) '
+                    f'SELECT id, title, location, description FROM listings_listing '
+                    f'WHERE id IN ({placeholders})',
+                    chunk
+                )
+
+    def remove(self, listing_ids):
+        """Drop FTS rows for deleted listings"""
+        listing_ids = list(listing_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(listing_ids), SQLITE_CHUNK_SIZE):
+                chunk = listing_ids[start:start + SQLITE_CHUNK_SIZE]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                    chunk
+                )
+
+    def rebuild(self):
+        """Rebuild the whole FTS table"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, location, description) '
+                f'SELECT id, title, location, description FROM listings_listing'
+            )
+
+    def search(self, queryset, tokens):
+        """Filter by prefix match on all tokens and annotate search_rank (bm25)"""
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        outer_pk = '{}.{}'.format(
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.pk.column)
+        )
+        # bm25() is "lower is better"; negate it so higher search_rank wins
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 4.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {outer_pk}',
+            [match]
+        )
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(search_rank=rank)
+
+
+_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    """Return the search backend for the default database, or None if unsupported"""
+    backend_class = _BACKENDS.get(connection.vendor)
+    return backend_class() if backend_class else None
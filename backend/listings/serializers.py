@@ -1,53 +1,62 @@
 from rest_framework import serializers
-from .models import Listing, ListingImage, SavedListing, ListingReport
+from .models import Listing, ListingImage, SavedListing, SavedSearch, ListingReport, ListingCard
 from categories.serializers import CategorySerializer
 from users.serializers import UserSerializer
 from django.core.exceptions import ValidationError as DjangoValidationError
-from PIL import Image
+from olx_backend.fieldsets import SparseFieldsMixin
+from olx_backend.projections import absolute_url
+from .counters import get_counts
+from .saved_searches import MAX_SAVED_SEARCHES, words
+from . import duplicates, image_validation, renditions
+from .uploads import save_images
 
 
-class ListingImageSerializer(serializers.ModelSerializer):
+class MediaURLMixin:
+    """Build absolute media URLs, resolving the request origin once per response"""
+    
+    def build_media_url(self, url):
+        return absolute_url(url, self.context)
+
+
+class ListingImageField(serializers.FileField):
+    """
+    Image upload validated and stripped of metadata in a single read
+    (see listings.image_validation); the value is the cleaned file.
+    """
+
+    def to_internal_value(self, data):
+        upload = super().to_internal_value(data)
+        try:
+            return image_validation.sanitize(upload)
+        except image_validation.InvalidImage as exc:
+            raise serializers.ValidationError(str(exc))
+
+
+class ListingImageSerializer(SparseFieldsMixin, MediaURLMixin, serializers.ModelSerializer):
     """
     Serializer for listing images with validation.
-    Validates file type and size.
+    Validates file type, size and dimensions and strips metadata (ListingImageField).
     """
+    image = ListingImageField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = ListingImage
-        fields = ['id', 'image', 'uploaded_at']
+        fields = ['id', 'image', 'srcset', 'uploaded_at']
         read_only_fields = ['id', 'uploaded_at']
+        sparse_sources = {'srcset': ['image', 'renditions']}
 
-    def validate_image(self, value):
-        """
-        Validate image file type and size.
-        Only allow common image formats and max 5MB.
-        """
-
-        # Validate file size (5MB max)
-        if value.size > 5 * 1024 * 1024:
-            raise serializers.ValidationError(
-                "Image file size cannot exceed 5MB"
-            )
-
-        # Validate image integrity & format using Pillow
-        try:
-            img = Image.open(value)
-            img.verify()  # verifies image without loading it fully
-            format = img.format.lower()
-        except Exception:
-            raise serializers.ValidationError("Invalid or corrupted image file")
-
-        valid_formats = ['jpeg', 'jpg', 'png', 'gif', 'webp']
-        if format not in valid_formats:
-            raise serializers.ValidationError(
-                f"Invalid image format. Allowed formats: {', '.join(valid_formats)}"
-            )
-
-        return value
-
+    def get_srcset(self, obj):
+        """Renditions and original by width ('' until renditions are generated)"""
+        storage = obj.image.storage
+        return renditions.srcset(
+            obj.renditions,
+            self.build_media_url(obj.image.url),
+            lambda name: self.build_media_url(storage.url(name))
+        )
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class ListingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Main serializer for Listing model.
     Includes nested user and category info, and images.
@@ -56,21 +65,47 @@ class ListingSerializer(serializers.ModelSerializer):
     category_detail = CategorySerializer(source='category', read_only=True)
     images = ListingImageSerializer(many=True, read_only=True)
     uploaded_images = serializers.ListField(
-        child=serializers.ImageField(),
+        child=ListingImageField(),
         write_only=True,
         required=False,
         max_length=5,
         help_text="Upload up to 5 images"
     )
+    check_duplicates = serializers.BooleanField(
+        write_only=True,
+        required=False,
+        default=False,
+        help_text="Reject uploaded images that are near-identical to photos of a live listing"
+    )
+    view_count = serializers.SerializerMethodField()
+    impression_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Listing
         fields = [
             'id', 'user', 'category', 'category_detail', 'title', 
-            'description', 'price', 'location', 'is_sold', 
-            'images', 'uploaded_images', 'created_at', 'updated_at'
+            'description', 'price', 'location', 'latitude', 'longitude', 'is_sold', 
+            'images', 'uploaded_images', 'check_duplicates', 'view_count', 'impression_count',
+            'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'latitude', 'longitude', 'created_at', 'updated_at']
+        sparse_sources = {'view_count': [], 'impression_count': []}
+    
+    def get_live_counts(self, obj):
+        """Buffered counters (see listings.counters), fetched once for every listing rendered"""
+        counts = self.context.setdefault('listing_counts', {})
+        if obj.pk not in counts:
+            instances = getattr(self.parent, 'instance', None)
+            if not isinstance(instances, (list, tuple)) or obj not in instances:
+                instances = [obj]
+            counts.update(get_counts([instance.pk for instance in instances]))
+        return counts[obj.pk]
+    
+    def get_view_count(self, obj):
+        return self.get_live_counts(obj)['view_count']
+    
+    def get_impression_count(self, obj):
+        return self.get_live_counts(obj)['impression_count']
     
     def validate_price(self, value):
         """Validate that price is positive"""
@@ -98,20 +133,41 @@ class ListingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Maximum 5 images allowed per listing")
         return value
     
+    def validate(self, data):
+        """With check_duplicates, refuse photos that already appear on another live listing"""
+        uploaded_images = data.get('uploaded_images') or []
+        if data.get('check_duplicates') and uploaded_images:
+            candidates = ListingImage.objects.filter(listing__is_active=True, listing__is_sold=False)
+            if self.instance is not None:
+                candidates = candidates.exclude(listing=self.instance)
+            try:
+                hashes = [duplicates.hash_file(upload) for upload in uploaded_images]
+            except Exception:
+                raise serializers.ValidationError({'uploaded_images': "Invalid or corrupted image file"})
+            errors = {}
+            for index, _, listing_id, _ in duplicates.near_images(hashes, queryset=candidates):
+                errors.setdefault(
+                    index, f"Photo {index + 1} is nearly identical to a photo of listing {listing_id}"
+                )
+            if errors:
+                raise serializers.ValidationError({'uploaded_images': [errors[index] for index in sorted(errors)]})
+        return data
+    
     def create(self, validated_data):
         """Create listing with images"""
         uploaded_images = validated_data.pop('uploaded_images', [])
+        validated_data.pop('check_duplicates', None)
         listing = Listing.objects.create(**validated_data)
         
-        # Create image objects
-        for image in uploaded_images:
-            ListingImage.objects.create(listing=listing, image=image)
+        # Upload images in parallel, then create their rows
+        save_images(listing, uploaded_images)
         
         return listing
     
     def update(self, instance, validated_data):
         """Update listing and optionally add new images"""
         uploaded_images = validated_data.pop('uploaded_images', [])
+        validated_data.pop('check_duplicates', None)
         
         # Update listing fields
         for attr, value in validated_data.items():
@@ -122,13 +178,12 @@ class ListingSerializer(serializers.ModelSerializer):
         current_image_count = instance.images.count()
         remaining_slots = 5 - current_image_count
         
-        for image in uploaded_images[:remaining_slots]:
-            ListingImage.objects.create(listing=instance, image=image)
+        save_images(instance, uploaded_images[:max(remaining_slots, 0)])
         
         return instance
 
 
-class ListingListSerializer(serializers.ModelSerializer):
+class ListingListSerializer(SparseFieldsMixin, MediaURLMixin, serializers.ModelSerializer):
     """
     Optimized serializer for listing list view.
     Includes only essential fields and first image.
@@ -143,18 +198,53 @@ class ListingListSerializer(serializers.ModelSerializer):
             'id', 'user', 'category_name', 'title', 'price', 
             'location', 'is_sold', 'first_image', 'created_at'
         ]
+        sparse_sources = {'first_image': ['cover_image', 'cover_thumbnail']}
     
     def get_first_image(self, obj):
-        """Return URL of first image if exists"""
-        first_image = obj.images.first()
-        if first_image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(first_image.image.url)
-            return first_image.image.url
+        """Return URL of the listing's cover thumbnail (or cover image) if it has one"""
+        cover = obj.cover_thumbnail or obj.cover_image
+        if cover:
+            return self.build_media_url(cover.url)
         return None
 
 
+class ListingCardSerializer(SparseFieldsMixin, MediaURLMixin, serializers.ModelSerializer):
+    """
+    Feed card served from the ListingCard read model.
+    Same keys as ListingListSerializer; the seller is reduced to id and username.
+    """
+    id = serializers.IntegerField(source='listing_id', read_only=True)
+    user = serializers.SerializerMethodField()
+    first_image = serializers.SerializerMethodField()
+    distance_km = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ListingCard
+        fields = [
+            'id', 'user', 'category_name', 'title', 'price',
+            'location', 'is_sold', 'first_image', 'created_at', 'distance_km'
+        ]
+        sparse_sources = {
+            'user': ['seller_id', 'seller_username'],
+            'first_image': ['cover_image', 'cover_thumbnail'],
+            'distance_km': [],
+        }
+    
+    def get_user(self, obj):
+        return {'id': obj.seller_id, 'username': obj.seller_username}
+    
+    def get_first_image(self, obj):
+        cover = obj.cover_thumbnail or obj.cover_image
+        if cover:
+            return self.build_media_url(cover.url)
+        return None
+    
+    def get_distance_km(self, obj):
+        """Only set on radius searches (?lat=&lng=)"""
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 2) if distance is not None else None
+
+
 class SavedListingSerializer(serializers.ModelSerializer):
     """
     Serializer for saved listings (wishlist).
@@ -198,3 +288,46 @@ class SavedListingSerializer(serializers.ModelSerializer):
             user=user,
             listing_id=listing_id
         )
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    """
+    Serializer for saved searches (new listing alerts).
+    Every predicate is optional, but a search needs at least one of
+    category, location or keywords.
+    """
+    category_detail = CategorySerializer(source='category', read_only=True)
+    
+    class Meta:
+        model = SavedSearch
+        fields = [
+            'id', 'name', 'category', 'category_detail', 'min_price', 'max_price',
+            'location', 'keywords', 'is_active', 'created_at'
+        ]
+        read_only_fields = ['id', 'created_at']
+    
+    def validate(self, data):
+        """Validate price range and that the search narrows something down"""
+        def value(name):
+            if name in data:
+                return data[name]
+            return getattr(self.instance, name, None)
+        
+        min_price, max_price = value('min_price'), value('max_price')
+        for name, price in (('min_price', min_price), ('max_price', max_price)):
+            if price is not None and price < 0:
+                raise serializers.ValidationError({name: 'Price cannot be negative'})
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError({'max_price': 'Maximum price must not be below the minimum'})
+        
+        if not (value('category') or words(value('location')) or words(value('keywords'))):
+            raise serializers.ValidationError(
+                'Choose a category, location or keywords to search for'
+            )
+        
+        user = self.context['request'].user
+        if self.instance is None and SavedSearch.objects.filter(user=user).count() >= MAX_SAVED_SEARCHES:
+            raise serializers.ValidationError(
+                f'You can keep at most {MAX_SAVED_SEARCHES} saved searches'
+            )
+        return data
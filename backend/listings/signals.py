@@ -0,0 +1,257 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from categories.models import Category
+from olx_backend import background
+from .models import Listing, ListingImage, SavedListing, SimilarListing, UploadIntent
+from .search import SEARCH_FIELDS, get_search_backend
+from . import cards
+from . import cache as feed_cache
+from . import suggest
+from .similar import SIMILAR_SOURCE_FIELDS
+from . import trending
+from . import saved_searches
+from . import price_alerts
+from . import renditions
+from . import blob_gc
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Listing)
+def index_listing_for_search(sender, instance, update_fields=None, **kwargs):
+    """Keep the listing's search document in sync with its text fields"""
+    if update_fields is not None and not set(update_fields) & set(SEARCH_FIELDS):
+        return
+    backend = get_search_backend()
+    if backend:
+        backend.index([instance.pk])
+
+
+@receiver(post_delete, sender=Listing)
+def remove_listing_from_search(sender, instance, **kwargs):
+    """Drop the search document of a deleted listing"""
+    backend = get_search_backend()
+    if backend:
+        backend.remove([instance.pk])
+
+
+@receiver(post_save, sender=Listing)
+def sync_listing_card(sender, instance, update_fields=None, **kwargs):
+    """Refresh the feed card after a listing is saved"""
+    if update_fields is not None and not set(update_fields) & set(cards.CARD_SOURCE_FIELDS):
+        return
+    cards.sync_cards([instance.pk])
+
+
+@receiver(post_save, sender=Listing)
+def bump_listing_cache_stamps(sender, instance, **kwargs):
+    """Invalidate cached reads covering the listing, including a category it moved out of"""
+    previous_category = getattr(instance, '_loaded_values', {}).get('category_id')
+    feed_cache.bump_listing(instance.pk, {instance.category_id, previous_category})
+
+
+@receiver(post_delete, sender=Listing)
+def bump_deleted_listing_cache_stamps(sender, instance, **kwargs):
+    """Invalidate cached reads covering a deleted listing"""
+    feed_cache.bump_listing(instance.pk, {instance.category_id})
+
+
+# Listing fields that feed the typeahead index
+SUGGEST_SOURCE_FIELDS = {'title', 'location', 'category', 'is_active', 'is_sold'}
+
+
+def suggest_values(listing):
+    return {
+        'title': listing.title,
+        'location': listing.location,
+        'category_id': listing.category_id,
+        'is_active': listing.is_active,
+        'is_sold': listing.is_sold,
+    }
+
+
+def suggest_terms(values, category_name=None):
+    return suggest.listing_terms(
+        values['title'], values['location'], values['category_id'], category_name,
+        values['is_active'], values['is_sold']
+    )
+
+
+@receiver(post_save, sender=Listing)
+def update_suggest_index(sender, instance, created, update_fields=None, **kwargs):
+    """Publish typeahead weight changes once the save commits"""
+    if update_fields is not None and not set(update_fields) & SUGGEST_SOURCE_FIELDS:
+        return
+    current = suggest_values(instance)
+    before = []
+    if not created:
+        loaded = getattr(instance, '_loaded_values', {})
+        before = suggest_terms({name: loaded.get(name, value) for name, value in current.items()})
+    after = suggest_terms(current)
+    ops = suggest.listing_ops(before, after)
+    if any(kind == suggest.CATEGORY and delta > 0 for kind, _, _, delta in ops):
+        after = suggest_terms(current, instance.category.name)
+        ops = suggest.listing_ops(before, after)
+    transaction.on_commit(lambda: suggest.publish(ops))
+
+
+@receiver(post_delete, sender=Listing)
+def remove_from_suggest_index(sender, instance, **kwargs):
+    """Withdraw a deleted listing's typeahead weight"""
+    before = suggest_terms(suggest_values(instance))
+    ops = suggest.listing_ops(before, [])
+    transaction.on_commit(lambda: suggest.publish(ops))
+
+
+@receiver(post_save, sender=Listing)
+def clear_similar_listings(sender, instance, created, update_fields=None, **kwargs):
+    """Text or category edits make the stored neighbours stale; the next refresh recomputes them"""
+    if created or (update_fields is not None and not set(update_fields) & SIMILAR_SOURCE_FIELDS):
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if (
+        loaded.get('title', instance.title) != instance.title
+        or loaded.get('description', instance.description) != instance.description
+        or loaded.get('category_id', instance.category_id) != instance.category_id
+    ):
+        SimilarListing.objects.filter(listing=instance).delete()
+
+
+@receiver(post_save, sender=Listing)
+def notify_saved_searches(sender, instance, created, **kwargs):
+    """Alert users whose saved searches match a new listing, in the background once it is committed"""
+    if created:
+        background.submit(saved_searches.notify_matches, [instance.pk])
+
+
+@receiver(post_save, sender=Listing)
+def track_price_changes(sender, instance, created, update_fields=None, **kwargs):
+    """Keep price history and alert savers of a price drop"""
+    if created or (update_fields is not None and 'price' not in update_fields):
+        return
+    price_alerts.record_price_change(instance)
+
+
+@receiver(post_save, sender=SavedListing)
+def record_save_for_trending(sender, instance, created, **kwargs):
+    """A save is a strong interest signal"""
+    if created:
+        trending.record({instance.listing_id: trending.SAVE_WEIGHT})
+
+
+@receiver(post_save, sender='chat.Conversation')
+def record_conversation_for_trending(sender, instance, created, **kwargs):
+    """A buyer starting a chat is the strongest interest signal"""
+    if created:
+        trending.record({instance.listing_id: trending.CONVERSATION_WEIGHT})
+
+
+# Seller fields embedded in listing details; feed cards only carry the username
+SELLER_FIELDS = ('username', 'email', 'phone_number', 'location', 'email_verified')
+
+
+@receiver(pre_save, sender=User)
+def note_seller_changes(sender, instance, update_fields=None, **kwargs):
+    """Record which displayed seller fields a save changes (logins and other saves touch none)"""
+    fields = [
+        name for name in SELLER_FIELDS
+        if update_fields is None or name in update_fields
+    ]
+    instance._changed_seller_fields = set()
+    if instance.pk is None or not fields:
+        return
+    stored = User.objects.filter(pk=instance.pk).values(*fields).first()
+    if stored is not None:
+        instance._changed_seller_fields = {
+            name for name in fields if stored[name] != getattr(instance, name)
+        }
+
+
+@receiver(post_save, sender=User)
+def sync_seller_cards(sender, instance, created, **kwargs):
+    """Propagate username changes to the seller's feed cards"""
+    if not created and 'username' in getattr(instance, '_changed_seller_fields', ()):
+        cards.rename_seller(instance)
+
+
+@receiver(post_save, sender=User)
+def bump_seller_cache_stamps(sender, instance, created, **kwargs):
+    """Invalidate cached listing details, and feed pages for a new username, of the seller"""
+    changed = getattr(instance, '_changed_seller_fields', ())
+    if created or not changed:
+        return
+    rows = list(Listing.objects.filter(user=instance).values_list('id', 'category_id'))
+    if not rows:
+        return
+    stamps = [feed_cache.listing_stamp(listing_id) for listing_id, _ in rows]
+    if 'username' in changed:
+        stamps.append(feed_cache.FEED)
+        stamps.extend({feed_cache.category_stamp(category_id) for _, category_id in rows})
+    feed_cache.bump(*stamps)
+
+
+@receiver(post_save, sender=Category)
+def sync_category_cards(sender, instance, created, **kwargs):
+    """Propagate category renames to feed cards"""
+    if not created:
+        cards.rename_category(instance)
+        feed_cache.bump(feed_cache.FEED, feed_cache.category_stamp(instance.pk))
+        ops = [(suggest.CATEGORY, instance.pk, instance.name, 0)]
+        transaction.on_commit(lambda: suggest.publish(ops))
+
+
+@receiver(post_save, sender=ListingImage)
+def set_listing_cover_image(sender, instance, created, **kwargs):
+    """Use the first uploaded image as the listing's cover"""
+    if not created:
+        feed_cache.bump(feed_cache.listing_stamp(instance.listing_id))
+        return
+    renditions.schedule([instance.pk])
+    updated = Listing.objects.filter(
+        pk=instance.listing_id,
+        cover_image=''
+    ).update(cover_image=instance.image.name, cover_thumbnail='')
+    if updated:
+        cards.set_cover_image(instance.listing_id, instance.image.name)
+    bump_image_cache_stamps(instance.listing_id, cover_changed=updated)
+
+
+@receiver(post_delete, sender=ListingImage)
+def replace_listing_cover_image(sender, instance, **kwargs):
+    """Promote the next image when the cover image is deleted"""
+    next_image, next_renditions = ListingImage.objects.filter(
+        listing_id=instance.listing_id
+    ).order_by('uploaded_at', 'id').values_list('image', 'renditions').first() or ('', {})
+    thumbnail = renditions.thumbnail_name(next_renditions)
+    updated = Listing.objects.filter(
+        pk=instance.listing_id,
+        cover_image=instance.image.name
+    ).update(cover_image=next_image, cover_thumbnail=thumbnail)
+    if updated:
+        cards.set_cover_image(instance.listing_id, next_image, thumbnail)
+    bump_image_cache_stamps(instance.listing_id, cover_changed=updated)
+
+
+@receiver(post_delete, sender=ListingImage)
+def tombstone_image_files(sender, instance, **kwargs):
+    """File the deleted image's original and renditions for the blob sweeper"""
+    blob_gc.tombstone(blob_gc.image_names(instance.image.name, instance.renditions))
+    blob_gc.schedule()
+
+
+@receiver(post_delete, sender=UploadIntent)
+def tombstone_unfinished_upload(sender, instance, **kwargs):
+    """Whatever was uploaded for an unfinished intent is an orphan once its signed upload can't land"""
+    if instance.completed_at is None:
+        blob_gc.tombstone([instance.name], due=instance.created_at + blob_gc.GRACE)
+
+
+def bump_image_cache_stamps(listing_id, cover_changed):
+    """Images show on the listing detail; the cover also shows on feed cards"""
+    if not cover_changed:
+        feed_cache.bump(feed_cache.listing_stamp(listing_id))
+        return
+    category_id = Listing.objects.filter(pk=listing_id).values_list('category_id', flat=True).first()
+    feed_cache.bump_listing(listing_id, {category_id})
@@ -0,0 +1,219 @@
+"""
+Precomputed "similar listings" (TF-IDF over title and description).
+
+Listings are only compared within their category. For each category the
+live listings are vectorized into a sparse TF-IDF matrix (sublinear term
+frequency, title words counted TITLE_WEIGHT times, rows L2-normalized), so
+a block of rows times the transposed matrix gives cosine similarities.
+The top TOP_N neighbours of each listing are stored in SimilarListing,
+which makes GET /api/listings/{id}/similar/ a single indexed lookup.
+
+refresh() handles new listings without redoing a category: only their
+rows are multiplied out, and each existing listing among their neighbours
+takes them in when they beat its current weakest neighbour. A periodic
+full rebuild settles what that approximation misses.
+"""
+from collections import Counter, defaultdict
+import math
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from .search import tokenize
+
+TOP_N = 12
+MIN_SCORE = 0.05
+TITLE_WEIGHT = 3
+
+# Rows multiplied per block; bounds the size of the similarity block in memory
+BLOCK_SIZE = 256
+
+# Listing fields the vectors are built from; editing them drops stored neighbours
+SIMILAR_SOURCE_FIELDS = {'title', 'description', 'category'}
+
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or sale sell '
+    'selling the this to with'.split()
+)
+
+
+def document_terms(title, description):
+    """Term counts of one listing, with title words weighted up"""
+    counts = Counter()
+    for weight, text in ((TITLE_WEIGHT, title), (1, description)):
+        for token in tokenize([text or '']):
+            if len(token) > 1 and token not in STOP_WORDS:
+                counts[token] += weight
+    return counts
+
+
+def vectorize(documents):
+    """
+    TF-IDF matrix (CSR, rows L2-normalized) for a list of Counters.
+    Terms found in a single document can't make two listings similar and are dropped.
+    """
+    document_frequency = Counter()
+    for counts in documents:
+        document_frequency.update(counts.keys())
+    vocabulary = {}
+    for term, frequency in document_frequency.items():
+        if frequency > 1:
+            vocabulary[term] = len(vocabulary)
+
+    indptr = [0]
+    indices = []
+    data = []
+    for counts in documents:
+        for term, count in counts.items():
+            column = vocabulary.get(term)
+            if column is not None:
+                indices.append(column)
+                data.append(1.0 + math.log(count))
+        indptr.append(len(indices))
+
+    n_documents = len(documents)
+    matrix = sparse.csr_matrix(
+        (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(n_documents, len(vocabulary))
+    )
+    df = np.bincount(matrix.indices, minlength=len(vocabulary))
+    idf = (np.log((1.0 + n_documents) / (1.0 + df)) + 1.0).astype(np.float32)
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+
+def top_neighbours(matrix, rows, ids, top_n=TOP_N):
+    """
+    {ids[row]: [(neighbour id, score), ...] best first} for the given row numbers,
+    computed BLOCK_SIZE rows at a time.
+    """
+    transposed = matrix.T.tocsc()
+    neighbours = {}
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block_rows = rows[start:start + BLOCK_SIZE]
+        scores = (matrix[block_rows] @ transposed).tocsr()
+        for offset, row in enumerate(block_rows):
+            begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+            columns = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            keep = (columns != row) & (values >= MIN_SCORE)
+            columns, values = columns[keep], values[keep]
+            if len(values) > top_n:
+                best = np.argpartition(-values, top_n)[:top_n]
+                columns, values = columns[best], values[best]
+            order = np.lexsort((columns, -values))
+            neighbours[ids[row]] = [(ids[columns[index]], float(values[index])) for index in order]
+    return neighbours
+
+
+def category_corpus(category_id):
+    """(ids, TF-IDF matrix) of the live listings in a category"""
+    from .models import Listing
+
+    rows = Listing.objects.filter(
+        category_id=category_id, is_active=True, is_sold=False
+    ).order_by('id').values_list('id', 'title', 'description').iterator(chunk_size=2000)
+    ids = []
+    documents = []
+    for listing_id, title, description in rows:
+        ids.append(listing_id)
+        documents.append(document_terms(title, description))
+    return ids, vectorize(documents)
+
+
+def store(neighbours):
+    """Replace the stored neighbours of every listing in `neighbours`"""
+    from .models import SimilarListing
+
+    with transaction.atomic():
+        SimilarListing.objects.filter(listing_id__in=list(neighbours)).delete()
+        SimilarListing.objects.bulk_create(
+            [
+                SimilarListing(listing_id=listing_id, similar_id=similar_id, score=score, rank=rank)
+                for listing_id, entries in neighbours.items()
+                for rank, (similar_id, score) in enumerate(entries)
+            ],
+            batch_size=1000
+        )
+
+
+def rebuild_category(category_id, top_n=TOP_N):
+    """Recompute neighbours for every live listing of a category; returns the listing count"""
+    from .models import SimilarListing
+
+    ids, matrix = category_corpus(category_id)
+    neighbours = top_neighbours(matrix, list(range(len(ids))), ids, top_n) if ids else {}
+    with transaction.atomic():
+        # Drops lists of listings that left the category or are no longer live
+        SimilarListing.objects.filter(listing__category_id=category_id).delete()
+        store(neighbours)
+    return len(ids)
+
+
+def rebuild(category_ids=None, top_n=TOP_N):
+    """Recompute every category (or the given ones); returns the listing count"""
+    from categories.models import Category
+
+    if category_ids is None:
+        category_ids = Category.objects.values_list('id', flat=True)
+    return sum(rebuild_category(category_id, top_n) for category_id in category_ids)
+
+
+def pending_listing_ids():
+    """Live listings with no stored neighbours: new, edited, or with nothing similar yet"""
+    from .models import Listing, SimilarListing
+
+    return Listing.objects.filter(is_active=True, is_sold=False).filter(
+        ~Exists(SimilarListing.objects.filter(listing_id=OuterRef('pk')))
+    ).values_list('id', flat=True)
+
+
+def refresh(listing_ids=None, top_n=TOP_N):
+    """
+    Compute neighbours for the given listings (default: pending_listing_ids())
+    and merge them into the lists of existing listings. Returns the number of
+    listings whose neighbours were written.
+    """
+    from .models import Listing, SimilarListing
+
+    if listing_ids is None:
+        listing_ids = pending_listing_ids()
+    by_category = defaultdict(set)
+    for listing_id, category_id in Listing.objects.filter(
+        pk__in=list(listing_ids), is_active=True, is_sold=False
+    ).values_list('id', 'category_id'):
+        by_category[category_id].add(listing_id)
+
+    written = 0
+    for category_id, targets in by_category.items():
+        ids, matrix = category_corpus(category_id)
+        positions = {listing_id: row for row, listing_id in enumerate(ids)}
+        rows = sorted(positions[listing_id] for listing_id in targets if listing_id in positions)
+        neighbours = top_neighbours(matrix, rows, ids, top_n)
+
+        # Similarity is symmetric: a new listing may now belong in an existing listing's list
+        candidates = defaultdict(list)
+        for listing_id, entries in neighbours.items():
+            for similar_id, score in entries:
+                if similar_id not in targets:
+                    candidates[similar_id].append((listing_id, score))
+        if candidates:
+            current = defaultdict(list)
+            for listing_id, similar_id, score in SimilarListing.objects.filter(
+                listing_id__in=list(candidates)
+            ).order_by('listing_id', 'rank').values_list('listing_id', 'similar_id', 'score'):
+                current[listing_id].append((similar_id, score))
+            for listing_id, additions in candidates.items():
+                entries = current[listing_id]
+                if len(entries) >= top_n and max(score for _, score in additions) <= entries[-1][1]:
+                    continue
+                merged = {similar_id: score for similar_id, score in entries}
+                merged.update(additions)
+                neighbours[listing_id] = sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:top_n]
+
+        store(neighbours)
+        written += len(neighbours)
+    return written
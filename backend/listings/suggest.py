@@ -0,0 +1,255 @@
+"""
+In-memory typeahead index for the search box.
+
+Suggestions are listing titles, category names and locations of live
+(active, unsold) listings, weighted by how many listings carry them.
+Every word position of a suggestion is a key in one sorted list, so
+"13 pr" finds "iPhone 13 Pro"; a lookup is a bisect plus a short scan,
+with results for very common prefixes cached until the entries under
+them change.
+
+Each process keeps its own index. Changes are published as weight deltas
+to a journal in the shared cache (listings.signals does this on commit)
+and every process replays the journal before answering, at most once per
+SYNC_INTERVAL seconds. A publisher takes the entry's number before it
+writes the entry, so an entry that is not there yet is waited for (replay
+stops before it) rather than taken as lost; one still missing after
+PUBLISH_WAIT seconds, or a process that fell behind the journal's
+retention, rebuilds from the database.
+"""
+import heapq
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from django.core.cache import cache
+
+TITLE = 'title'
+CATEGORY = 'category'
+LOCATION = 'location'
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+# Prefix ranges longer than this are ranked once and cached
+SCAN_LIMIT = 200
+
+SYNC_INTERVAL = 1.0
+
+SEQ_KEY = 'listings:suggest:seq'
+OP_KEY = 'listings:suggest:op:{}'
+# Journal entries outlive any reasonable gap between two syncs of a live process
+OP_TIMEOUT = 60 * 60
+
+# An entry is written right after its number is taken; one missing for longer is lost
+PUBLISH_WAIT = 5.0
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize(text):
+    return ' '.join(_WORD_RE.findall((text or '').lower()))
+
+
+def word_keys(normalized):
+    """'iphone 13 pro' -> ['iphone 13 pro', '13 pro', 'pro']"""
+    words = normalized.split(' ')
+    return [' '.join(words[index:]) for index in range(len(words)) if words[index]]
+
+
+def listing_terms(title, location, category_id, category_name, is_active=True, is_sold=False):
+    """Suggestion terms a listing contributes: (kind, ident, text)"""
+    if not is_active or is_sold:
+        return []
+    terms = []
+    if normalize(title):
+        terms.append((TITLE, normalize(title), title.strip()))
+    if normalize(location):
+        terms.append((LOCATION, normalize(location), location.strip()))
+    if category_id is not None:
+        terms.append((CATEGORY, category_id, category_name))
+    return terms
+
+
+class SuggestIndex:
+    """Weighted prefix index over suggestion entries"""
+
+    def __init__(self):
+        self.entries = {}  # (kind, ident) -> [text, weight]
+        self.keys = []  # sorted (key, kind, ident)
+        self.cache = {}  # prefix -> ranked entry ids, for long ranges only
+        self.lock = threading.Lock()
+        self.applied_seq = None
+        self.synced_at = 0.0
+        self.missing = None  # (first unwritten entry number, monotonic time it was first missed)
+
+    def apply(self, kind, ident, text, delta):
+        """Adjust an entry's weight (and text); drops entries that reach zero"""
+        entry_id = (kind, ident)
+        entry = self.entries.get(entry_id)
+        if entry is None:
+            if delta <= 0:
+                return
+            entry = self.entries[entry_id] = [text, 0]
+            self._add_keys(entry_id, text)
+        elif text and text != entry[0]:
+            self._invalidate(entry[0])
+            self._remove_keys(entry_id, entry[0])
+            entry[0] = text
+            self._add_keys(entry_id, text)
+        entry[1] += delta
+        self._invalidate(entry[0])
+        if entry[1] <= 0:
+            self._remove_keys(entry_id, entry[0])
+            del self.entries[entry_id]
+
+    def _add_keys(self, entry_id, text):
+        for key in word_keys(normalize(text)):
+            insort(self.keys, (key, *entry_id))
+
+    def _remove_keys(self, entry_id, text):
+        for key in word_keys(normalize(text)):
+            index = bisect_left(self.keys, (key, *entry_id))
+            if index < len(self.keys) and self.keys[index] == (key, *entry_id):
+                del self.keys[index]
+
+    def _invalidate(self, text):
+        if not self.cache:
+            return
+        for key in word_keys(normalize(text)):
+            for end in range(1, len(key) + 1):
+                self.cache.pop(key[:end], None)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Top `limit` entries whose text has a word starting with `query`"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self.lock:
+            ranked = self.cache.get(prefix)
+            if ranked is None:
+                start = bisect_left(self.keys, (prefix,))
+                end = bisect_left(self.keys, (prefix + '\U0010ffff',))
+                ranked = self._rank(self.keys[start:end], MAX_LIMIT)
+                if end - start > SCAN_LIMIT:
+                    self.cache[prefix] = ranked
+            return [(entry_id, *self.entries[entry_id]) for entry_id in ranked[:limit]]
+
+    def _rank(self, matches, limit):
+        # A match at the start of the text beats one inside it, then heavier entries win
+        best = {}
+        for key, kind, ident in matches:
+            entry_id = (kind, ident)
+            whole = normalize(self.entries[entry_id][0]) == key
+            score = (whole, self.entries[entry_id][1])
+            if best.get(entry_id, (False, 0)) < score:
+                best[entry_id] = score
+        return heapq.nlargest(limit, best, key=lambda entry_id: (best[entry_id], entry_id[0] == CATEGORY))
+
+    def load(self):
+        """Rebuild from the database"""
+        from .models import Listing
+        from categories.models import Category
+
+        seq = current_seq()
+        counts = {}
+        rows = Listing.objects.filter(is_active=True, is_sold=False).values_list(
+            'title', 'location', 'category_id'
+        ).iterator(chunk_size=2000)
+        names = dict(Category.objects.values_list('id', 'name'))
+        for title, location, category_id in rows:
+            for kind, ident, text in listing_terms(title, location, category_id, names.get(category_id)):
+                entry = counts.setdefault((kind, ident), [text, 0])
+                entry[1] += 1
+
+        self.entries = {}
+        self.keys = []
+        self.cache = {}
+        for entry_id, (text, weight) in counts.items():
+            self.entries[entry_id] = [text, weight]
+            self.keys.extend((key, *entry_id) for key in word_keys(normalize(text)))
+        self.keys.sort()
+        self.applied_seq = seq
+        self.synced_at = time.monotonic()
+        self.missing = None
+
+    def sync(self, force=False):
+        """Replay journal entries published since the last sync"""
+        with self.lock:
+            if self.applied_seq is None:
+                self.load()
+                return
+            now = time.monotonic()
+            if not force and now - self.synced_at < SYNC_INTERVAL:
+                return
+            self.synced_at = now
+            seq = current_seq()
+            if seq <= self.applied_seq:
+                return
+            keys = [OP_KEY.format(number) for number in range(self.applied_seq + 1, seq + 1)]
+            found = cache.get_many(keys)
+            for key in keys:
+                if key not in found:
+                    break
+                for op in found[key]:
+                    self.apply(*op)
+                self.applied_seq += 1
+            if self.applied_seq == seq:
+                self.missing = None
+            elif self.missing is None or self.missing[0] != self.applied_seq + 1:
+                self.missing = (self.applied_seq + 1, now)  # Numbered but not written yet
+            elif now - self.missing[1] > PUBLISH_WAIT:
+                # Lost: the publisher died, we fell behind the journal or the cache was flushed
+                self.load()
+
+
+def current_seq():
+    seq = cache.get(SEQ_KEY)
+    if seq is None:
+        cache.add(SEQ_KEY, 0, timeout=None)
+        seq = cache.get(SEQ_KEY) or 0
+    return seq
+
+
+def listing_ops(before, after):
+    """
+    Journal ops turning the terms of `before` into those of `after`; each is
+    a listing_terms() list. Category names are resolved only for additions.
+    """
+    deltas = {}
+    texts = {}
+    for sign, terms in ((-1, before), (1, after)):
+        for kind, ident, text in terms:
+            deltas[(kind, ident)] = deltas.get((kind, ident), 0) + sign
+            if sign > 0:
+                texts[(kind, ident)] = text
+    return [
+        (kind, ident, texts.get((kind, ident)), delta)
+        for (kind, ident), delta in deltas.items() if delta
+    ]
+
+
+def publish(ops):
+    """Append weight deltas [(kind, ident, text, delta), ...] to the journal"""
+    if not ops:
+        return
+    cache.add(SEQ_KEY, 0, timeout=None)
+    seq = cache.incr(SEQ_KEY)
+    cache.set(OP_KEY.format(seq), list(ops), OP_TIMEOUT)
+    if _index is not None:
+        _index.sync(force=True)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_suggest_index():
+    """The process-wide index, synced with the journal"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SuggestIndex()
+    _index.sync()
+    return _index
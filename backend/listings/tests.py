@@ -1,3 +1,2048 @@
-from django.test import TestCase
+import csv
+import json
+import math
+import re
+import struct
+import time
+import zlib
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from urllib.parse import unquote
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from PIL.PngImagePlugin import PngInfo
+from rest_framework.test import APITestCase
+from categories.models import Category
+from chat.models import Conversation, Message
+from chat.projections import ConversationProjection
+from notifications.models import Notification, NotificationPreference
+from olx_backend.projections import ProjectionUnsupported
+from users.models import User
+from . import (
+    blob_gc, cards, counters, direct_uploads, duplicates, expiry, geo, image_validation, price_alerts, renditions,
+    response_cache, saved_searches, similar, suggest, trending, uploads
+)
+from . import cache as feed_cache
+from .models import (
+    Listing, ListingCard, ListingImage, ListingPriceChange, ListingReport, ListingStats, OrphanedBlob,
+    SavedListing, SavedSearch, SimilarListing, UploadIntent
+)
+from .projections import ListingCardProjection, SavedListingProjection
 
-# Create your tests here.
+IN_MEMORY_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ListingCardQueryCountTests(APITestCase):
+    """List endpoints must not issue per-row queries for the cover image"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.buyer = User.objects.create_user(username='buyer', password='password123')
+        cls.category = Category.objects.create(name='Electronics')
+        for i in range(12):
+            listing = Listing.objects.create(
+                user=cls.seller,
+                category=cls.category,
+                title=f'Listing number {i}',
+                description='A listing used in query count tests',
+                price=100 + i,
+                location='Delhi'
+            )
+            for n in range(2):
+                ListingImage.objects.create(
+                    listing=listing,
+                    image=SimpleUploadedFile(f'photo{n}.jpg', b'fake-image', content_type='image/jpeg')
+                )
+            SavedListing.objects.create(user=cls.buyer, listing=listing)
+    
+    def test_cover_image_tracks_first_image(self):
+        listing = Listing.objects.first()
+        images = list(listing.images.all())
+        listing.refresh_from_db()
+        self.assertEqual(listing.cover_image.name, images[0].image.name)
+        
+        images[0].delete()
+        listing.refresh_from_db()
+        self.assertEqual(listing.cover_image.name, images[1].image.name)
+        
+        images[1].delete()
+        listing.refresh_from_db()
+        self.assertFalse(listing.cover_image)
+    
+    def test_listing_feed_query_count_is_fixed(self):
+        for page_size in (2, 5, 12):
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/listings/', {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertTrue(response.data['results'][0]['first_image'].startswith('http://testserver/'))
+    
+    def test_my_listings_query_count_is_fixed(self):
+        self.client.force_authenticate(self.seller)
+        for page_size in (2, 12):
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/listings/my-listings/', {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+    
+    def test_saved_listings_query_count_is_fixed(self):
+        self.client.force_authenticate(self.buyer)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/listings/saved/')
+        self.assertEqual(len(response.data), 12)
+
+
+class QueryPlanAssertionsMixin:
+    """
+    Run requests, EXPLAIN every SELECT they issued and fail on full table scans.
+    
+    SQLite: any "SCAN <table>" step that is not walking an index.
+    PostgreSQL: any "Seq Scan on <table>" with sequential scans disabled, so a
+    tiny test table cannot hide a missing index.
+    """
+    # Tables that grow with traffic; small lookup tables may be scanned
+    hot_tables = (
+        'listings_listing', 'listings_listingcard', 'listings_listingimage',
+        'listings_savedlisting', 'chat_conversation', 'chat_message',
+        'notifications_notification',
+    )
+    
+    def explain(self, sql, allow_sort):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                if not allow_sort:
+                    cursor.execute('SET LOCAL enable_sort = off')
+                cursor.execute('EXPLAIN ' + sql)
+                plan = [row[0] for row in cursor.fetchall()]
+                cursor.execute('RESET enable_seqscan')
+                cursor.execute('RESET enable_sort')
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[3] for row in cursor.fetchall()]
+        return plan
+    
+    def plan_problems(self, plan, allow_sort):
+        problems = []
+        for step in plan:
+            for table in self.hot_tables:
+                if connection.vendor == 'postgresql':
+                    if re.search(rf'Seq Scan on {table}\b', step):
+                        problems.append(step.strip())
+                elif re.fullmatch(rf'SCAN {table}( AS \w+)?', step.strip()):
+                    problems.append(step.strip())
+            if not allow_sort:
+                if connection.vendor == 'postgresql':
+                    if re.search(r'\bSort\b', step) and 'Sort Key' not in step:
+                        problems.append(step.strip())
+                elif 'TEMP B-TREE FOR ORDER BY' in step or 'TEMP B-TREE FOR RIGHT PART OF ORDER BY' in step:
+                    problems.append(step.strip())
+        return problems
+    
+    def assertRequestUsesIndexes(self, url, allow_sort=False, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, url)
+        
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+        self.assertTrue(selects, f'{url} issued no SELECT')
+        for sql in selects:
+            plan = self.explain(sql, allow_sort)
+            problems = self.plan_problems(plan, allow_sort)
+            self.assertFalse(
+                problems,
+                f'{url} {params} is not index-backed: {problems}\nSQL: {sql}\nPlan:\n' + '\n'.join(plan)
+            )
+        return response
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class FeedQueryPlanTests(QueryPlanAssertionsMixin, APITestCase):
+    """Every feed query of the listing, conversation and notification endpoints hits an index"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.buyer = User.objects.create_user(username='buyer', password='password123')
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(4)]
+        cls.listings = [
+            Listing.objects.create(
+                user=cls.seller,
+                category=cls.categories[i % 4],
+                title=f'Seeded listing {i}',
+                description='Seeded for query plan tests',
+                price=10 * i,
+                location=['Delhi', 'Mumbai', 'Pune'][i % 3],
+                is_sold=(i % 5 == 0),
+                is_active=(i % 7 != 0)
+            )
+            for i in range(120)
+        ]
+        for listing in cls.listings[:6]:
+            conversation = Conversation.objects.create(
+                listing=listing,
+                buyer=cls.buyer,
+                seller=cls.seller
+            )
+            Message.objects.create(conversation=conversation, sender=cls.buyer, content='Is this still available')
+        Notification.objects.bulk_create([
+            Notification(recipient=cls.buyer, notification_type='system', title=f'Notice {i}', message='Seeded')
+            for i in range(30)
+        ])
+    
+    def test_listing_feed_uses_indexes(self):
+        category = self.categories[0].id
+        variants = [
+            {},
+            {'is_sold': 'false'},
+            {'is_sold': 'false', 'ordering': 'price'},
+            {'is_sold': 'false', 'ordering': '-price'},
+            {'category': category, 'is_sold': 'false'},
+            {'category': category, 'is_sold': 'false', 'ordering': 'price'},
+            {'location': 'Delhi', 'is_sold': 'false'},
+        ]
+        for params in variants:
+            response = self.assertRequestUsesIndexes('/api/listings/', page_size=5, **params)
+            # The second page is a keyset range scan on the same index
+            self.assertRequestUsesIndexes(response.data['next'])
+    
+    def test_listing_search_uses_indexes(self):
+        # Relevance ordering needs a sort, but never a scan of the feed tables
+        self.assertRequestUsesIndexes('/api/listings/', allow_sort=True, search='seeded')
+    
+    def test_listing_detail_and_my_listings_use_indexes(self):
+        self.assertRequestUsesIndexes(f'/api/listings/{self.listings[1].id}/')
+        self.client.force_authenticate(self.seller)
+        self.assertRequestUsesIndexes('/api/listings/my-listings/', page_size=5)
+    
+    def test_conversation_feed_uses_indexes(self):
+        self.client.force_authenticate(self.buyer)
+        # Conversations are ordered by their latest message, an aggregate
+        self.assertRequestUsesIndexes('/api/chat/conversations/', allow_sort=True)
+    
+    def test_notification_feed_uses_indexes(self):
+        self.client.force_authenticate(self.buyer)
+        response = self.assertRequestUsesIndexes('/api/notifications/notifications/', page_size=5)
+        self.assertRequestUsesIndexes(response.data['next'])
+        self.assertRequestUsesIndexes('/api/notifications/notifications/unread_count/')
+
+
+def create_listing(user, category, **fields):
+    values = {
+        'title': 'Listing for tests',
+        'description': 'A listing created by the test suite',
+        'price': 100,
+        'location': 'Delhi',
+    }
+    values.update(fields)
+    return Listing.objects.create(user=user, category=category, **values)
+
+
+def image_bytes(image_format='JPEG', size=(64, 48), color='red', **options):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+class KeysetPaginationTests(APITestCase):
+    """Cursor pages cover the feed exactly once in both directions and reject forged cursors"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Electronics')
+        # Repeated prices exercise the id tie-breaker
+        for i in range(11):
+            create_listing(cls.seller, cls.category, title=f'Paged listing {i}', price=100 + i % 3)
+    
+    def walk(self, url, params=None, direction='next'):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append([item['id'] for item in response.data['results']])
+            if not response.data[direction]:
+                return pages, response
+            response = self.client.get(response.data[direction])
+    
+    def test_pages_follow_ordering_without_gaps_or_repeats(self):
+        expected = list(Listing.objects.order_by('price', 'id').values_list('id', flat=True))
+        pages, last = self.walk('/api/listings/', {'page_size': 4, 'ordering': 'price'})
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertEqual([listing_id for page in pages for listing_id in page], expected)
+        
+        back, _ = self.walk(last.data['previous'], direction='previous')
+        self.assertEqual(back, pages[-2::-1])
+    
+    def test_cursor_round_trips_its_position(self):
+        response = self.client.get('/api/listings/', {'page_size': 3, 'ordering': 'price'})
+        token = re.search(r'cursor=([^&]+)', response.data['next']).group(1)
+        cursor = json.loads(urlsafe_b64decode(unquote(token)))
+        last = Listing.objects.get(pk=response.data['results'][-1]['id'])
+        self.assertEqual(cursor, {'o': 'price', 'v': str(last.price), 'i': last.pk, 'r': 0})
+    
+    def test_tampered_cursors_are_rejected(self):
+        def cursor(payload):
+            return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+        
+        for token in (
+            'not-a-cursor',
+            cursor({'o': 'price', 'v': '100'}),
+            cursor({'o': 'price', 'v': 'cheap', 'i': 1, 'r': 0}),
+            cursor({'o': 'price', 'v': '100', 'i': 'one', 'r': 0}),
+            # Issued for another ordering
+            cursor({'o': '-created_at', 'v': '2026-01-01T00:00:00+00:00', 'i': 1, 'r': 0}),
+        ):
+            response = self.client.get('/api/listings/', {'ordering': 'price', 'cursor': token})
+            self.assertEqual(response.status_code, 404, token)
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class ListingCardSyncTests(APITestCase):
+    """Feed cards follow their listing, seller and category through saves and deletes"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Electronics')
+    
+    def test_card_follows_listing_changes(self):
+        listing = create_listing(self.seller, self.category, title='Original title', price=500)
+        card = ListingCard.objects.get(listing=listing)
+        self.assertEqual(
+            (card.title, card.price, card.seller_username, card.category_name),
+            ('Original title', 500, 'seller', 'Electronics')
+        )
+        
+        listing.title = 'Renamed title'
+        listing.is_sold = True
+        listing.save()
+        card.refresh_from_db()
+        self.assertEqual((card.title, card.is_sold), ('Renamed title', True))
+        
+        image = ListingImage.objects.create(
+            listing=listing,
+            image=SimpleUploadedFile('cover.jpg', b'fake-image', content_type='image/jpeg')
+        )
+        card.refresh_from_db()
+        self.assertEqual(card.cover_image.name, image.image.name)
+        
+        listing.delete()
+        self.assertFalse(ListingCard.objects.filter(listing_id=card.listing_id).exists())
+    
+    def test_seller_and_category_renames_reach_cards(self):
+        listing = create_listing(self.seller, self.category)
+        self.seller.username = 'renamed-seller'
+        self.seller.save()
+        self.category.name = 'Gadgets'
+        self.category.save()
+        card = ListingCard.objects.get(listing=listing)
+        self.assertEqual((card.seller_username, card.category_name), ('renamed-seller', 'Gadgets'))
+    
+    def test_feed_reads_cards_only(self):
+        listing = create_listing(self.seller, self.category, title='Card backed listing')
+        # A card edited behind the listing's back is what the feed shows
+        ListingCard.objects.filter(listing=listing).update(title='From the card')
+        response = self.client.get('/api/listings/')
+        self.assertEqual(response.data['results'][0]['title'], 'From the card')
+        
+        ListingCard.objects.filter(listing=listing).update(is_active=False)
+        cache.clear()  # Not a tracked change, so the cached page would still be served
+        self.assertEqual(self.client.get('/api/listings/').data['results'], [])
+
+
+class FacetCountTests(APITestCase):
+    """Facet counts cover the whole filtered feed and move with it"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.phones = Category.objects.create(name='Phones')
+        cls.bikes = Category.objects.create(name='Bikes')
+        for category, price, location in (
+            (cls.phones, 999, 'Delhi'),
+            (cls.phones, 1000, 'Delhi'),
+            (cls.phones, 4999, 'Pune'),
+            (cls.bikes, 100000, 'Pune'),
+            (cls.bikes, 20000, 'Delhi'),
+        ):
+            create_listing(cls.seller, category, price=price, location=location)
+        create_listing(cls.seller, cls.bikes, price=50, location='Delhi', is_active=False)
+    
+    def get_facets(self, **params):
+        response = self.client.get('/api/listings/facets/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def test_counts_per_facet(self):
+        facets = self.get_facets()
+        self.assertEqual(facets['total'], 5)
+        self.assertEqual(
+            [(row['name'], row['count']) for row in facets['categories']],
+            [('Phones', 3), ('Bikes', 2)]
+        )
+        self.assertEqual(
+            [(row['location'], row['count']) for row in facets['locations']],
+            [('Delhi', 3), ('Pune', 2)]
+        )
+        # Bucket minimums are inclusive, maximums exclusive
+        self.assertEqual([row['count'] for row in facets['price_ranges']], [1, 2, 0, 1, 1])
+    
+    def test_filters_narrow_every_facet(self):
+        facets = self.get_facets(location='Pune')
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual([row['location'] for row in facets['locations']], ['Pune'])
+        
+        facets = self.get_facets(category=self.phones.pk, min_price=1000)
+        self.assertEqual(facets['total'], 2)
+        self.assertEqual([row['count'] for row in facets['price_ranges']], [0, 2, 0, 0, 0])
+        
+        self.assertEqual(self.get_facets(min_price=200000)['total'], 0)
+    
+    def test_cached_counts_refresh_after_changes(self):
+        self.assertEqual(self.get_facets(location='Pune')['total'], 2)
+        listing = create_listing(self.seller, self.phones, location='Pune')
+        self.assertEqual(self.get_facets(location='Pune')['total'], 3)
+        listing.is_active = False
+        listing.save()
+        self.assertEqual(self.get_facets(location='Pune')['total'], 2)
+
+
+class GeoRadiusTests(APITestCase):
+    """Radius search finds exactly the listings inside the circle, wherever its geohash cells fall"""
+    
+    PUNE = (18.5204, 73.8567)
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Electronics')
+        cls.pune = create_listing(cls.seller, cls.category, location='Koregaon Park, Pune')
+        cls.pimpri = create_listing(cls.seller, cls.category, location='Pimpri Chinchwad')
+        cls.mumbai = create_listing(cls.seller, cls.category, location='Mumbai')
+        cls.unknown = create_listing(cls.seller, cls.category, location='Somewhere unmapped')
+    
+    def near(self, latitude, longitude, radius_km, **params):
+        response = self.client.get('/api/listings/', {
+            'lat': latitude, 'lng': longitude, 'radius_km': radius_km, **params
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+    
+    @staticmethod
+    def offset(point, distance_km, bearing_degrees):
+        bearing = math.radians(bearing_degrees)
+        latitude = point[0] + distance_km / geo.KM_PER_DEGREE * math.cos(bearing)
+        longitude = point[1] + distance_km / (
+            geo.KM_PER_DEGREE * math.cos(math.radians(point[0]))
+        ) * math.sin(bearing)
+        return latitude, longitude
+    
+    def test_locations_are_geocoded_on_save(self):
+        self.assertEqual((self.pune.latitude, self.pune.longitude), self.PUNE)
+        self.assertEqual(self.pune.geohash, geo.encode_geohash(*self.PUNE))
+        self.assertEqual((self.unknown.latitude, self.unknown.geohash), (None, ''))
+        
+        self.unknown.location = 'Mumbai'
+        self.unknown.save()
+        self.assertEqual(ListingCard.objects.get(listing=self.unknown).geohash, self.mumbai.geohash)
+    
+    def test_nearest_first_with_distances(self):
+        results = self.near(*self.PUNE, 50)
+        self.assertEqual([item['id'] for item in results], [self.pune.pk, self.pimpri.pk])
+        self.assertEqual(results[0]['distance_km'], 0)
+        self.assertAlmostEqual(results[1]['distance_km'], 13.0, delta=1)
+        
+        ordered = self.near(*self.PUNE, 200, ordering='-created_at')
+        self.assertEqual([item['id'] for item in ordered], [self.mumbai.pk, self.pimpri.pk, self.pune.pk])
+    
+    def test_circle_edge_in_every_direction(self):
+        # Centres around the listing put it in each neighbouring geohash cell
+        for radius_km in (0.5, 5, 40):
+            for bearing in range(0, 360, 45):
+                inside = self.offset(self.PUNE, radius_km * 0.9, bearing)
+                outside = self.offset(self.PUNE, radius_km * 1.1, bearing)
+                self.assertIn(
+                    self.pune.pk, [item['id'] for item in self.near(*inside, radius_km)],
+                    (radius_km, bearing)
+                )
+                self.assertNotIn(
+                    self.pune.pk, [item['id'] for item in self.near(*outside, radius_km)],
+                    (radius_km, bearing)
+                )
+    
+    def test_invalid_parameters_are_rejected(self):
+        for params in (
+            {'lat': 91, 'lng': 73},
+            {'lat': 18, 'lng': 181},
+            {'lat': 'north', 'lng': 73},
+            {'lat': 18},
+            {'lat': 18, 'lng': 73, 'radius_km': 0},
+            {'lat': 18, 'lng': 73, 'radius_km': geo.MAX_RADIUS_KM + 1},
+        ):
+            self.assertEqual(self.client.get('/api/listings/', params).status_code, 400, params)
+
+
+class SuggestJournalTests(APITestCase):
+    """Every process's typeahead index catches up with listing changes through the shared journal"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        cache.clear()
+        suggest._index = None
+    
+    def create(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_listing(self.seller, self.category, **fields)
+    
+    def texts(self, index, query):
+        return {text: count for _, text, count in index.search(query, suggest.MAX_LIMIT)}
+    
+    def test_word_prefixes_ranked_by_start_then_weight(self):
+        self.create(title='iPhone 13 Pro', location='Pune')
+        self.create(title='iPhone 13 Pro', location='Pune')
+        self.create(title='Pro camera lens', location='Delhi')
+        response = self.client.get('/api/listings/suggest/', {'q': '13 pr'})
+        self.assertEqual(response.data['results'], [{'text': 'iPhone 13 Pro', 'type': 'title', 'count': 2}])
+        
+        results = self.client.get('/api/listings/suggest/', {'q': 'pro'}).data['results']
+        # Starting with the query beats a heavier match inside the text
+        self.assertEqual([result['text'] for result in results], ['Pro camera lens', 'iPhone 13 Pro'])
+    
+    def test_replays_journal_without_reloading(self):
+        listing = self.create(title='Royal Enfield bike', location='Pune')
+        other_process = suggest.SuggestIndex()
+        other_process.sync()
+        self.assertEqual(self.texts(other_process, 'royal'), {'Royal Enfield bike': 1})
+        
+        with mock.patch.object(other_process, 'load', side_effect=AssertionError('reloaded')):
+            self.create(title='Royal Enfield bike', location='Delhi')
+            with self.captureOnCommitCallbacks(execute=True):
+                listing.is_sold = True
+                listing.save()
+            other_process.sync(force=True)
+        self.assertEqual(self.texts(other_process, 'royal'), {'Royal Enfield bike': 1})
+        self.assertEqual(self.texts(other_process, 'pu'), {})
+        self.assertEqual(self.texts(other_process, 'del'), {'Delhi': 1})
+    
+    def test_waits_for_numbered_entry_then_reloads_if_lost(self):
+        index = suggest.SuggestIndex()
+        index.sync()
+        # A publisher between taking a number and writing its entry
+        number = cache.incr(suggest.SEQ_KEY)
+        with mock.patch.object(index, 'load', wraps=index.load) as load:
+            index.sync(force=True)
+            self.assertEqual((index.applied_seq, load.call_count), (number - 1, 0))
+            
+            cache.set(suggest.OP_KEY.format(number), [(suggest.TITLE, 'kindle', 'Kindle', 1)])
+            index.sync(force=True)
+            self.assertEqual((index.applied_seq, load.call_count), (number, 0))
+            self.assertEqual(self.texts(index, 'kin'), {'Kindle': 1})
+            
+            cache.incr(suggest.SEQ_KEY)  # Never written
+            index.sync(force=True)
+            later = index.missing[1] + suggest.PUBLISH_WAIT + 1
+            with mock.patch('listings.suggest.time.monotonic', return_value=later):
+                index.sync(force=True)
+            self.assertEqual(load.call_count, 1)
+        # Rebuilt from the database, which never had the journal-only entry
+        self.assertEqual(self.texts(index, 'kin'), {})
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, BACKGROUND_TASKS_EAGER=True)
+class BulkImportTests(APITestCase):
+    """Imports create the valid rows, report the rest by line, and only take images the user owns"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.other = User.objects.create_user(username='other', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.seller)
+        self.storage = blob_gc.get_storage()
+    
+    def post_rows(self, rows):
+        body = '\n'.join(json.dumps(row) for row in rows)
+        return self.client.generic(
+            'POST', '/api/listings/bulk-import/', body, content_type='application/x-ndjson'
+        )
+    
+    def row(self, **fields):
+        values = {
+            'category': 'phones',
+            'title': 'Pixel 7 for sale',
+            'description': 'Imported by the test suite',
+            'price': '25000',
+            'location': 'Delhi',
+        }
+        values.update(fields)
+        return values
+    
+    def test_invalid_rows_reported_by_line(self):
+        csv_body = (
+            'category,title,description,price,location\n'
+            'Phones,Pixel 7 for sale,Imported by the test suite,25000,Delhi\n'
+            'Cars,Honda City 2015,Imported by the test suite,450000,Pune\n'
+            'phones,Tiny,Imported by the test suite,-5,Delhi\n'
+            'phones,Too,many,cells,here,now\n'
+        )
+        response = self.client.generic('POST', '/api/listings/bulk-import/', csv_body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 3))
+        errors = {error['row']: error['errors'] for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [3, 4, 5])
+        self.assertEqual([str(message) for message in errors[3]['category']], ['Unknown category "Cars".'])
+        self.assertEqual(set(errors[4]), {'title', 'price'})
+        self.assertIn('non_field_errors', errors[5])
+        self.assertEqual(Listing.objects.get(pk=response.data['ids'][0]).category, self.category)
+    
+    def test_nothing_created_is_a_bad_request(self):
+        response = self.post_rows([self.row(price='free'), ['not', 'an', 'object']])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+        self.assertFalse(Listing.objects.exists())
+        
+        response = self.client.generic('POST', '/api/listings/bulk-import/', 'a,b', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+    
+    def test_images_must_belong_to_the_user(self):
+        own = create_listing(self.seller, self.category)
+        own_image = ListingImage.objects.create(
+            listing=own, image='listings/own.jpg', renditions={'thumb': {'name': 'listings/own.thumb.webp'}}
+        )
+        theirs = create_listing(self.other, self.category)
+        ListingImage.objects.create(listing=theirs, image='listings/theirs.jpg')
+        self.storage.save(f'imports/{self.other.pk}/staged.jpg', ContentFile(image_bytes()))
+        
+        response = self.post_rows([
+            self.row(images=['listings/theirs.jpg']),
+            self.row(images=[f'imports/{self.other.pk}/staged.jpg']),
+            self.row(images=[f'imports/{self.seller.pk}/missing.jpg']),
+            self.row(images=['../etc/passwd.jpg']),
+            self.row(images=['listings/own.jpg']),
+        ])
+        errors = {error['row']: str(error['errors']['images'][0]) for error in response.data['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3, 4])
+        self.assertIn('neither on one of your listings', errors[1])
+        self.assertIn(f'imports/{self.seller.pk}/', errors[2])
+        self.assertEqual(errors[4], 'Invalid image name "../etc/passwd.jpg".')
+        
+        listing = Listing.objects.get(pk=response.data['ids'][0])
+        image = listing.images.get()
+        self.assertEqual((image.image.name, image.renditions), (own_image.image.name, own_image.renditions))
+        self.assertEqual(listing.cover_thumbnail, 'listings/own.thumb.webp')
+    
+    def test_staged_files_sanitized_and_copied(self):
+        staging = f'imports/{self.seller.pk}/'
+        self.storage.save(staging + 'photo.png', ContentFile(image_bytes('PNG')))
+        self.storage.save(staging + 'notes.jpg', ContentFile(b'not an image at all'))
+        
+        response = self.post_rows([
+            self.row(images=[staging + 'photo.png']),
+            self.row(images=[staging + 'notes.jpg']),
+        ])
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertIn('images', response.data['errors'][0]['errors'])
+        
+        name = Listing.objects.get(pk=response.data['ids'][0]).images.get().image.name
+        self.assertTrue(name.startswith(f'listings/imports/{self.seller.pk}/'))
+        with self.storage.open(name, 'rb') as copy:
+            self.assertEqual(Image.open(copy).format, 'PNG')
+        # The staged original stays where the user put it
+        self.assertTrue(self.storage.exists(staging + 'photo.png'))
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class CounterFlushTests(APITestCase):
+    """Buffered hits reach ListingStats in batched flushes and survive a failed one"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        self.listing = create_listing(self.seller, self.category)
+        patcher = mock.patch.multiple(counters, _buffer=counters.LocalCounterBuffer(), _last_flush=math.inf)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def stored(self):
+        return ListingStats.objects.filter(listing=self.listing).values_list('view_count', 'impression_count').first()
+    
+    def test_flush_adds_buffered_hits_to_stored_totals(self):
+        counters.record_view(self.listing.pk)
+        counters.record_view(self.listing.pk)
+        counters.record_impressions([self.listing.pk])
+        self.assertIsNone(self.stored())
+        self.assertEqual(
+            counters.get_counts([self.listing.pk])[self.listing.pk],
+            {'view_count': 2, 'impression_count': 1}
+        )
+        
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(self.stored(), (2, 1))
+        counters.record_view(self.listing.pk)
+        counters.flush()
+        self.assertEqual(self.stored(), (3, 1))
+        self.assertEqual(counters.flush(), 0)
+        self.assertEqual(
+            counters.get_counts([self.listing.pk])[self.listing.pk],
+            {'view_count': 3, 'impression_count': 1}
+        )
+    
+    def test_failed_flush_restores_deltas(self):
+        counters.record_view(self.listing.pk)
+        with mock.patch.object(counters, 'write_deltas', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                counters.flush()
+        counters.record_view(self.listing.pk)
+        self.assertEqual(counters.get_counts([self.listing.pk])[self.listing.pk]['view_count'], 2)
+        
+        counters.flush()
+        self.assertEqual(self.stored(), (2, 0))
+    
+    def test_hits_on_deleted_listings_dropped(self):
+        gone = create_listing(self.seller, self.category)
+        counters.record_impressions([self.listing.pk, gone.pk])
+        gone.delete()
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(list(ListingStats.objects.values_list('listing_id', flat=True)), [self.listing.pk])
+    
+    def test_unavailable_buffer_drops_hits(self):
+        with mock.patch.object(counters._buffer, 'incr', side_effect=ConnectionError):
+            with self.assertLogs('listings.counters', 'ERROR'):
+                counters.record_view(self.listing.pk)
+        with mock.patch.object(counters._buffer, 'pending', side_effect=ConnectionError):
+            with self.assertLogs('listings.counters', 'ERROR'):
+                counts = counters.get_counts([self.listing.pk])
+        self.assertEqual(counts[self.listing.pk], {'view_count': 0, 'impression_count': 0})
+    
+    def test_hit_after_interval_flushes_in_background(self):
+        counters._last_flush = -math.inf
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.record_view(self.listing.pk)
+        self.assertEqual(self.stored(), (1, 0))
+        # The interval starts over: the next hit stays buffered
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.record_view(self.listing.pk)
+        self.assertEqual(self.stored(), (1, 0))
+
+
+class TrendingOrderTests(APITestCase):
+    """?ordering=-trending ranks by decayed engagement, newest engagement weighing most"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.buyer = User.objects.create_user(username='buyer', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+    
+    def create(self, title, age):
+        listing = create_listing(self.seller, self.category, title=title)
+        Listing.objects.filter(pk=listing.pk).update(created_at=self.now - age)
+        cards.sync_cards([listing.pk])
+        return listing
+    
+    def trending_titles(self):
+        cache.clear()
+        response = self.client.get('/api/listings/', {'ordering': '-trending'})
+        return [item['title'] for item in response.data['results']]
+    
+    def test_add_scores_is_log_sum_exp(self):
+        self.assertAlmostEqual(trending.add_scores(1.0, 2.0), math.log(math.exp(1.0) + math.exp(2.0)))
+        # Scores a year past EPOCH overflow exp() but not add_scores()
+        self.assertAlmostEqual(trending.add_scores(5000.0, 5000.0), 5000.0 + math.log(2))
+    
+    def test_newer_listings_first_without_engagement(self):
+        self.create('Week old phone', timedelta(days=7))
+        self.create('Fresh phone today', timedelta(hours=1))
+        self.create('Three day old phone', timedelta(days=3))
+        self.assertEqual(self.trending_titles(), ['Fresh phone today', 'Three day old phone', 'Week old phone'])
+    
+    def test_engagement_lifts_older_listings(self):
+        old = self.create('Week old phone', timedelta(days=7))
+        saved = self.create('Three day old phone', timedelta(days=3))
+        self.create('Fresh phone today', timedelta(hours=1))
+        
+        SavedListing.objects.create(user=self.buyer, listing=saved)
+        self.assertEqual(ListingCard.objects.get(listing=saved).trending, ListingStats.objects.get(listing=saved).trending)
+        Conversation.objects.create(listing=old, buyer=self.buyer, seller=self.seller)
+        self.assertEqual(self.trending_titles(), ['Week old phone', 'Three day old phone', 'Fresh phone today'])
+    
+    def test_old_engagement_decays(self):
+        first = self.create('First phone listed', timedelta(days=10))
+        second = self.create('Second phone listed', timedelta(days=10))
+        # Ten views four days ago are worth 2.5 now: less than five today
+        trending.record({first.pk: 10 * trending.VIEW_WEIGHT}, at=self.now - timedelta(days=4))
+        trending.record({second.pk: 5 * trending.VIEW_WEIGHT}, at=self.now)
+        self.assertEqual(self.trending_titles(), ['Second phone listed', 'First phone listed'])
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class SavedSearchMatchTests(APITestCase):
+    """New listings notify the owners of saved searches they satisfy, found through the anchor index"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.buyer = User.objects.create_user(username='buyer', password='password123')
+        cls.other_buyer = User.objects.create_user(username='other_buyer', password='password123')
+        cls.phones = Category.objects.create(name='Phones')
+        cls.cars = Category.objects.create(name='Cars')
+    
+    def save_search(self, user, **fields):
+        return SavedSearch.objects.create(user=user, **fields)
+    
+    def publish(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_listing(self.seller, fields.pop('category', self.phones), **fields)
+    
+    def alerts(self, user):
+        return {
+            notification.metadata['listing_id']: sorted(notification.metadata['saved_search_ids'])
+            for notification in Notification.objects.filter(recipient=user, notification_type='saved_search')
+        }
+    
+    def test_anchor_is_most_selective_predicate(self):
+        self.assertEqual(
+            saved_searches.search_anchor(self.phones.pk, 'New Delhi', 'iphone pro max'),
+            f'{self.phones.pk}/k:iphone'
+        )
+        self.assertEqual(saved_searches.search_anchor(None, 'New Delhi', ''), '*/l:delhi')
+        self.assertEqual(saved_searches.search_anchor(self.cars.pk, '', ''), f'{self.cars.pk}/*')
+        search = self.save_search(self.buyer, keywords='pro iphone')
+        search.keywords = 'honda'
+        search.save(update_fields=['keywords'])
+        self.assertEqual(SavedSearch.objects.get(pk=search.pk).anchor, '*/k:honda')
+    
+    def test_every_predicate_must_match(self):
+        matching = self.save_search(self.buyer, category=self.phones, keywords='iphone pro', max_price=60000)
+        by_location = self.save_search(self.buyer, location='pune')
+        self.save_search(self.buyer, category=self.cars, keywords='iphone')
+        self.save_search(self.buyer, keywords='iphone', min_price=70000)
+        self.save_search(self.buyer, keywords='iphone mini')
+        self.save_search(self.buyer, keywords='iphone', is_active=False)
+        self.save_search(self.seller, keywords='iphone')
+        
+        listing = self.publish(
+            title='iPhone 13 for sale', description='The Pro model, barely used', price=50000, location='Pune'
+        )
+        # One notification per user, naming every search it satisfies
+        self.assertEqual(self.alerts(self.buyer), {listing.pk: sorted([matching.pk, by_location.pk])})
+        self.assertEqual(self.alerts(self.seller), {})
+    
+    def test_only_live_listings_match(self):
+        self.save_search(self.buyer, location='delhi')
+        self.save_search(self.other_buyer, category=self.phones)
+        sold = self.publish(is_sold=True)
+        self.assertEqual((self.alerts(self.buyer), self.alerts(self.other_buyer)), ({}, {}))
+        
+        listing = self.publish(category=self.cars)
+        self.assertEqual(list(self.alerts(self.buyer)), [listing.pk])
+        self.assertEqual(self.alerts(self.other_buyer), {})
+        # Edits never alert again
+        with self.captureOnCommitCallbacks(execute=True):
+            sold.is_sold = False
+            sold.save()
+        self.assertEqual(list(self.alerts(self.buyer)), [listing.pk])
+    
+    @override_settings(BACKGROUND_TASKS_EAGER=False)
+    def test_matching_runs_off_the_create_request(self):
+        self.save_search(self.buyer, keywords='pixel')
+        self.client.force_authenticate(self.seller)
+        with mock.patch('olx_backend.background.get_executor') as get_executor, \
+                mock.patch.object(saved_searches, 'match_listings', wraps=saved_searches.match_listings) as match:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/listings/', {
+                    'category': self.phones.pk,
+                    'title': 'Pixel 7 for sale',
+                    'description': 'Barely used, with the box',
+                    'price': 30000,
+                    'location': 'Delhi',
+                })
+            self.assertEqual(response.status_code, 201)
+            match.assert_not_called()
+            self.assertEqual(self.alerts(self.buyer), {})
+            
+            # The job handed to the pool does the matching
+            job = next(
+                call.args for call in get_executor.return_value.submit.call_args_list
+                if call.args[1] is saved_searches.notify_matches
+            )
+            self.assertEqual(job[2], ([response.data['id']],))
+            job[1](*job[2])
+        match.assert_called_once()
+        self.assertEqual(list(self.alerts(self.buyer)), [response.data['id']])
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class PriceDropAlertTests(APITestCase):
+    """Price edits are recorded; a drop on a live listing alerts everyone who saved it after commit"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+        cls.savers = [
+            User.objects.create_user(username=f'saver{n}', password='password123') for n in range(3)
+        ]
+        NotificationPreference.objects.filter(user=cls.savers[2]).update(enable_in_app=False)
+    
+    def setUp(self):
+        self.listing = create_listing(self.seller, self.category, price=1000)
+        for user in self.savers:
+            SavedListing.objects.create(user=user, listing=self.listing)
+        self.client.force_authenticate(self.seller)
+    
+    def set_price(self, price):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/listings/{self.listing.pk}/', {'price': price})
+        self.assertEqual(response.status_code, 200)
+    
+    def alerts(self):
+        return Notification.objects.filter(notification_type='price_drop')
+    
+    def test_drop_fans_out_to_savers(self):
+        self.set_price('750.00')
+        # Muted users are skipped
+        self.assertEqual(
+            sorted(self.alerts().values_list('recipient__username', flat=True)), ['saver0', 'saver1']
+        )
+        self.assertEqual(
+            self.alerts().first().metadata,
+            {'listing_id': self.listing.pk, 'old_price': '1000.00', 'new_price': '750.00'}
+        )
+        self.assertEqual(
+            list(ListingPriceChange.objects.values_list('old_price', 'new_price')),
+            [(Decimal('1000.00'), Decimal('750.00'))]
+        )
+    
+    def test_raise_and_unchanged_price_do_not_alert(self):
+        self.set_price('1000')
+        self.assertFalse(ListingPriceChange.objects.exists())
+        self.set_price('1200')
+        self.assertEqual(ListingPriceChange.objects.count(), 1)
+        self.assertFalse(self.alerts().exists())
+    
+    def test_no_alert_for_sold_listings(self):
+        Listing.objects.filter(pk=self.listing.pk).update(is_sold=True)
+        self.set_price('500')
+        self.assertEqual(ListingPriceChange.objects.count(), 1)
+        self.assertFalse(self.alerts().exists())
+    
+    def test_alerts_wait_for_commit(self):
+        with mock.patch.object(price_alerts, 'notify_price_drop') as notify:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.patch(f'/api/listings/{self.listing.pk}/', {'price': '900'})
+            notify.assert_not_called()
+            for callback in callbacks:
+                callback()
+        notify.assert_called_once_with(self.listing.pk, self.listing.title, Decimal('1000.00'), Decimal('900.00'))
+
+
+@override_settings(
+    LISTING_LIFETIME_DAYS=30,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class ListingExpiryTests(APITestCase):
+    """Listings past their lifetime are deactivated oldest first, in chunks, with cards and feeds kept in step"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.phones = Category.objects.create(name='Phones')
+        cls.jobs = Category.objects.create(name='Jobs', listing_lifetime_days=7)
+    
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+    
+    def create(self, age_days, category=None, **fields):
+        listing = create_listing(self.seller, category or self.phones, **fields)
+        Listing.objects.filter(pk=listing.pk).update(created_at=self.now - timedelta(days=age_days))
+        return listing
+    
+    def active_ids(self):
+        return set(Listing.objects.filter(is_active=True).values_list('pk', flat=True))
+    
+    def test_expires_in_chunks_oldest_first(self):
+        old = [self.create(age) for age in (40, 35, 50, 31, 45)]
+        fresh = self.create(20)
+        sold = self.create(90, is_sold=True)
+        self.assertEqual(expiry.pending_count(self.now), 5)
+        
+        with mock.patch.object(expiry, 'expire_chunk', wraps=expiry.expire_chunk) as expire_chunk:
+            self.assertEqual(expiry.expire(self.now, chunk_size=2, limit=3), 3)
+        self.assertEqual(expire_chunk.call_count, 2)
+        self.assertEqual(self.active_ids(), {old[1].pk, old[3].pk, fresh.pk, sold.pk})
+        
+        self.assertEqual(expiry.expire(self.now, chunk_size=2), 2)
+        # Sold listings stay as they are
+        self.assertEqual(self.active_ids(), {fresh.pk, sold.pk})
+        self.assertEqual(expiry.pending_count(self.now), 0)
+        expired = Listing.objects.get(pk=old[0].pk)
+        self.assertEqual((expired.deactivation_reason, expired.deactivated_at), (expiry.EXPIRY_REASON, self.now))
+    
+    def test_category_lifetime_overrides_default(self):
+        job = self.create(10, self.jobs)
+        recent_job = self.create(5, self.jobs)
+        phone = self.create(10)
+        self.assertEqual(expiry.expire(self.now), 1)
+        self.assertEqual(self.active_ids(), {recent_job.pk, phone.pk})
+        self.assertFalse(Listing.objects.get(pk=job.pk).is_active)
+    
+    def test_cards_feed_and_sellers_updated(self):
+        listing = self.create(40, title='Old phone for sale')
+        self.assertEqual(len(self.client.get('/api/listings/').data['results']), 1)
+        
+        expiry.expire(self.now)
+        self.assertFalse(ListingCard.objects.get(listing=listing).is_active)
+        # The stamp bump retires the cached feed page
+        self.assertEqual(self.client.get('/api/listings/').data['results'], [])
+        notification = Notification.objects.get(recipient=self.seller, notification_type='listing_expired')
+        self.assertEqual(notification.metadata, {'listing_id': listing.pk})
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, BACKGROUND_TASKS_EAGER=True)
+class RenditionTests(APITestCase):
+    """Committed images get bounded renditions next to the original, and covers publish their thumbnail"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        cache.clear()
+        self.listing = create_listing(self.seller, self.category)
+        self.storage = blob_gc.get_storage()
+    
+    def add_image(self, data, name='photo.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ListingImage.objects.create(listing=self.listing, image=SimpleUploadedFile(name, data))
+        image.refresh_from_db()
+        return image
+    
+    def stored_size(self, name):
+        with self.storage.open(name, 'rb') as file, Image.open(file) as image:
+            return image.format, image.size
+    
+    def test_large_image_gets_every_rendition(self):
+        image = self.add_image(image_bytes(size=(1600, 1200)))
+        root = image.image.name.rsplit('.', 1)[0]
+        self.assertEqual(image.renditions['original'], {'width': 1600, 'height': 1200})
+        self.assertEqual(image.renditions['thumb']['name'], f'{root}.thumb.webp')
+        self.assertEqual(self.stored_size(image.renditions['thumb']['name']), ('WEBP', (320, 240)))
+        self.assertEqual(self.stored_size(image.renditions['medium']['name']), ('WEBP', (960, 720)))
+        self.assertIsNotNone(image.dhash)
+        
+        # The cover's thumbnail reaches the listing, its card and the feed
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.cover_thumbnail, image.renditions['thumb']['name'])
+        self.assertEqual(ListingCard.objects.get(listing=self.listing).cover_thumbnail, self.listing.cover_thumbnail)
+        srcset = self.client.get(f'/api/listings/{self.listing.pk}/').data['images'][0]['srcset']
+        self.assertEqual([entry.rsplit(' ', 1)[1] for entry in srcset.split(', ')], ['320w', '960w', '1600w'])
+    
+    def test_small_image_never_upscaled(self):
+        image = self.add_image(image_bytes('PNG', size=(200, 100)), 'small.png')
+        self.assertEqual(set(image.renditions), {'original', 'thumb'})
+        self.assertEqual(self.stored_size(image.renditions['thumb']['name']), ('WEBP', (200, 100)))
+    
+    def test_exif_orientation_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise
+        image = self.add_image(image_bytes(size=(400, 300), exif=exif.tobytes()))
+        self.assertEqual(image.renditions['original'], {'width': 300, 'height': 400})
+        self.assertEqual(self.stored_size(image.renditions['thumb']['name'])[1], (240, 320))
+    
+    def test_image_deleted_while_rendering(self):
+        render = renditions.render
+        
+        def render_then_delete(storage, name):
+            result = render(storage, name)
+            ListingImage.objects.filter(image=name).delete()
+            return result
+        
+        with mock.patch.object(renditions, 'render', side_effect=render_then_delete):
+            with self.captureOnCommitCallbacks(execute=True):
+                image = ListingImage.objects.create(
+                    listing=self.listing, image=SimpleUploadedFile('photo.jpg', image_bytes(size=(1600, 1200)))
+                )
+        # The renditions it could not record are swept with the original
+        root = image.image.name.rsplit('.', 1)[0]
+        for name in (image.image.name, f'{root}.thumb.webp', f'{root}.medium.webp'):
+            self.assertFalse(self.storage.exists(name), name)
+        self.assertFalse(OrphanedBlob.objects.exists())
+
+
+class FailingStorage(InMemoryStorage):
+    """In-memory storage refusing names that contain 'broken'"""
+    
+    def _save(self, name, content):
+        if 'broken' in name:
+            raise OSError(f'Could not store {name}')
+        return super()._save(name, content)
+    
+    def stored_names(self):
+        return self.listdir('uploads')[1]
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES, BACKGROUND_TASKS_EAGER=True)
+class ImageUploadRollbackTests(APITestCase):
+    """A failed upload or row insert leaves neither files nor rows behind"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        self.storage = FailingStorage()
+        self.listing = create_listing(self.seller, self.category)
+    
+    def files(self, *names):
+        return [(f'uploads/{name}', ContentFile(b'image data')) for name in names]
+    
+    def test_concurrent_failure_deletes_stored_files(self):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            with self.assertRaisesMessage(OSError, 'uploads/broken.jpg'):
+                uploads.store_files(self.storage, self.files('a.jpg', 'broken.jpg', 'c.jpg'), executor=executor)
+        self.assertEqual(self.storage.stored_names(), [])
+        
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            names = uploads.store_files(self.storage, self.files('a.jpg', 'b.jpg', 'c.jpg'), executor=executor)
+        self.assertEqual(names, ['uploads/a.jpg', 'uploads/b.jpg', 'uploads/c.jpg'])
+    
+    def test_inline_failure_deletes_stored_files(self):
+        with self.assertRaises(OSError):
+            uploads.store_files(self.storage, self.files('a.jpg', 'b.jpg', 'broken.jpg'), concurrent=False)
+        self.assertEqual(self.storage.stored_names(), [])
+    
+    def test_rows_follow_upload_order(self):
+        files = [SimpleUploadedFile(f'photo{n}.jpg', image_bytes()) for n in range(3)]
+        images = uploads.save_images(self.listing, files)
+        self.assertEqual(
+            [image.image.name.rsplit('/', 1)[1] for image in images], ['photo0.jpg', 'photo1.jpg', 'photo2.jpg']
+        )
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.cover_image, images[0].image.name)
+    
+    def test_failed_insert_deletes_every_stored_file(self):
+        storage = blob_gc.get_storage()
+        create = ListingImage.objects.create
+        calls = []
+        
+        def fail_on_second(**fields):
+            calls.append(fields['image'])
+            if len(calls) == 2:
+                raise DatabaseError('insert failed')
+            return create(**fields)
+        
+        files = [SimpleUploadedFile(f'photo{n}.jpg', image_bytes()) for n in range(3)]
+        with mock.patch.object(ListingImage.objects, 'create', side_effect=fail_on_second):
+            with self.assertRaises(DatabaseError):
+                uploads.save_images(self.listing, files)
+        self.assertFalse(self.listing.images.exists())
+        self.assertEqual(len(calls), 2)
+        for name in calls + [f'listings/{self.listing.pk}/photo2.jpg']:
+            self.assertFalse(storage.exists(name), name)
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES,
+    BACKGROUND_TASKS_EAGER=True,
+    DIRECT_UPLOAD_BACKEND='listings.direct_uploads.LocalUploadBackend'
+)
+class DirectUploadTests(APITestCase):
+    """Intents hand out signed targets; finalizing attaches a sanitized copy and closes the target"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        cache.clear()
+        direct_uploads._backend = None
+        self.addCleanup(setattr, direct_uploads, '_backend', None)
+        self.listing = create_listing(self.seller, self.category)
+        self.storage = blob_gc.get_storage()
+        self.client.force_authenticate(self.seller)
+    
+    def create_intent(self, content_type='image/jpeg'):
+        response = self.client.post(
+            f'/api/listings/{self.listing.pk}/upload-intents/', {'content_type': content_type}
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data
+    
+    def upload(self, target, data):
+        return self.client.put(target['url'], data, content_type=target['headers']['Content-Type'])
+    
+    def finalize(self, target):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/listings/{self.listing.pk}/images/', {'intent': target['intent']})
+    
+    def test_finalize_attaches_sanitized_copy(self):
+        target = self.create_intent()
+        intent = UploadIntent.objects.get(pk=target['intent'])
+        self.assertEqual(self.upload(target, image_bytes(size=(400, 300))).status_code, 204)
+        self.assertTrue(self.storage.exists(intent.name))
+        
+        response = self.finalize(target)
+        self.assertEqual(response.status_code, 201)
+        image = ListingImage.objects.get(pk=response.data['id'])
+        self.assertRegex(image.image.name, rf'^listings/{self.listing.pk}/[0-9a-f]{{32}}\.jpg$')
+        self.assertEqual(image.renditions['original'], {'width': 400, 'height': 300})
+        intent.refresh_from_db()
+        self.assertIsNotNone(intent.completed_at)
+        # The raw upload is swept; the target and the intent are spent
+        self.assertFalse(self.storage.exists(intent.name))
+        self.assertEqual(self.upload(target, image_bytes()).status_code, 403)
+        self.assertEqual(self.finalize(target).status_code, 400)
+    
+    def test_failed_finalize_can_be_retried(self):
+        target = self.create_intent()
+        response = self.finalize(target)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Nothing has been uploaded for this upload yet')
+        self.assertIsNone(UploadIntent.objects.get(pk=target['intent']).finalizing_at)
+        
+        self.assertEqual(self.upload(target, b'not an image').status_code, 204)
+        self.assertEqual(self.finalize(target).status_code, 400)
+        self.assertFalse(self.storage.exists(UploadIntent.objects.get(pk=target['intent']).name))
+        
+        self.assertEqual(self.upload(target, image_bytes()).status_code, 204)
+        self.assertEqual(self.finalize(target).status_code, 201)
+    
+    def test_no_upload_while_finalizing(self):
+        target = self.create_intent()
+        self.upload(target, image_bytes())
+        UploadIntent.objects.filter(pk=target['intent']).update(finalizing_at=timezone.now())
+        self.assertEqual(self.upload(target, image_bytes(color='blue')).status_code, 403)
+        response = self.finalize(target)
+        self.assertEqual(response.data['error'], 'This upload is already being finalized')
+    
+    def test_limits(self):
+        target = self.create_intent()
+        response = self.client.put(
+            target['url'], b'x' * (direct_uploads.MAX_SIZE + 1), content_type='image/jpeg'
+        )
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(self.storage.exists(UploadIntent.objects.get(pk=target['intent']).name))
+        
+        response = self.client.post(f'/api/listings/{self.listing.pk}/upload-intents/', {'content_type': 'text/html'})
+        self.assertEqual(response.status_code, 400)
+        for _ in range(direct_uploads.MAX_IMAGES - 1):
+            self.create_intent()
+        response = self.client.post(f'/api/listings/{self.listing.pk}/upload-intents/', {'content_type': 'image/png'})
+        self.assertEqual(response.data['error'], f'Maximum {direct_uploads.MAX_IMAGES} images allowed per listing')
+    
+    def test_expired_intents(self):
+        target = self.create_intent()
+        self.upload(target, image_bytes())
+        intent = UploadIntent.objects.get(pk=target['intent'])
+        UploadIntent.objects.filter(pk=intent.pk).update(expires_at=timezone.now())
+        self.assertEqual(self.upload(target, image_bytes()).status_code, 403)
+        self.assertEqual(self.finalize(target).data['error'], 'Upload expired; request a new upload target')
+        
+        # Unfinished intents are dropped GRACE after expiry and their upload tombstoned
+        self.assertEqual(blob_gc.expire_intents(timezone.now()), 0)
+        later = timezone.now() + blob_gc.GRACE + timedelta(minutes=1)
+        self.assertEqual(blob_gc.expire_intents(later), 1)
+        self.assertFalse(UploadIntent.objects.exists())
+        self.assertEqual(OrphanedBlob.objects.get().name, intent.name)
+
+
+class ImageSanitizerTests(APITestCase):
+    """sanitize() keeps the pixels of every supported format and drops everything else"""
+    
+    def setUp(self):
+        self.picture = Image.effect_noise((120, 80), 40).convert('RGB')
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        exif[0x0112] = 6
+        self.exif = exif.tobytes()
+    
+    def encode(self, image_format, image=None, **options):
+        buffer = BytesIO()
+        (image or self.picture).save(buffer, image_format, **options)
+        return buffer.getvalue()
+    
+    def sanitize(self, data, name='upload.bin', **kwargs):
+        cleaned = image_validation.sanitize(SimpleUploadedFile(name, data), **kwargs)
+        self.addCleanup(cleaned.close)
+        return cleaned
+    
+    def assert_same_pixels(self, original, cleaned):
+        with Image.open(BytesIO(original)) as before, Image.open(cleaned) as after:
+            self.assertEqual(before.format, after.format)
+            self.assertEqual(before.tobytes(), after.tobytes())
+            return after.getexif(), after.info
+    
+    def test_jpeg_keeps_only_orientation(self):
+        original = self.encode('JPEG', exif=self.exif, comment=b'shot at home')
+        cleaned = self.sanitize(original + b'trailing motion-photo video', 'photo.jpeg')
+        data = cleaned.read()
+        cleaned.seek(0)
+        self.assertEqual((cleaned.name, cleaned.content_type), ('photo.jpg', 'image/jpeg'))
+        self.assertEqual((cleaned.width, cleaned.height), (120, 80))
+        self.assertTrue(data.endswith(b'\xff\xd9'))
+        self.assertNotIn(b'Camera maker', data)
+        exif, info = self.assert_same_pixels(original, cleaned)
+        self.assertEqual(dict(exif), {0x0112: 6})
+        self.assertNotIn('comment', info)
+    
+    def test_png_drops_text_and_exif(self):
+        text = PngInfo()
+        text.add_text('Comment', 'shot at home')
+        original = self.encode('PNG', pnginfo=text, exif=self.exif)
+        # Sniffed from the bytes, not the name
+        cleaned = self.sanitize(original, 'photo.jpg')
+        self.assertEqual((cleaned.name, cleaned.image_format), ('photo.png', 'PNG'))
+        self.assertNotIn(b'shot at home', cleaned.read())
+        cleaned.seek(0)
+        exif, info = self.assert_same_pixels(original, cleaned)
+        self.assertEqual(dict(exif), {})
+        self.assertNotIn('Comment', info)
+    
+    def test_gif_drops_comments(self):
+        original = self.encode('GIF', self.picture.convert('P'), comment=b'shot at home')
+        cleaned = self.sanitize(original)
+        self.assertNotIn(b'shot at home', cleaned.read())
+        cleaned.seek(0)
+        self.assert_same_pixels(original, cleaned)
+    
+    def test_webp_keeps_only_orientation(self):
+        original = self.encode('WEBP', lossless=True, exif=self.exif)
+        cleaned = self.sanitize(original)
+        self.assertEqual((cleaned.image_format, cleaned.width, cleaned.height), ('WEBP', 120, 80))
+        self.assertNotIn(b'Camera maker', cleaned.read())
+        cleaned.seek(0)
+        exif, _ = self.assert_same_pixels(original, cleaned)
+        self.assertEqual(dict(exif), {0x0112: 6})
+    
+    def test_rejects_bombs_from_the_header(self):
+        header = struct.pack('>II5B', 20000, 20000, 8, 2, 0, 0, 0)
+        chunk = struct.pack('>I', len(header)) + b'IHDR' + header
+        bomb = b'\x89PNG\r\n\x1a\n' + chunk + struct.pack('>I', zlib.crc32(chunk[4:]))
+        with self.assertRaisesMessage(image_validation.InvalidImage, 'Image dimensions cannot exceed'):
+            self.sanitize(bomb)
+    
+    def test_rejects_broken_files(self):
+        jpeg = self.encode('JPEG')
+        png = bytearray(self.encode('PNG'))
+        png[40] ^= 0xFF  # Inside the first IDAT: the CRC no longer matches
+        for data, message in (
+            (b'<html>not an image</html>', image_validation.UNSUPPORTED),
+            (jpeg[:len(jpeg) // 2], image_validation.CORRUPT),
+            (bytes(png), image_validation.CORRUPT),
+        ):
+            with self.subTest(message=message), self.assertRaisesMessage(image_validation.InvalidImage, message):
+                self.sanitize(data)
+        with self.assertRaisesMessage(image_validation.InvalidImage, image_validation.TOO_LARGE):
+            self.sanitize(jpeg, max_size=len(jpeg) - 1)
+
+
+def flip_bits(value, *band_bit_counts):
+    """`value` with the lowest n bits of each band flipped, n given per band (most significant first)"""
+    for band, count in enumerate(band_bit_counts):
+        shift = duplicates.BAND_BITS * (duplicates.BANDS - 1 - band)
+        value ^= ((1 << count) - 1) << shift
+    return value
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class DuplicateHashLookupTests(APITestCase):
+    """Band lookups find every stored hash within the distance and nothing further"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        self.listing = create_listing(self.seller, self.category)
+        self.base = 0xF0E1D2C3B4A59687  # Top bit set: stored negative
+    
+    def store(self, value, listing=None):
+        return ListingImage.objects.create(
+            listing=listing or self.listing, image='listings/photo.jpg', **duplicates.hash_fields(value)
+        )
+    
+    def test_hash_fields_round_trip(self):
+        fields = duplicates.hash_fields(self.base)
+        self.assertLess(fields['dhash'], 0)
+        self.assertEqual(duplicates.to_unsigned(fields['dhash']), self.base)
+        for band in range(duplicates.BANDS):
+            self.assertTrue(-2 ** 15 <= fields[f'dhash_{band}'] < 2 ** 15)
+        self.assertEqual(
+            [fields[f'dhash_{band}'] + 2 ** 15 for band in range(duplicates.BANDS)], duplicates.bands(self.base)
+        )
+    
+    def test_finds_hashes_within_distance(self):
+        exact = self.store(self.base)
+        spread = self.store(flip_bits(self.base, 2, 2, 2, 0))
+        one_per_band = self.store(flip_bits(self.base, 2, 2, 2, 1))
+        self.store(flip_bits(self.base, 2, 2, 2, 2))
+        self.store(flip_bits(self.base, 0, 0, 0, 16))
+        
+        with self.assertNumQueries(1):
+            found = duplicates.near_images([self.base])
+        self.assertEqual([(image_id, gap) for _, image_id, _, gap in found], [(exact.pk, 0), (spread.pk, 6)])
+        found = duplicates.near_images([self.base], max_distance=duplicates.MAX_SEARCH_DISTANCE)
+        self.assertEqual([image_id for _, image_id, _, _ in found], [exact.pk, spread.pk, one_per_band.pk])
+        self.assertEqual(duplicates.near_images([]), [])
+    
+    def test_duplicate_listings_groups_other_listings(self):
+        own = self.store(self.base)
+        own_edit = self.store(flip_bits(self.base, 1))
+        other = create_listing(self.seller, self.category)
+        match = self.store(flip_bits(self.base, 0, 3), other)
+        self.store(flip_bits(self.base, 0, 0, 0, 9), create_listing(self.seller, self.category))
+        # Both photos of the listing match; its own images never count
+        self.assertEqual(
+            duplicates.duplicate_listings(self.listing), {other.pk: [(own.pk, match.pk, 3), (own_edit.pk, match.pk, 4)]}
+        )
+    
+    def test_upload_rejects_photo_of_another_live_listing(self):
+        photo = BytesIO()
+        Image.linear_gradient('L').convert('RGB').save(photo, 'JPEG')
+        self.store(duplicates.hash_file(BytesIO(photo.getvalue())))
+        
+        self.client.force_authenticate(self.seller)
+        response = self.client.post('/api/listings/', {
+            'category': self.category.pk,
+            'title': 'Same phone again',
+            'description': 'Listed a second time',
+            'price': 100,
+            'location': 'Delhi',
+            'check_duplicates': True,
+            'uploaded_images': [SimpleUploadedFile('again.jpg', photo.getvalue(), content_type='image/jpeg')],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data['uploaded_images'], [f'Photo 1 is nearly identical to a photo of listing {self.listing.pk}']
+        )
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class BlobSweepTests(APITestCase):
+    """The sweeper deletes orphaned files, skips names in use again and backs off on failures"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        self.storage = blob_gc.get_storage()
+        # The in-memory storage outlives each test; start from an empty tree
+        for names in blob_gc.walk(self.storage, blob_gc.ROOT):
+            for name in names:
+                self.storage.delete(name)
+        self.listing = create_listing(self.seller, self.category)
+        self.now = timezone.now()
+    
+    def save(self, name):
+        return self.storage.save(name, ContentFile(b'image data'))
+    
+    def test_names_in_use_are_skipped(self):
+        original = self.save('listings/1/photo.jpg')
+        thumb = self.save('listings/1/photo.thumb.webp')
+        ListingImage.objects.create(
+            listing=self.listing, image=original, renditions={'thumb': {'name': thumb, 'width': 320, 'height': 240}}
+        )
+        pending = self.save('listings/1/uploads/pending.jpg')
+        UploadIntent.objects.create(
+            user=self.seller, listing=self.listing, name=pending, content_type='image/jpeg',
+            expires_at=self.now + direct_uploads.INTENT_TTL
+        )
+        orphans = [self.save('listings/1/old.jpg'), self.save('listings/1/old.medium.webp')]
+        unrecorded = self.save('listings/1/photo.medium.webp')  # Never written to the image's renditions
+        blob_gc.tombstone([original, thumb, pending, unrecorded, *orphans], self.now)
+        
+        self.assertEqual(blob_gc.in_use([original, thumb, pending, unrecorded, *orphans]), {original, thumb, pending})
+        totals = blob_gc.sweep(now=self.now)
+        self.assertEqual((totals['deleted'], totals['skipped'], totals['failed']), (3, 3, 0))
+        self.assertFalse(OrphanedBlob.objects.exists())
+        for name in (original, thumb, pending):
+            self.assertTrue(self.storage.exists(name), name)
+        for name in (unrecorded, *orphans):
+            self.assertFalse(self.storage.exists(name), name)
+    
+    def test_failed_deletes_back_off(self):
+        stuck = self.save('listings/1/stuck.jpg')
+        blob_gc.tombstone([stuck], self.now)
+        delete = InMemoryStorage.delete
+        
+        def refuse_stuck(storage, name):
+            if 'stuck' in name:
+                raise OSError('permission denied')
+            return delete(storage, name)
+        
+        with mock.patch.object(InMemoryStorage, 'delete', refuse_stuck):
+            self.assertEqual(blob_gc.sweep(now=self.now)['failed'], 1)
+            tombstone = OrphanedBlob.objects.get()
+            self.assertEqual(tombstone.attempts, 1)
+            self.assertEqual(tombstone.next_attempt_at, self.now + blob_gc.RETRY_DELAY)
+            self.assertEqual(tombstone.last_error, 'OSError: permission denied')
+            # Not due again until the delay is up, which doubles each time
+            self.assertEqual(blob_gc.sweep(now=self.now)['failed'], 0)
+            later = self.now + blob_gc.RETRY_DELAY
+            blob_gc.sweep(now=later)
+            self.assertEqual(OrphanedBlob.objects.get().next_attempt_at, later + blob_gc.RETRY_DELAY * 2)
+            
+            OrphanedBlob.objects.update(attempts=blob_gc.MAX_ATTEMPTS, next_attempt_at=self.now)
+            self.assertEqual(blob_gc.due_count(self.now), 0)
+        OrphanedBlob.objects.update(attempts=0)
+        self.assertEqual(blob_gc.sweep(now=self.now)['deleted'], 1)
+        self.assertFalse(self.storage.exists(stuck))
+    
+    def test_claimed_batches_are_leased(self):
+        names = [self.save(f'listings/1/orphan{n}.jpg') for n in range(3)]
+        blob_gc.tombstone(names, self.now)
+        rows = blob_gc.claim(self.now, batch_size=2)
+        self.assertEqual([name for _, name, _ in rows], names[:2])
+        # Another sweeper only gets what is left; a crashed one's batch comes back after the lease
+        self.assertEqual([name for _, name, _ in blob_gc.claim(self.now)], names[2:])
+        self.assertEqual(blob_gc.claim(self.now), [])
+        self.assertEqual(len(blob_gc.claim(self.now + blob_gc.LEASE)), 3)
+    
+    def test_reconcile_tombstones_unreferenced_files(self):
+        used = self.save('listings/1/photo.jpg')
+        ListingImage.objects.create(listing=self.listing, image=used)
+        stray = self.save('listings/2/stray.jpg')
+        filed = self.save('listings/2/filed.jpg')
+        blob_gc.tombstone([filed], self.now)
+        
+        self.assertEqual(blob_gc.reconcile(dry_run=True, now=self.now), (3, 1))
+        self.assertEqual(OrphanedBlob.objects.count(), 1)
+        self.assertEqual(blob_gc.reconcile(now=self.now), (3, 1))
+        self.assertEqual(OrphanedBlob.objects.get(name=stray).next_attempt_at, self.now + blob_gc.GRACE)
+        # Due only after the grace period
+        blob_gc.sweep(now=self.now)
+        self.assertTrue(self.storage.exists(stray))
+        blob_gc.sweep(now=self.now + blob_gc.GRACE)
+        self.assertFalse(self.storage.exists(stray))
+        self.assertTrue(self.storage.exists(used))
+
+
+class ConditionalReadTests(APITestCase):
+    """Anonymous reads revalidate with ETag or Last-Modified until a listing is saved"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+    
+    def setUp(self):
+        cache.clear()
+        self.listing = create_listing(self.seller, self.category, title='Pixel 7 for sale')
+        self.age_stamps()
+    
+    def age_stamps(self):
+        """Move the stamps a minute back, as if the last change were not this second"""
+        names = [feed_cache.FEED, feed_cache.listing_stamp(self.listing.pk)]
+        cache.set_many(
+            {feed_cache.STAMP_PREFIX + name: time.time() - 60 for name in names}, timeout=None
+        )
+    
+    def test_not_modified_until_listing_saved(self):
+        for url in ('/api/listings/', f'/api/listings/{self.listing.pk}/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Cache-Control'], 'public, no-cache')
+                etag, last_modified = response['ETag'], response['Last-Modified']
+                
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+                
+                self.listing.title = f'Pixel 7 for sale {url}'
+                self.listing.save()
+                for headers in ({'HTTP_IF_NONE_MATCH': etag}, {'HTTP_IF_MODIFIED_SINCE': last_modified}):
+                    response = self.client.get(url, **headers)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(response['ETag'], etag)
+                    titles = [item['title'] for item in response.data.get('results', [response.data])]
+                    self.assertEqual(titles, [self.listing.title])
+                self.age_stamps()
+    
+    def test_last_modified_withheld_within_the_changed_second(self):
+        self.listing.save()
+        response = self.client.get('/api/listings/')
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        
+        stamp = 1_700_000_000.25
+        self.assertIsNone(response_cache.last_modified_for(stamp, now=stamp + 0.5))
+        # A second write in the same second can't share the value a client already holds
+        self.assertEqual(response_cache.last_modified_for(stamp, now=stamp + 1), 1_700_000_001)
+        self.assertEqual(response_cache.last_modified_for(1_700_000_001.0, now=1_700_000_002), 1_700_000_002)
+    
+    def test_authenticated_reads_not_cached(self):
+        self.client.force_authenticate(self.seller)
+        response = self.client.get('/api/listings/')
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+
+class FullTextSearchTests(APITestCase):
+    """?search= matches word prefixes on the FTS5 document and ranks title hits first"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Vehicles')
+    
+    def setUp(self):
+        cache.clear()
+    
+    def search(self, query, **params):
+        cache.clear()
+        response = self.client.get('/api/listings/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.data['results']]
+    
+    def test_prefix_matching_on_every_token(self):
+        create_listing(self.seller, self.category, title='Honda City 2015', location='Pune')
+        create_listing(self.seller, self.category, title='Honda Activa scooter', location='Delhi')
+        create_listing(self.seller, self.category, title='Maruti Swift', location='Pune')
+        self.assertEqual(sorted(self.search('hon')), ['Honda Activa scooter', 'Honda City 2015'])
+        self.assertEqual(self.search('HON pun'), ['Honda City 2015'])
+        self.assertEqual(self.search('yamaha'), [])
+        # Punctuation only: nothing to match
+        self.assertEqual(self.search('"*'), [])
+    
+    def test_title_hits_outrank_description_hits(self):
+        create_listing(
+            self.seller, self.category, title='Family car for sale', description='A well kept Honda with new tyres'
+        )
+        create_listing(self.seller, self.category, title='Honda City for sale', description='A well kept family car')
+        self.assertEqual(self.search('honda'), ['Honda City for sale', 'Family car for sale'])
+        # An explicit ordering wins over relevance
+        self.assertEqual(
+            self.search('honda', ordering='created_at'), ['Family car for sale', 'Honda City for sale']
+        )
+    
+    def test_document_follows_saves_and_deletes(self):
+        listing = create_listing(self.seller, self.category, title='Honda City 2015')
+        self.assertEqual(self.search('honda'), ['Honda City 2015'])
+        
+        listing.title = 'Hyundai Verna 2017'
+        listing.save()
+        self.assertEqual(self.search('honda'), [])
+        self.assertEqual(self.search('verna'), ['Hyundai Verna 2017'])
+        
+        listing.delete()
+        self.assertEqual(self.search('verna'), [])
+    
+    def test_ranked_results_page_with_cursors(self):
+        for n in range(4):
+            create_listing(self.seller, self.category, title=f'Honda bike {n}', description='Runs well')
+            create_listing(self.seller, self.category, title=f'Bike {n} for sale', description=f'Honda engine {n}')
+        create_listing(self.seller, self.category, title='Bajaj Pulsar', description='Runs well')
+        expected = self.search('honda', page_size=20)
+        self.assertEqual(len(expected), 8)
+        self.assertTrue(all(title.startswith('Honda') for title in expected[:4]))
+        
+        cache.clear()
+        response = self.client.get('/api/listings/', {'search': 'honda', 'page_size': 3})
+        pages = [[item['title'] for item in response.data['results']]]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append([item['title'] for item in response.data['results']])
+        self.assertEqual([len(page) for page in pages], [3, 3, 2])
+        self.assertEqual([title for page in pages for title in page], expected)
+        
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([item['title'] for item in response.data['results']], pages[1])
+
+
+@override_settings(STORAGES=IN_MEMORY_STORAGES)
+class SparseFieldsetTests(APITestCase):
+    """?fields=, ?exclude= and ?expand= trim the payload and the queryset behind it"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.category = Category.objects.create(name='Phones')
+        cls.listing = create_listing(cls.seller, cls.category, title='Pixel 7')
+        ListingImage.objects.create(listing=cls.listing, image='listings/pixel.jpg')
+    
+    def setUp(self):
+        # Authenticated reads skip the anonymous response cache
+        self.client.force_authenticate(self.seller)
+    
+    def fetch(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/listings/{self.listing.pk}/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.data, [query['sql'] for query in queries.captured_queries]
+    
+    def test_fields_keeps_only_the_named_paths(self):
+        data, _ = self.fetch('?fields=id,title,user.username')
+        self.assertEqual(data, {'id': self.listing.pk, 'title': 'Pixel 7', 'user': {'username': 'seller'}})
+    
+    def test_exclude_drops_the_named_fields(self):
+        data, _ = self.fetch('?exclude=images,user,description')
+        self.assertNotIn('images', data)
+        self.assertNotIn('user', data)
+        self.assertNotIn('description', data)
+        self.assertEqual(data['title'], 'Pixel 7')
+        self.assertEqual(data['category_detail']['name'], 'Phones')
+    
+    def test_expand_collapses_other_relations_to_ids(self):
+        data, _ = self.fetch('?expand=user')
+        self.assertEqual(data['user']['username'], 'seller')
+        self.assertEqual(data['category_detail'], self.category.pk)
+        self.assertEqual(data['images'], [self.listing.images.get().pk])
+    
+    def test_unknown_field_names_are_ignored(self):
+        data, _ = self.fetch('?fields=id,nope,user.nope')
+        self.assertEqual(data, {'id': self.listing.pk, 'user': {}})
+    
+    def test_pruned_queryset_drops_unused_relations(self):
+        _, full = self.fetch()
+        self.assertIn('"users_user"', full[0])
+        self.assertIn('"categories_category"', full[0])
+        self.assertTrue(any('"listings_listingimage"' in sql for sql in full))
+        
+        with self.assertNumQueries(1):
+            data, sparse = self.fetch('?fields=id,title')
+        self.assertEqual(data, {'id': self.listing.pk, 'title': 'Pixel 7'})
+        self.assertNotIn('JOIN', sparse[0])
+        self.assertNotIn('"description"', sparse[0])
+        
+        # A nested path joins only the relation it reads
+        _, nested = self.fetch('?fields=id,user.username')
+        self.assertEqual(len(nested), 1)
+        self.assertIn('"users_user"', nested[0])
+        self.assertNotIn('"categories_category"', nested[0])
+
+
+@override_settings(
+    STORAGES=IN_MEMORY_STORAGES,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class ProjectionParityTests(APITestCase):
+    """List endpoints render the same JSON from .values() projections as from their serializers"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123', location='Pune')
+        cls.buyer = User.objects.create_user(username='buyer', password='password123')
+        cls.category = Category.objects.create(name='Bikes')
+        cls.covered = create_listing(cls.seller, cls.category, title='Royal Enfield', location='Pune')
+        Listing.objects.filter(pk=cls.covered.pk).update(cover_image='listings/enfield.jpg')
+        cards.set_cover_image(cls.covered.pk, 'listings/enfield.jpg', 'listings/enfield_thumb.jpg')
+        cls.plain = create_listing(cls.seller, cls.category, title='Hero Splendor', location='Mumbai')
+        SavedListing.objects.create(user=cls.buyer, listing=cls.covered)
+        SavedListing.objects.create(user=cls.buyer, listing=cls.plain)
+        
+        cls.chatty = Conversation.objects.create(listing=cls.covered, buyer=cls.buyer, seller=cls.seller)
+        cls.silent = Conversation.objects.create(listing=cls.plain, buyer=cls.buyer, seller=cls.seller)
+        start = timezone.now() - timedelta(hours=1)
+        for minutes, sender, is_read in ((0, cls.buyer, True), (5, cls.seller, False), (9, cls.seller, False)):
+            message = Message.objects.create(
+                conversation=cls.chatty, sender=sender, content=f'at {minutes}', is_read=is_read
+            )
+            Message.objects.filter(pk=message.pk).update(created_at=start + timedelta(minutes=minutes))
+    
+    def both(self, projection_class, url, **params):
+        """JSON of url rendered by projection_class, then by the serializer fallback"""
+        cache.clear()
+        projected = self.client.get(url, params)
+        self.assertEqual(projected.status_code, 200)
+        cache.clear()
+        with mock.patch.object(
+            projection_class, 'compile', side_effect=ProjectionUnsupported('test')
+        ) as compile_projection:
+            serialized = self.client.get(url, params)
+        self.assertEqual(serialized.status_code, 200)
+        self.assertTrue(compile_projection.called)
+        return projected.json(), serialized.json()
+    
+    def test_feed(self):
+        projected, serialized = self.both(ListingCardProjection, '/api/listings/')
+        self.assertEqual(projected, serialized)
+        first_images = {card['title']: card['first_image'] for card in projected['results']}
+        self.assertTrue(first_images['Royal Enfield'].endswith('listings/enfield_thumb.jpg'))
+        self.assertIsNone(first_images['Hero Splendor'])
+        
+        # Radius searches add distance_km
+        projected, serialized = self.both(
+            ListingCardProjection, '/api/listings/', lat=18.52, lng=73.85, radius_km=50
+        )
+        self.assertEqual(projected, serialized)
+        self.assertIsNotNone(projected['results'][0]['distance_km'])
+    
+    def test_wishlist(self):
+        self.client.force_authenticate(self.buyer)
+        projected, serialized = self.both(SavedListingProjection, '/api/listings/saved/')
+        self.assertEqual(projected, serialized)
+        self.assertEqual(len(projected), 2)
+    
+    def test_conversation_list(self):
+        for viewer, unread in ((self.buyer, 2), (self.seller, 0)):
+            self.client.force_authenticate(viewer)
+            projected, serialized = self.both(ConversationProjection, '/api/chat/conversations/')
+            self.assertEqual(projected, serialized)
+            rows = {row['id']: row for row in projected['results']}
+            self.assertEqual(rows[self.chatty.pk]['unread_count'], unread)
+            self.assertEqual(rows[self.chatty.pk]['last_message']['content'], 'at 9')
+            self.assertEqual(rows[self.silent.pk]['unread_count'], 0)
+            self.assertIsNone(rows[self.silent.pk]['last_message'])
+            other = self.seller if viewer == self.buyer else self.buyer
+            self.assertEqual(rows[self.chatty.pk]['other_user']['username'], other.username)
+    
+    def test_sparse_fields(self):
+        self.client.force_authenticate(self.buyer)
+        projected, serialized = self.both(
+            ConversationProjection, '/api/chat/conversations/', fields='id,listing.title,unread_count'
+        )
+        self.assertEqual(projected, serialized)
+        self.assertEqual(set(projected['results'][0]), {'id', 'listing', 'unread_count'})
+
+
+class SimilarListingTests(APITestCase):
+    """TF-IDF neighbours are computed per category and served best first from /similar/"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user(username='seller', password='password123')
+        cls.phones = Category.objects.create(name='Phones')
+        cls.accessories = Category.objects.create(name='Accessories')
+        cls.pro_max = create_listing(
+            cls.seller, cls.phones, title='iPhone 13 Pro Max 256GB', description='Apple iphone, excellent condition'
+        )
+        cls.pro = create_listing(
+            cls.seller, cls.phones, title='iPhone 13 Pro 128GB', description='Apple iphone with original box'
+        )
+        cls.eleven = create_listing(
+            cls.seller, cls.phones, title='iPhone 11', description='Apple phone, minor scratches'
+        )
+        cls.galaxy = create_listing(
+            cls.seller, cls.phones, title='Samsung Galaxy S21', description='Android phone by samsung'
+        )
+        cls.galaxy_new = create_listing(
+            cls.seller, cls.phones, title='Samsung Galaxy S22', description='Samsung android flagship'
+        )
+        cls.hidden = create_listing(
+            cls.seller, cls.phones, title='iPhone 13 Pro Max 512GB', description='Apple iphone', is_active=False
+        )
+        cls.case = create_listing(
+            cls.seller, cls.accessories, title='iPhone 13 Pro Max case', description='Apple iphone cover'
+        )
+    
+    def setUp(self):
+        cache.clear()
+    
+    def similar_ids(self, listing, **params):
+        response = self.client.get(f'/api/listings/{listing.pk}/similar/', params)
+        self.assertEqual(response.status_code, 200)
+        return [card['id'] for card in response.data['results']]
+    
+    def stored(self, listing):
+        return list(
+            SimilarListing.objects.filter(listing=listing).order_by('rank').values_list('similar_id', flat=True)
+        )
+    
+    def test_rebuild_orders_neighbours_within_the_category(self):
+        self.assertEqual(similar.rebuild(), 6)
+        self.assertEqual(self.similar_ids(self.pro_max), [self.pro.pk, self.eleven.pk])
+        self.assertEqual(self.similar_ids(self.galaxy), [self.galaxy_new.pk, self.eleven.pk])
+        self.assertEqual(self.similar_ids(self.pro_max, limit=1), [self.pro.pk])
+        scores = list(
+            SimilarListing.objects.filter(listing=self.pro_max).order_by('rank').values_list('score', flat=True)
+        )
+        self.assertEqual(scores, sorted(scores, reverse=True))
+    
+    def test_listing_itself_and_inactive_listings_are_excluded(self):
+        similar.rebuild()
+        for listing in (self.pro_max, self.pro, self.eleven, self.galaxy):
+            ids = self.similar_ids(listing)
+            self.assertNotIn(listing.pk, ids)
+            self.assertNotIn(self.hidden.pk, ids)
+            self.assertNotIn(self.case.pk, ids)
+        self.assertEqual(self.stored(self.hidden), [])
+        
+        # A neighbour that goes inactive after the rebuild is filtered at read time
+        self.pro.is_active = False
+        self.pro.save()
+        self.assertEqual(self.similar_ids(self.pro_max), [self.eleven.pk])
+    
+    def test_unknown_listing_is_404(self):
+        similar.rebuild()
+        self.assertEqual(self.client.get('/api/listings/999999/similar/').status_code, 404)
+        self.assertEqual(self.client.get('/api/listings/abc/similar/').status_code, 404)
+    
+    def test_empty_corpus(self):
+        empty = Category.objects.create(name='Empty')
+        self.assertEqual(similar.rebuild([empty.pk]), 0)
+        # The only live listing of its category has nothing to be similar to
+        self.assertEqual(similar.rebuild([self.accessories.pk]), 1)
+        self.assertEqual(self.similar_ids(self.case), [])
+        # Not computed yet is an empty list too, not an error
+        self.assertEqual(self.similar_ids(self.pro_max), [])
+    
+    def test_text_edit_clears_neighbours_until_refresh(self):
+        similar.rebuild()
+        self.eleven.title = 'Samsung Galaxy S20'
+        self.eleven.description = 'Android samsung'
+        self.eleven.save()
+        self.assertEqual(self.stored(self.eleven), [])
+        self.assertIn(self.eleven.pk, similar.pending_listing_ids())
+        
+        # Price edits keep them
+        self.pro.price = Decimal('900')
+        self.pro.save()
+        self.assertNotEqual(self.stored(self.pro), [])
+        
+        similar.refresh()
+        self.assertEqual(set(self.stored(self.eleven)[:2]), {self.galaxy.pk, self.galaxy_new.pk})
+        self.assertNotIn(self.eleven.pk, similar.pending_listing_ids())
+    
+    def test_refresh_merges_a_new_listing_into_existing_lists(self):
+        similar.rebuild()
+        newcomer = create_listing(
+            self.seller, self.phones, title='iPhone 13 Pro 128GB', description='Apple iphone, original box'
+        )
+        # The case has nothing similar in its category, so it stays pending
+        self.assertEqual(set(similar.pending_listing_ids()), {newcomer.pk, self.case.pk})
+        self.assertEqual(similar.refresh([newcomer.pk]), 4)
+        self.assertEqual(self.stored(newcomer)[0], self.pro.pk)
+        # Existing listings take it in without a rebuild
+        self.assertIn(newcomer.pk, self.similar_ids(self.pro_max))
+        self.assertIn(newcomer.pk, self.similar_ids(self.pro))
+        self.assertEqual(list(similar.pending_listing_ids()), [self.case.pk])
+
+
+class AdminExportTests(APITestCase):
+    """Staff can stream whole tables as NDJSON or CSV, bounded by created_at"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='password123', is_staff=True)
+        cls.seller = User.objects.create_user(username='@seller', password='password123')
+        cls.category = Category.objects.create(name='Books')
+        cls.formula = create_listing(
+            cls.seller, cls.category, title='=HYPERLINK("http://evil.example")',
+            description='+SUM(A1:A9)', location='-Delhi'
+        )
+        cls.plain = create_listing(cls.seller, cls.category, title='Plain title')
+        cls.older = create_listing(cls.seller, cls.category, title='Older')
+        tz = timezone.get_current_timezone()
+        for listing, day in ((cls.older, 9), (cls.formula, 10), (cls.plain, 12)):
+            Listing.objects.filter(pk=listing.pk).update(
+                created_at=timezone.datetime(2026, 1, day, 12, tzinfo=tz)
+            )
+    
+    def setUp(self):
+        self.client.force_authenticate(self.staff)
+    
+    def export(self, dataset='listings', **params):
+        response = self.client.get(f'/api/admin/export/{dataset}/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        return response, b''.join(response.streaming_content).decode()
+    
+    def ndjson_rows(self, **params):
+        response, body = self.export(**params)
+        self.assertTrue(response['Content-Type'].startswith('application/x-ndjson'))
+        return [json.loads(line) for line in body.splitlines()]
+    
+    def test_non_staff_is_forbidden(self):
+        self.client.force_authenticate(self.seller)
+        self.assertEqual(self.client.get('/api/admin/export/listings/').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get('/api/admin/export/listings/').status_code, (401, 403))
+    
+    def test_ndjson(self):
+        rows = self.ndjson_rows()
+        self.assertEqual([row['id'] for row in rows], sorted([self.formula.pk, self.plain.pk, self.older.pk]))
+        row = next(row for row in rows if row['id'] == self.plain.pk)
+        self.assertEqual(row['username'], '@seller')
+        self.assertEqual(row['category'], 'Books')
+        self.assertEqual(row['title'], 'Plain title')
+        self.assertEqual(row['price'], '100.00')
+        # JSON isn't evaluated by spreadsheets; values are exported verbatim
+        row = next(row for row in rows if row['id'] == self.formula.pk)
+        self.assertEqual(row['title'], '=HYPERLINK("http://evil.example")')
+    
+    def test_csv_escapes_formulas(self):
+        response, body = self.export(format='csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(list(rows[0])[:3], ['id', 'user_id', 'username'])
+        row = next(row for row in rows if row['id'] == str(self.formula.pk))
+        self.assertEqual(row['title'], '\'=HYPERLINK("http://evil.example")')
+        self.assertEqual(row['description'], "'+SUM(A1:A9)")
+        self.assertEqual(row['location'], "'-Delhi")
+        self.assertEqual(row['username'], "'@seller")
+        row = next(row for row in rows if row['id'] == str(self.plain.pk))
+        self.assertEqual(row['title'], 'Plain title')
+        self.assertEqual(row['price'], '100.00')
+    
+    def test_since_and_until_bounds(self):
+        ids = lambda **params: [row['id'] for row in self.ndjson_rows(**params)]
+        self.assertEqual(ids(since='2026-01-10'), sorted([self.formula.pk, self.plain.pk]))
+        # until is exclusive; a date means midnight in the server timezone
+        self.assertEqual(ids(since='2026-01-10', until='2026-01-12'), [self.formula.pk])
+        self.assertEqual(ids(until='2026-01-12T12:00:00'), sorted([self.older.pk, self.formula.pk]))
+        self.assertEqual(ids(since='2026-01-12T12:00:01'), [])
+        response = self.client.get('/api/admin/export/listings/', {'since': 'last week'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_other_datasets_and_unknown_dataset(self):
+        ListingReport.objects.create(
+            listing=self.plain, reported_by=self.staff, reason='spam', description='@everyone'
+        )
+        _, body = self.export('reports', format='csv')
+        rows = list(csv.DictReader(body.splitlines()))
+        self.assertEqual(rows[0]['listing_title'], 'Plain title')
+        self.assertEqual(rows[0]['description'], "'@everyone")
+        self.assertEqual(self.ndjson_rows(dataset='audit-log'), [])
+        
+        response = self.client.get('/api/admin/export/users/')
+        self.assertEqual(response.status_code, 404)
+        # Errors are JSON under the negotiated export media type
+        self.assertIn('listings', json.loads(response.content)['error'])
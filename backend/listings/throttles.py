@@ -0,0 +1,25 @@
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+
+class SuggestThrottle(AnonRateThrottle):
+    """
+    Throttle for typeahead suggestions (one request per keystroke).
+    Limit: 120 requests per minute per client IP
+    """
+    scope = 'listing_suggest'
+
+
+class ImportThrottle(UserRateThrottle):
+    """
+    Throttle for bulk listing imports (each request may carry thousands of rows).
+    Limit: 30 imports per hour per user
+    """
+    scope = 'listing_import'
+
+
+class UploadIntentThrottle(UserRateThrottle):
+    """
+    Throttle for direct image upload targets (each reserves a storage name).
+    Limit: 120 requests per hour per user
+    """
+    scope = 'listing_upload'
@@ -0,0 +1,105 @@
+"""
+Time-decayed trending score for listings.
+
+A listing's trend is the sum of its engagement events (views, saves, new
+conversations, and its own creation), each weighted and decayed as
+exp(-age / TIME_CONSTANT). Every listing decays by the same factor as
+time passes, so the ranking only needs scores relative to a fixed EPOCH:
+
+    trending = ln( sum of weight * exp((event time - EPOCH) / TIME_CONSTANT) )
+
+Kept in log space the number grows linearly with time and never
+overflows. An event is folded in with one in-place log-add-exp
+(record()), so no scan ever recomputes scores, and ?ordering=-trending
+is a plain index walk.
+
+ListingStats.trending holds the score (NULL until the first event after
+creation); feed cards carry a copy.
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+# Engagement halves in value every HALF_LIFE
+HALF_LIFE = timedelta(days=2)
+TIME_CONSTANT = HALF_LIFE.total_seconds() / math.log(2)
+
+CREATED_WEIGHT = 5.0
+VIEW_WEIGHT = 1.0
+SAVE_WEIGHT = 5.0
+CONVERSATION_WEIGHT = 10.0
+
+BATCH_SIZE = 500
+
+
+def event_score(weight, at):
+    """Log-space score of one event of `weight` at `at`"""
+    return math.log(weight) + (at - EPOCH).total_seconds() / TIME_CONSTANT
+
+
+def base_score(created_at):
+    """Score of a listing with no engagement besides being created"""
+    return event_score(CREATED_WEIGHT, created_at)
+
+
+def add_scores(a, b):
+    """ln(exp(a) + exp(b)) without overflow"""
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+def _log1p_exp_sql(x):
+    # Below -50 the term is under 1e-21; PostgreSQL raises on EXP() underflow
+    return f'(CASE WHEN {x} < -50 THEN 0 ELSE LN(1 + EXP({x})) END)'
+
+
+def _add_scores_sql(a, b):
+    """SQL for add_scores(); reads its operands alternately, a first"""
+    return (
+        f'CASE WHEN {a} >= {b} THEN {a} + {_log1p_exp_sql(f"{b} - {a}")} '
+        f'ELSE {b} + {_log1p_exp_sql(f"{a} - {b}")} END'
+    )
+
+
+def record(weights, at=None):
+    """
+    Fold events into trending scores: `weights` is {listing_id: total weight}
+    of events that happened at `at` (default now). Updates ListingStats and
+    the listings' feed cards.
+    """
+    from .models import Listing, ListingCard, ListingStats
+
+    weights = {int(listing_id): weight for listing_id, weight in weights.items() if weight > 0}
+    if not weights:
+        return
+    at = at or timezone.now()
+
+    table = connection.ops.quote_name(ListingStats._meta.db_table)
+    add_sql = _add_scores_sql(f'COALESCE({table}.trending, %s)', '%s')
+    operand_pairs = add_sql.count('%s') // 2
+    sql = (
+        f'INSERT INTO {table} (listing_id, view_count, impression_count, trending, updated_at) '
+        f'VALUES (%s, 0, 0, %s, %s) '
+        f'ON CONFLICT (listing_id) DO UPDATE SET '
+        f'trending = {add_sql}, updated_at = excluded.updated_at'
+    )
+
+    listing_ids = sorted(weights)
+    for start in range(0, len(listing_ids), BATCH_SIZE):
+        batch = listing_ids[start:start + BATCH_SIZE]
+        params = []
+        for listing_id, created_at in Listing.objects.filter(pk__in=batch).order_by('pk').values_list('pk', 'created_at'):
+            base = base_score(created_at)
+            event = event_score(weights[listing_id], at)
+            params.append((listing_id, add_scores(base, event), at) + (base, event) * operand_pairs)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+            ListingCard.objects.filter(listing_id__in=batch).update(trending=Subquery(
+                ListingStats.objects.filter(listing_id=OuterRef('listing_id')).values('trending')[:1]
+            ))
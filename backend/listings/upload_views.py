@@ -0,0 +1,54 @@
+from io import BytesIO
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .direct_uploads import MAX_SIZE, get_backend
+
+
+class _LimitedStream:
+    """Reads at most `limit` bytes, then raises OverflowError if more are sent"""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.remaining = limit
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.remaining + 1
+        data = self.stream.read(min(size, self.remaining + 1))
+        self.remaining -= len(data)
+        if self.remaining < 0:
+            raise OverflowError
+        return data
+
+
+class DirectUploadView(APIView):
+    """
+    PUT /api/listings/uploads/<token>/
+    - Upload target of LocalUploadBackend (the offline stand-in for direct uploads)
+    - The signed token is the only credential; the body is the raw image
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    
+    def put(self, request, token):
+        backend = get_backend()
+        intent = backend.intent_for_token(token)
+        if intent is None:
+            return Response({'error': 'Invalid or expired upload URL'}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length > MAX_SIZE:
+            return Response({'error': 'Image file size cannot exceed 5MB'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        try:
+            received = backend.receive(intent, _LimitedStream(request.stream or BytesIO(), MAX_SIZE))
+        except OverflowError:
+            return Response({'error': 'Image file size cannot exceed 5MB'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if not received:
+            return Response({'error': 'Invalid or expired upload URL'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,97 @@
+"""
+Concurrent persistence of uploaded listing images.
+
+Each image upload is a network round trip to the media store
+(MediaCloudinaryStorage), so saving a listing's images one after another
+holds the request for the sum of those trips. save_images() pushes all of
+a request's files to storage at once on a bounded per-process thread pool
+(IMAGE_UPLOAD_WORKERS), then creates the ListingImage rows from the
+stored names, which only touches the database. The request waits for the
+slowest upload instead of all of them.
+
+If any upload fails, the files already stored are deleted and the error
+is raised, so no rows point at missing files and no files are orphaned.
+The rows are created in one transaction; if that fails, every stored file
+is deleted as well. Files whose rows vanish with an enclosing transaction
+rolled back later are found by listings.blob_gc.reconcile().
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import transaction
+
+WORKERS = getattr(settings, 'IMAGE_UPLOAD_WORKERS', 4)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='image-upload')
+    return _executor
+
+
+def store_files(storage, named_files, max_length=None, executor=None, concurrent=True):
+    """
+    Save (name, file) pairs to `storage` in parallel on `executor` (default:
+    the shared pool); returns the stored names in the same order. A single
+    file, or concurrent=False, is saved inline.
+    """
+    named_files = list(named_files)
+    concurrent = concurrent and len(named_files) > 1 and (executor is not None or WORKERS > 1)
+    if not concurrent:
+        stored = []
+        try:
+            for name, content in named_files:
+                stored.append(storage.save(name, content, max_length=max_length))
+        except Exception:
+            delete_files(storage, stored)
+            raise
+        return stored
+
+    executor = executor or get_executor()
+    futures = [
+        executor.submit(storage.save, name, content, max_length=max_length)
+        for name, content in named_files
+    ]
+    stored = []
+    error = None
+    for future in futures:
+        try:
+            stored.append(future.result())
+        except Exception as exc:
+            error = error or exc
+    if error is not None:
+        delete_files(storage, stored)
+        raise error
+    return stored
+
+
+def delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+
+
+def save_images(listing, files):
+    """Store uploaded files concurrently and attach them to `listing`; returns the ListingImages"""
+    from .models import ListingImage
+
+    files = list(files)
+    if not files:
+        return []
+    field = ListingImage._meta.get_field('image')
+    named_files = [
+        (field.generate_filename(ListingImage(listing=listing), upload.name), upload)
+        for upload in files
+    ]
+    names = store_files(field.storage, named_files, max_length=field.max_length)
+    try:
+        with transaction.atomic():
+            # Names of stored files: assigning them does not upload again, and signals still run per image
+            return [ListingImage.objects.create(listing=listing, image=name) for name in names]
+    except Exception:
+        delete_files(field.storage, names)
+        raise
@@ -1,8 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import ListingViewSet
-from .saved_views import SavedListingListView, SavedListingDetailView
+from .saved_views import (
+    SavedListingListView, SavedListingDetailView, SavedSearchListView, SavedSearchDetailView
+)
 from .my_listings_view import MyListingsView
+from .upload_views import DirectUploadView
 
 app_name = 'listings'
 
@@ -17,6 +20,13 @@ urlpatterns = [
     path('saved/', SavedListingListView.as_view(), name='saved-list'),
     path('saved/<int:pk>/', SavedListingDetailView.as_view(), name='saved-detail'),
     
+    # Saved search alerts (must be before router)
+    path('saved-searches/', SavedSearchListView.as_view(), name='saved-search-list'),
+    path('saved-searches/<int:pk>/', SavedSearchDetailView.as_view(), name='saved-search-detail'),
+    
+    # Local stand-in target for direct image uploads (must be before router)
+    path('uploads/<str:token>/', DirectUploadView.as_view(), name='direct-upload'),
+    
     # Router URLs (catch-all for listings CRUD)
     path('', include(router.urls)),
 ]
@@ -1,33 +1,82 @@
-from rest_framework import viewsets, permissions, status, filters
+import uuid
+from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Listing, ListingImage
-from .serializers import ListingSerializer, ListingListSerializer
+from .models import Listing, ListingImage, ListingCard
+from .serializers import ListingSerializer, ListingCardSerializer, ListingImageSerializer
 from .permissions import IsOwnerOrReadOnly
+from .throttles import SuggestThrottle, ImportThrottle, UploadIntentThrottle
+from .filters import ListingSearchFilter, ListingFilter, GeoRadiusFilter, ListingOrderingFilter
+from .facets import get_facets
+from . import suggest
+from . import bulk_import
+from . import counters
+from . import direct_uploads
+from .similar import TOP_N as SIMILAR_TOP_N
+from .response_cache import AnonymousReadCacheMixin
+from .projections import ListingCardProjection
+from olx_backend.fieldsets import SparseQuerysetMixin
+from olx_backend.projections import ProjectionListMixin
+from olx_backend.pagination import KeysetPagination
 
 
-class ListingViewSet(viewsets.ModelViewSet):
+class ListingViewSet(AnonymousReadCacheMixin, SparseQuerysetMixin, ProjectionListMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing listings.
-    - List: Public, with filtering and search
+    - List: Public, with filtering and search (anonymous reads are cached)
     - Create: Authenticated users only
     - Update/Delete: Owner only
     """
-    queryset = Listing.objects.select_related('user', 'category').prefetch_related('images').all()
+    queryset = Listing.objects.select_related('user', 'category').all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'is_sold', 'location']
+    # Search and radius run after ordering so relevance / distance can take precedence
+    filter_backends = [DjangoFilterBackend, ListingOrderingFilter, ListingSearchFilter, GeoRadiusFilter]
+    filterset_class = ListingFilter
     search_fields = ['title', 'description', 'location']
-    ordering_fields = ['created_at', 'price']
+    ordering_fields = ['created_at', 'price', 'trending']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    # The feed renders from .values() rows; see listings.projections
+    projection_class = ListingCardProjection
+    
+    def get_queryset(self):
+        """The public feed reads the denormalized cards; everything else reads listings"""
+        if self.action in ('list', 'facets'):
+            return ListingCard.objects.filter(is_active=True)
+        return super().get_queryset().prefetch_related('images')
     
     def get_serializer_class(self):
         """Use different serializers for list and detail views"""
         if self.action == 'list':
-            return ListingListSerializer
+            return ListingCardSerializer
         return ListingSerializer
     
+    def list(self, request, *args, **kwargs):
+        """Feed page; each listing on it counts an impression"""
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            counters.record_impressions(
+                item['id'] for item in response.data.get('results', []) if 'id' in item
+            )
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Listing detail; counts a view (revalidated 304s included)"""
+        response = super().retrieve(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            counters.record_view(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        return response
+    
+    def get_read_variant(self):
+        """
+        Cached details carry live counters and trending order moves with them;
+        let both age by at most one flush interval.
+        """
+        if self.action == 'retrieve' or 'trending' in self.request.query_params.get('ordering', ''):
+            return counters.staleness_window()
+        return ''
+    
     def perform_create(self, serializer):
         """Set the user to the current authenticated user"""
         serializer.save(user=self.request.user)
@@ -51,6 +100,90 @@ class ListingViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='bulk-import',
+        permission_classes=[permissions.IsAuthenticated],
+        throttle_classes=[ImportThrottle]
+    )
+    def bulk_import(self, request):
+        """
+        Create many listings from a CSV or NDJSON request body, read as a stream.
+        POST /api/listings/bulk-import/
+        """
+        import_format = bulk_import.format_for_content_type(request.content_type)
+        if import_format is None:
+            return Response(
+                {'error': 'Send the rows as text/csv or application/x-ndjson'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        
+        report = bulk_import.import_listings(
+            request.stream or [], import_format, request.user,
+            max_rows=bulk_import.MAX_REQUEST_ROWS
+        )
+        response_status = status.HTTP_201_CREATED if report.created_ids else status.HTTP_400_BAD_REQUEST
+        return Response(report.as_dict(), status=response_status)
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Facet counts (category, location, price range) for the current filters.
+        GET /api/listings/facets/
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(get_facets(queryset, request.query_params))
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        authentication_classes=[],
+        permission_classes=[permissions.AllowAny],
+        throttle_classes=[SuggestThrottle]
+    )
+    def suggest(self, request):
+        """
+        Typeahead suggestions (titles, categories, locations) from the in-memory index.
+        GET /api/listings/suggest/?q=<prefix>&limit=<n>
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', suggest.DEFAULT_LIMIT)), 1), suggest.MAX_LIMIT)
+        except ValueError:
+            limit = suggest.DEFAULT_LIMIT
+        
+        results = []
+        for (kind, ident), text, count in suggest.get_suggest_index().search(request.query_params.get('q', ''), limit):
+            result = {'text': text, 'type': kind, 'count': count}
+            if kind == suggest.CATEGORY:
+                result['id'] = ident
+            results.append(result)
+        return Response({'results': results})
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Live listings similar to this one, best match first, as feed cards.
+        Neighbours are precomputed (see listings.similar).
+        GET /api/listings/{id}/similar/?limit=<n>
+        """
+        try:
+            limit = min(max(int(request.query_params.get('limit', SIMILAR_TOP_N)), 1), SIMILAR_TOP_N)
+        except ValueError:
+            limit = SIMILAR_TOP_N
+        if not str(pk).isdigit():
+            return Response({'error': 'Listing not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        cards = list(
+            ListingCard.objects.filter(
+                listing__similar_to__listing_id=pk, is_active=True, is_sold=False
+            ).order_by('listing__similar_to__rank')[:limit]
+        )
+        if not cards and not Listing.objects.filter(pk=pk).exists():
+            return Response({'error': 'Listing not found'}, status=status.HTTP_404_NOT_FOUND)
+        serializer = ListingCardSerializer(cards, many=True, context=self.get_serializer_context())
+        return Response({'results': serializer.data})
+    
     @action(detail=True, methods=['patch'], permission_classes=[permissions.IsAuthenticated, IsOwnerOrReadOnly])
     def mark_sold(self, request, pk=None):
         """
@@ -63,6 +196,54 @@ class ListingViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(listing)
         return Response(serializer.data)
     
+    @action(
+        detail=True,
+        methods=['post'],
+        url_path='upload-intents',
+        permission_classes=[permissions.IsAuthenticated, IsOwnerOrReadOnly],
+        throttle_classes=[UploadIntentThrottle]
+    )
+    def upload_intent(self, request, pk=None):
+        """
+        Signed target for uploading one image straight to storage.
+        POST /api/listings/{id}/upload-intents/ {"content_type": "image/jpeg"}
+        """
+        listing = self.get_object()
+        try:
+            intent = direct_uploads.create_intent(listing, request.user, request.data.get('content_type'))
+        except direct_uploads.UploadError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'intent': str(intent.pk),
+            'expires_at': intent.expires_at,
+            'max_size': direct_uploads.MAX_SIZE,
+            **direct_uploads.get_backend().target(intent, request),
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(
+        detail=True,
+        methods=['post'],
+        url_path='images',
+        permission_classes=[permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    )
+    def finalize_image(self, request, pk=None):
+        """
+        Attach an image uploaded through an upload intent.
+        POST /api/listings/{id}/images/ {"intent": "<intent id>"}
+        """
+        listing = self.get_object()
+        intent_id = str(request.data.get('intent', ''))
+        try:
+            uuid.UUID(intent_id)
+        except ValueError:
+            return Response({'error': 'A valid intent id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            image = direct_uploads.finalize(listing, intent_id)
+        except direct_uploads.UploadError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = ListingImageSerializer(image, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
     @action(detail=True, methods=['delete'], permission_classes=[permissions.IsAuthenticated, IsOwnerOrReadOnly])
     def delete_image(self, request, pk=None):
         """
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:18
+
+# The chat and notifications tables predate their migration files: deployed
+# databases already have them. Apply with `migrate --fake-initial` so this
+# migration is recorded instead of failing with "table already exists".
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationPreference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enable_in_app', models.BooleanField(default=True)),
+                ('enable_email', models.BooleanField(default=True)),
+                ('email_new_message', models.BooleanField(default=True)),
+                ('email_listing_sold', models.BooleanField(default=True)),
+                ('email_price_drop', models.BooleanField(default=False)),
+                ('email_saved_search', models.BooleanField(default=False)),
+                ('email_digest', models.BooleanField(default=False)),
+                ('digest_frequency', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly')], default='daily', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='notification_preferences', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('message', 'New Message'), ('listing_sold', 'Listing Sold'), ('listing_expired', 'Listing Expired'), ('price_drop', 'Price Drop Alert'), ('saved_search', 'Saved Search Match'), ('system', 'System Notification')], max_length=20)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('link_url', models.CharField(blank=True, max_length=500)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('is_read', models.BooleanField(default=False)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['recipient', '-created_at'], name='notificatio_recipie_a972ce_idx'), models.Index(fields=['recipient', 'is_read'], name='notificatio_recipie_4e3567_idx')],
+            },
+        ),
+    ]
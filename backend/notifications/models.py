@@ -41,7 +41,7 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['recipient', '-created_at']),
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_feed_idx'),
             models.Index(fields=['recipient', 'is_read']),
         ]
     
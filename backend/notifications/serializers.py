@@ -1,8 +1,9 @@
 from rest_framework import serializers
 from .models import Notification, NotificationPreference
+from olx_backend.fieldsets import SparseFieldsMixin
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for notifications"""
     time_ago = serializers.SerializerMethodField()
     
@@ -13,6 +14,7 @@ class NotificationSerializer(serializers.ModelSerializer):
             'link_url', 'is_read', 'created_at', 'time_ago'
         ]
         read_only_fields = fields
+        sparse_sources = {'time_ago': ['created_at']}
     
     def get_time_ago(self, obj):
         """Get human-readable time ago"""
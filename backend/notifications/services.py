@@ -1,5 +1,25 @@
+import asyncio
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
 from .models import Notification, NotificationPreference
+from .serializers import NotificationSerializer
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Channel-layer sends in flight at once during a broadcast
+SEND_BATCH_SIZE = 100
+
+
+async def _send_all(channel_layer, messages):
+    for start in range(0, len(messages), SEND_BATCH_SIZE):
+        await asyncio.gather(*(
+            channel_layer.group_send(group, message)
+            for group, message in messages[start:start + SEND_BATCH_SIZE]
+        ))
 
 
 class NotificationService:
@@ -33,6 +53,61 @@ class NotificationService:
         )
         return notification
     
+    @staticmethod
+    def create_notifications(notifications, batch_size=500):
+        """
+        Insert many notifications at once and broadcast them after commit.
+        bulk_create skips post_save, so each recipient's unread count is
+        pushed once per call rather than once per notification.
+        
+        Returns:
+            List of created Notification objects
+        """
+        created = Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        transaction.on_commit(lambda: NotificationService.broadcast(created), robust=True)
+        return created
+    
+    @staticmethod
+    def broadcast(notifications):
+        """
+        Push notifications and the recipients' unread counts over Channels.
+        Messages go out concurrently from one event loop, SEND_BATCH_SIZE at
+        a time, rather than one blocking round trip each.
+        """
+        channel_layer = get_channel_layer()
+        if channel_layer is None or not notifications:
+            return
+        
+        messages = [
+            (
+                f"notifications_{notification.recipient_id}",
+                {
+                    "type": "notification_created",
+                    "notification": NotificationSerializer(notification).data
+                }
+            )
+            for notification in notifications
+        ]
+        
+        recipients = {notification.recipient_id for notification in notifications}
+        unread_counts = Notification.objects.filter(
+            recipient_id__in=list(recipients),
+            is_read=False
+        ).values('recipient_id').annotate(count=Count('id')).values_list('recipient_id', 'count')
+        messages.extend(
+            (
+                f"notifications_{recipient_id}",
+                {
+                    "type": "unread_count_updated",
+                    "count": count
+                }
+            )
+            for recipient_id, count in unread_counts
+        )
+        
+        async_to_sync(_send_all)(channel_layer, messages)
+        logger.info(f"[Channels] {len(notifications)} notifications broadcast to {len(recipients)} users")
+    
     @staticmethod
     def notify_new_message(conversation, message):
         """
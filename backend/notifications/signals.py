@@ -1,12 +1,10 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from chat.models import Message
 from listings.models import Listing
 from .models import Notification, NotificationPreference
-from .serializers import NotificationSerializer
+from .services import NotificationService
 import logging
 
 User = get_user_model()
@@ -27,35 +25,7 @@ def broadcast_notification_via_channels(sender, instance, created, **kwargs):
     Sends to user-specific notification channel.
     """
     if created:
-        channel_layer = get_channel_layer()
-        
-        # Serialize notification
-        notification_data = NotificationSerializer(instance).data
-        
-        # Broadcast to user's notification group
-        async_to_sync(channel_layer.group_send)(
-            f"notifications_{instance.recipient.id}",
-            {
-                "type": "notification_created",
-                "notification": notification_data
-            }
-        )
-        
-        # Also send unread count update
-        unread_count = Notification.objects.filter(
-            recipient=instance.recipient,
-            is_read=False
-        ).count()
-        
-        async_to_sync(channel_layer.group_send)(
-            f"notifications_{instance.recipient.id}",
-            {
-                "type": "unread_count_updated",
-                "count": unread_count
-            }
-        )
-        
-        logger.info(f"[Channels] Notification {instance.id} broadcast to user {instance.recipient.id}")
+        NotificationService.broadcast([instance])
 
 
 @receiver(post_save, sender=Message)
@@ -4,15 +4,18 @@ from rest_framework.response import Response
 from .models import Notification, NotificationPreference
 from .serializers import NotificationSerializer, NotificationPreferenceSerializer
 from .services import NotificationService
+from olx_backend.fieldsets import SparseQuerysetMixin
+from olx_backend.pagination import KeysetPagination
 
 
-class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+class NotificationViewSet(SparseQuerysetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing notifications.
     Users can only see their own notifications.
     """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         """Return notifications for current user"""
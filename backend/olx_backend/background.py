@@ -0,0 +1,47 @@
+"""
+Fire-and-forget work that must not hold up the request that caused it.
+
+submit() queues a callable on a small per-process thread pool once the
+current transaction commits. Jobs get their own database connection,
+closed when they finish, and failures are logged, never raised. Queued
+jobs are lost if the process exits; only hand over work that can be lost
+(notifications, cache refreshes).
+
+With BACKGROUND_TASKS_EAGER set, jobs run inline instead (tests, scripts).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_TASKS_WORKERS', 2),
+            thread_name_prefix='background'
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    close_old_connections()
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background job %s failed', getattr(func, '__qualname__', func))
+    finally:
+        connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the background after the current transaction commits"""
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(lambda: func(*args, **kwargs), robust=True)
+        return
+    transaction.on_commit(lambda: get_executor().submit(_run, func, args, kwargs))
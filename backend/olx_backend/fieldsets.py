@@ -0,0 +1,241 @@
+"""
+Sparse fieldsets (?fields=, ?exclude=, ?expand=) for read endpoints.
+
+    ?fields=id,title,user.username   keep only these fields; dots reach into nested objects
+    ?exclude=description,images      drop these fields
+    ?expand=user                     render only these nested objects in full, every
+                                     other nested object collapses to its id
+
+SparseFieldsMixin applies the parameters to a serializer and, through
+them, to its nested serializers. SparseQuerysetMixin (views) then trims
+select_related, prefetch_related and the selected columns to what the
+pruned serializer reads, so a smaller payload is also less database work.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+EXPAND_PARAM = 'expand'
+
+
+def parse_paths(raw):
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}"""
+    tree = {}
+    for path in raw.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+class Fieldset:
+    """Parsed fields/exclude/expand for one serializer level"""
+
+    def __init__(self, include=None, exclude=None, expand=None):
+        self.include = include  # None keeps every field
+        self.exclude = exclude or {}
+        self.expand = expand  # None leaves nested objects as declared
+
+    @classmethod
+    def from_query_params(cls, params):
+        """Return a Fieldset, or None when the request doesn't ask for one"""
+        if not any(name in params for name in (FIELDS_PARAM, EXCLUDE_PARAM, EXPAND_PARAM)):
+            return None
+        return cls(
+            include=parse_paths(params[FIELDS_PARAM]) if params.get(FIELDS_PARAM) else None,
+            exclude=parse_paths(params.get(EXCLUDE_PARAM, '')),
+            expand=parse_paths(params[EXPAND_PARAM]) if EXPAND_PARAM in params else None,
+        )
+
+    def child(self, name):
+        """Fieldset of the nested serializer under `name`"""
+        include = self.include.get(name) if self.include is not None else None
+        return Fieldset(
+            include=include or None,
+            exclude=self.exclude.get(name),
+            expand=self.expand.get(name, {}) if self.expand is not None else None,
+        )
+
+
+def collapse(field):
+    """Replace a nested serializer by the primary key(s) it represents"""
+    kwargs = {'read_only': True}
+    if isinstance(field, serializers.ListSerializer):
+        kwargs['many'] = True
+    if field.source:
+        kwargs['source'] = field.source
+    return serializers.PrimaryKeyRelatedField(**kwargs)
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin for ?fields=, ?exclude= and ?expand=.
+
+    Only the outermost serializer reads the query string, and only on safe
+    methods; nested serializers using the mixin receive their share of it.
+    SerializerMethodFields declare what they read in Meta.sparse_sources
+    (model paths, possibly through relations) so views can trim the query;
+    see SparseQuerysetMixin.
+    """
+
+    def get_fieldset(self):
+        if hasattr(self, '_fieldset'):
+            return self._fieldset
+        if self.root not in (self, self.parent):
+            return None
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        return Fieldset.from_query_params(request.query_params)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return fields
+
+        if fieldset.include is not None:
+            fields = {name: field for name, field in fields.items() if name in fieldset.include}
+        for name, nested_exclude in fieldset.exclude.items():
+            if not nested_exclude:
+                fields.pop(name, None)
+
+        for name, field in list(fields.items()):
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+            if fieldset.expand is not None and name not in fieldset.expand:
+                fields[name] = collapse(field)
+            else:
+                nested._fieldset = fieldset.child(name)
+        return fields
+
+
+class UnknownSource(Exception):
+    """A field reads something the queryset can't be trimmed for"""
+
+
+class QueryRequirements:
+    """Columns, joins and prefetches needed to render a serializer"""
+
+    def __init__(self):
+        self.columns = set()
+        self.select = set()
+        self.prefetch = set()
+
+    def add_path(self, model, prefix, path, load_object):
+        """
+        Record what reading `path` from `model` needs. Returns the related
+        model when the path ends in a to-one relation that has to be loaded
+        (so nested fields can be collected), else None.
+        """
+        parts = path.split('__')
+        for index, part in enumerate(parts):
+            try:
+                field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                raise UnknownSource(prefix + path)
+            name = prefix + part
+            last = index == len(parts) - 1
+
+            if field.many_to_many or field.one_to_many:
+                self.prefetch.add(name)
+                return None
+            if not field.is_relation or (last and not load_object) or getattr(field, 'attname', None) == part:
+                # Plain column, or a foreign key only read as its id
+                self.columns.add(name)
+                return None
+
+            self.select.add(name)
+            self.columns.add(name)
+            model = field.related_model
+            prefix = name + '__'
+        return model
+
+
+def collect_requirements(serializer, model, requirements, prefix=''):
+    """Walk the (pruned) serializer and record what it reads"""
+    sources = getattr(getattr(serializer, 'Meta', None), 'sparse_sources', {})
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        is_nested = isinstance(nested, serializers.BaseSerializer)
+
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in sources:
+                raise UnknownSource(name)
+            for path in sources[name]:
+                requirements.add_path(model, prefix, path, load_object=True)
+            continue
+
+        if field.source == '*':
+            raise UnknownSource(name)
+        path = field.source.replace('.', '__')
+        related_model = requirements.add_path(model, prefix, path, load_object=is_nested)
+        if is_nested and related_model is not None:
+            collect_requirements(nested, related_model, requirements, prefix + path + '__')
+
+
+def _lookup_path(lookup):
+    return getattr(lookup, 'prefetch_through', lookup)
+
+
+def _paths_overlap(a, b):
+    return a == b or a.startswith(b + '__') or b.startswith(a + '__')
+
+
+def prune_queryset(queryset, serializer):
+    """Trim joins, prefetches and columns to what `serializer` reads"""
+    requirements = QueryRequirements()
+    try:
+        collect_requirements(serializer, queryset.model, requirements)
+    except UnknownSource:
+        return queryset
+
+    opts = queryset.model._meta
+    # The paginator reads the sort key off each row; keep ordering columns loaded
+    for term in list(queryset.query.order_by) or list(opts.ordering):
+        if isinstance(term, str):
+            name = term.lstrip('-')
+            try:
+                opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            requirements.columns.add(name)
+    requirements.columns.add(opts.pk.name)
+
+    lookups = [
+        lookup for lookup in queryset._prefetch_related_lookups
+        if any(_paths_overlap(_lookup_path(lookup), path) for path in requirements.prefetch)
+    ]
+    covered = {_lookup_path(lookup) for lookup in lookups}
+    lookups.extend(path for path in sorted(requirements.prefetch) if path not in covered)
+
+    queryset = queryset.select_related(None).prefetch_related(None)
+    if requirements.select:
+        queryset = queryset.select_related(*sorted(requirements.select))
+    if lookups:
+        queryset = queryset.prefetch_related(*lookups)
+    return queryset.only(*sorted(requirements.columns))
+
+
+class SparseQuerysetMixin:
+    """
+    View mixin: when the request asks for a sparse fieldset, load only what
+    the pruned serializer reads. Applied after filtering and ordering so
+    the sort key stays loaded for pagination.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        serializer = self.get_serializer()
+        if not isinstance(serializer, SparseFieldsMixin) or serializer.get_fieldset() is None:
+            return queryset
+        return prune_queryset(queryset, serializer)
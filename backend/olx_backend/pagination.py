@@ -0,0 +1,195 @@
+"""
+Keyset (cursor) pagination shared by the feed endpoints.
+
+Pages are addressed by an opaque cursor holding the sort key and id of
+the boundary row, so each page is a single indexed range scan: no
+COUNT(*) and no OFFSET, and inserts never shift pages that were already
+handed out.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate on (<first ordering field>, id).
+    Rows may be model instances or .values() dicts (see olx_backend.projections).
+
+    The sort key is taken from the queryset's current ordering (set by
+    OrderingFilter or Meta.ordering), so ?ordering=price and
+    ?ordering=-created_at each get their own keyset. The primary key is
+    always used as tie-breaker in the same direction.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        key, descending = self.get_sort_key(queryset)
+        # attname, so a OneToOne primary key (listing_id) orders by its column
+        pk_name = queryset.model._meta.pk.attname
+        self.key = key
+        self.pk_name = pk_name
+        self.descending = descending
+        self.ordering_token = f"{'-' if descending else ''}{key}"
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['r'])
+
+        # Walking backwards flips both the ordering and the comparison
+        walk_descending = descending != reverse
+        prefix = '-' if walk_descending else ''
+        queryset = queryset.order_by(f'{prefix}{key}', f'{prefix}{pk_name}')
+
+        if cursor:
+            value = self.parse_value(queryset.model, cursor['v'])
+            op = 'lt' if walk_descending else 'gt'
+            bound = 'lte' if walk_descending else 'gte'
+            # The redundant bound keeps the leading index column usable for the range scan
+            queryset = queryset.filter(**{f'{key}__{bound}': value}).filter(
+                Q(**{f'{key}__{op}': value}) | Q(**{key: value, f'{pk_name}__{op}': cursor['i']})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_previous = cursor is not None
+            self.has_next = has_more
+
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        if not rows and cursor:
+            # Ran past the end (or start); keep the caller's position for the other direction
+            self.boundary = {'v': cursor['v'], 'i': cursor['i']}
+        else:
+            self.boundary = None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+            if size > 0:
+                return min(size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_sort_key(self, queryset):
+        """Return (field name, descending) of the leading ordering term"""
+        ordering = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+        for term in ordering:
+            if not isinstance(term, str):
+                continue
+            name = term.lstrip('-')
+            if name == '?' or '__' in name:
+                continue
+            if name == 'pk':
+                name = queryset.model._meta.pk.attname
+            return name, term.startswith('-')
+        return queryset.model._meta.pk.attname, True
+
+    def parse_value(self, model, raw):
+        """Turn a cursor value back into the type of the sort key"""
+        try:
+            return model._meta.get_field(self.key).to_python(raw)
+        except FieldDoesNotExist:
+            # Annotations (e.g. search_rank) round-trip through JSON as-is
+            return raw
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse, position=None):
+        if position is None:
+            if isinstance(row, dict):
+                position = {'v': row[self.key], 'i': row[self.pk_name]}
+            else:
+                position = {'v': getattr(row, self.key), 'i': row.pk}
+        payload = {
+            'o': self.ordering_token,
+            'v': self.serialize_value(position['v']),
+            'i': position['i'],
+            'r': 1 if reverse else 0,
+        }
+        token = urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(token.encode()).decode())
+            cursor = {'o': str(cursor['o']), 'v': cursor['v'], 'i': int(cursor['i']), 'r': int(cursor['r'])}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        # A cursor only makes sense for the ordering it was issued for
+        if cursor['o'] != self.ordering_token:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    @staticmethod
+    def serialize_value(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.last_row is not None:
+            return self.encode_cursor(self.last_row, reverse=False)
+        if self.boundary is not None:
+            return self.encode_cursor(None, reverse=False, position=self.boundary)
+        return None
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_row is not None:
+            return self.encode_cursor(self.first_row, reverse=True)
+        if self.boundary is not None:
+            return self.encode_cursor(None, reverse=True, position=self.boundary)
+        return remove_query_param(self.base_url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
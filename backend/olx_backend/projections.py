@@ -0,0 +1,211 @@
+"""
+Compiled read projections for list endpoints.
+
+A projection renders exactly what a serializer would, but from .values()
+rows. The serializer's (possibly sparse) fields are walked once to build
+a flat column list and one accessor per output key; rendering a page is
+then dict lookups plus each field's own to_representation, with no model
+instances and no per-row serializer machinery.
+
+Anything a projection can't reproduce (many-valued nesting, hyperlinks,
+SerializerMethodFields without a project_<name> method) raises
+ProjectionUnsupported, and ProjectionListMixin falls back to the
+serializer.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Compiled projections by (class, fields/exclude/expand); bounded so odd query strings can't grow it
+_COMPILED = {}
+_COMPILED_MAX = 256
+
+
+class ProjectionUnsupported(Exception):
+    """The serializer has a field the projection can't reproduce"""
+
+
+def absolute_url(url, context):
+    """Absolute URL for a storage URL, resolving the request origin once per response"""
+    if url.startswith(('http://', 'https://')):
+        return url
+    origin = context.get('media_origin')
+    if origin is None:
+        request = context.get('request')
+        origin = request.build_absolute_uri('/')[:-1] if request else ''
+        context['media_origin'] = origin
+    return origin + url
+
+
+class Projection:
+    """
+    Projection of one serializer class. Subclasses add project_<name>(row, context)
+    for SerializerMethodFields and list the columns each reads in method_columns
+    (relative to the serializer's model); nested serializers can be given their own
+    projection class in nested_projections.
+    """
+    serializer_class = None
+    method_columns = {}
+    nested_projections = {}
+
+    def __init__(self, serializer, prefix=''):
+        self.model = serializer.Meta.model
+        self.prefix = prefix
+        self.columns = set()
+        self.plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            self.plan.append((name, self.compile_field(name, field)))
+
+    @classmethod
+    def compile(cls, context):
+        """Projection of serializer_class as the current request would see it"""
+        request = context.get('request')
+        params = request.query_params if request is not None else {}
+        key = (cls, *(params.get(name) for name in ('fields', 'exclude', 'expand')))
+        projection = _COMPILED.get(key)
+        if projection is None:
+            serializer = cls.serializer_class(context=context)
+            projection = cls(serializer)
+            # Compiled plans outlive the request; don't keep it alive through the serializer
+            serializer._context = {}
+            if len(_COMPILED) >= _COMPILED_MAX:
+                _COMPILED.clear()
+            _COMPILED[key] = projection
+        return projection
+
+    def column(self, path):
+        """Register a column (relative to this projection) and return its row key"""
+        name = self.prefix + path.replace('.', '__')
+        self.columns.add(name)
+        return name
+
+    def compile_field(self, name, field):
+        if isinstance(field, serializers.SerializerMethodField):
+            return self.compile_method_field(name)
+        if isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField)):
+            raise ProjectionUnsupported(name)
+        if isinstance(field, serializers.BaseSerializer):
+            return self.compile_nested(name, field)
+        if field.source == '*' or isinstance(field, serializers.HyperlinkedRelatedField):
+            raise ProjectionUnsupported(name)
+        if isinstance(field, serializers.RelatedField):
+            # PrimaryKeyRelatedField: the foreign key column is the representation
+            key = self.column(field.source)
+            return lambda row, context: row[key]
+        if isinstance(field, serializers.FileField):
+            return self.compile_file_field(field)
+
+        key = self.column(field.source)
+        to_representation = field.to_representation
+
+        def get(row, context):
+            value = row[key]
+            return None if value is None else to_representation(value)
+        return get
+
+    def compile_file_field(self, field):
+        key = self.column(field.source)
+        storage = self.model_field(field.source).storage
+        use_url = field.use_url
+
+        def get(row, context):
+            name = row[key]
+            if not name:
+                return None
+            return absolute_url(storage.url(name), context) if use_url else name
+        return get
+
+    def compile_nested(self, name, field):
+        nested_class = self.nested_projections.get(name, Projection)
+        path = field.source.replace('.', '__')
+        nested = nested_class(field, prefix=self.prefix + path + '__')
+        self.columns |= nested.columns
+        # A null relation renders as None; its primary key tells
+        pk_key = self.column(f'{path}__{nested.model._meta.pk.attname}')
+        build = nested.build
+
+        def get(row, context):
+            return None if row[pk_key] is None else build(row, context)
+        return get
+
+    def compile_method_field(self, name):
+        method = getattr(self, f'project_{name}', None)
+        if method is None:
+            raise ProjectionUnsupported(name)
+        for path in self.method_columns.get(name, ()):
+            self.column(path)
+        return method
+
+    def model_field(self, path):
+        model = self.model
+        parts = path.split('.')
+        try:
+            for part in parts[:-1]:
+                model = model._meta.get_field(part).related_model
+            return model._meta.get_field(parts[-1])
+        except FieldDoesNotExist:
+            raise ProjectionUnsupported(path)
+
+    def get(self, row, path):
+        """Value of a column registered by this projection"""
+        return row[self.prefix + path]
+
+    def build(self, row, context):
+        return {name: get(row, context) for name, get in self.plan}
+
+    def annotate(self, queryset, context):
+        """Hook for per-row values computed in SQL"""
+        return queryset
+
+    def prepare(self, rows, context):
+        """Hook to batch-load data for a page before rendering it"""
+
+    def project(self, queryset, context):
+        """Turn a model queryset into the .values() queryset this projection renders"""
+        # Rows are dicts; prefetching has nothing to attach to
+        queryset = self.annotate(queryset.prefetch_related(None), context)
+        opts = queryset.model._meta
+        names = set(self.columns)
+        # The paginator reads the sort key and primary key off each row
+        names.add(opts.pk.attname)
+        names.update(queryset.query.annotations)
+        for term in list(queryset.query.order_by) or list(opts.ordering):
+            if isinstance(term, str) and '__' not in term:
+                name = term.lstrip('-')
+                if name != '?' and name != 'pk':
+                    names.add(name)
+        return queryset.values(*sorted(names))
+
+    def render(self, rows, context):
+        rows = list(rows)
+        self.prepare(rows, context)
+        return [self.build(row, context) for row in rows]
+
+
+class ProjectionListMixin:
+    """
+    View mixin: list() renders through projection_class instead of the
+    serializer whenever the projection supports the requested fields.
+    """
+    projection_class = None
+
+    def get_projection_class(self):
+        return self.projection_class
+
+    def list(self, request, *args, **kwargs):
+        projection_class = self.get_projection_class()
+        if projection_class is None:
+            return super().list(request, *args, **kwargs)
+        context = self.get_serializer_context()
+        try:
+            projection = projection_class.compile(context)
+        except ProjectionUnsupported:
+            return super().list(request, *args, **kwargs)
+
+        queryset = projection.project(self.filter_queryset(self.get_queryset()), context)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(projection.render(page, context))
+        return Response(projection.render(queryset, context))
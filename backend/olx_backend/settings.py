@@ -107,6 +107,45 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Cache (listing version stamps and facet counts)
+# Set CACHE_URL to a Redis URL in production so every worker sees the same
+# stamps; without it each process keeps its own in-memory cache.
+CACHE_URL = config('CACHE_URL', default='')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Listing view/impression counters (see listings.counters): buffered in Redis when
+# a URL is set (shared by all workers), otherwise in each process; flushed to the
+# database at most every LISTING_COUNTERS_FLUSH_INTERVAL seconds.
+LISTING_COUNTERS_URL = config('LISTING_COUNTERS_URL', default=CACHE_URL)
+LISTING_COUNTERS_FLUSH_INTERVAL = config('LISTING_COUNTERS_FLUSH_INTERVAL', default=30, cast=int)
+
+# Days a listing stays live before expire_listings deactivates it (categories can override)
+LISTING_LIFETIME_DAYS = config('LISTING_LIFETIME_DAYS', default=60, cast=int)
+
+# Encoding of listing image thumbnails and medium renditions: WEBP or JPEG
+LISTING_RENDITION_FORMAT = config('LISTING_RENDITION_FORMAT', default='WEBP')
+
+# Per-process thread pool for after-commit work such as notification fan-out
+# (see olx_backend.background); BACKGROUND_TASKS_EAGER runs it inline instead.
+BACKGROUND_TASKS_WORKERS = config('BACKGROUND_TASKS_WORKERS', default=2, cast=int)
+BACKGROUND_TASKS_EAGER = config('BACKGROUND_TASKS_EAGER', default=False, cast=bool)
+
+# Place-name lookup used to geocode listing locations (see listings.geo)
+GAZETTEER_CLASS = config('GAZETTEER_CLASS', default='listings.geo.CSVGazetteer')
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -185,9 +224,11 @@ CLOUDINARY_STORAGE = {
 # Use Cloudinary for media files (not local filesystem)
 # DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 # ADD THIS NEW BLOCK:
+# MEDIA_STORAGE_BACKEND=olx_backend.storage.SlowFileSystemStorage keeps uploads in
+# MEDIA_ROOT instead, waiting MEDIA_STORAGE_LATENCY seconds per save (offline runs).
 STORAGES = {
     "default": {
-        "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
+        "BACKEND": config('MEDIA_STORAGE_BACKEND', default='cloudinary_storage.storage.MediaCloudinaryStorage'),
     },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -195,6 +236,18 @@ STORAGES = {
 }
 # Media URL (for compatibility)
 MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_STORAGE_LATENCY = config('MEDIA_STORAGE_LATENCY', default=0.0, cast=float)
+
+# Issuer of signed direct image uploads (see listings.direct_uploads); empty picks
+# Cloudinary when media is stored there, else the local stand-in
+DIRECT_UPLOAD_BACKEND = config('DIRECT_UPLOAD_BACKEND', default='')
+
+# Uploads of one request's images run in parallel on a pool of this many threads
+IMAGE_UPLOAD_WORKERS = config('IMAGE_UPLOAD_WORKERS', default=4, cast=int)
+
+# Deletes of orphaned image files (listings.blob_gc) run on a pool of this many threads
+BLOB_GC_WORKERS = config('BLOB_GC_WORKERS', default=4, cast=int)
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -230,6 +283,9 @@ REST_FRAMEWORK = {
         'user': '1000/hour',  # Authenticated users: 1000 requests per hour
         'chat_messages': '60/minute',  # Chat messages: 60 per minute (1 per second)
         'chat_create': '10/minute',  # Create conversations: 10 per minute
+        'listing_suggest': '120/minute',  # Typeahead: one request per keystroke
+        'listing_import': '30/hour',  # Bulk listing imports
+        'listing_upload': '120/hour',  # Direct image upload targets
         'burst': '20/minute',  # Burst rate for sensitive operations
         'login': '5/hour',  # Login attempts: 5 per hour (prevents brute force)
     }
@@ -0,0 +1,22 @@
+"""
+Local stand-in for the remote media store.
+
+SlowFileSystemStorage is a FileSystemStorage that waits `latency` seconds
+before each save, the way an upload to Cloudinary waits on a network round
+trip. Point STORAGES['default'] at it (MEDIA_STORAGE_BACKEND) to run or
+benchmark the upload pipeline offline with realistic timings.
+"""
+import time
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+class SlowFileSystemStorage(FileSystemStorage):
+    def __init__(self, *args, latency=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency = getattr(settings, 'MEDIA_STORAGE_LATENCY', 0.0) if latency is None else latency
+
+    def _save(self, name, content):
+        if self.latency:
+            time.sleep(self.latency)
+        return super()._save(name, content)